@@ -0,0 +1,144 @@
+import os
+import random
+
+WORDS = (
+    "the ring of power was forged in secret by sauron in the fires of mount doom "
+    "while elves dwarves and men each received their own rings of lesser craft "
+    "frodo carried it across middle earth with sam at his side"
+).split()
+
+TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <meta charset="utf-8" />
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>
+"""
+
+
+def words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def inline_paragraph(rng, spans):
+    # A single paragraph with `spans` inline spans of every kind.
+    parts = []
+    for i in range(spans):
+        word = rng.choice(WORDS)
+        kind = i % 5
+        if kind == 0:
+            parts.append(f"**{word}**")
+        elif kind == 1:
+            parts.append(f"_{word}_")
+        elif kind == 2:
+            parts.append(f"`{word}`")
+        elif kind == 3:
+            parts.append(f"[{word}](/blog/{word})")
+        else:
+            parts.append(f"![{word}](/images/{word}.png)")
+        parts.append(words(rng, 3))
+    return " ".join(parts)
+
+
+def long_list(rng, items, ordered=False):
+    lines = []
+    for i in range(1, items + 1):
+        marker = f"{i}." if ordered else "-"
+        lines.append(f"{marker} {words(rng, 4)} **{rng.choice(WORDS)}**")
+    return "\n".join(lines)
+
+
+def markdown_document(rng, blocks, title="Benchmark page"):
+    parts = [f"# {title}"]
+    for i in range(blocks):
+        kind = i % 6
+        if kind == 0:
+            parts.append(f"## {words(rng, 4)}")
+        elif kind == 1:
+            parts.append(inline_paragraph(rng, 8))
+        elif kind == 2:
+            parts.append(long_list(rng, 8, ordered=i % 2 == 0))
+        elif kind == 3:
+            parts.append("> " + words(rng, 12) + "\n> " + words(rng, 12))
+        elif kind == 4:
+            parts.append("```\n" + words(rng, 6) + "\n\n" + words(rng, 6) + "\n```")
+        else:
+            parts.append(words(rng, 60))
+    return "\n\n".join(parts)
+
+
+def boilerplate_document(rng, repeats):
+    # The same handful of blocks (bio, license, related links) over and over,
+    # between unique paragraphs, like a long page built from shared snippets.
+    shared = [
+        inline_paragraph(random.Random(1), 12),
+        long_list(random.Random(2), 6),
+        "> " + words(random.Random(3), 20),
+    ]
+    parts = ["# Boilerplate"]
+    for i in range(repeats):
+        parts.append(words(rng, 20))
+        parts.extend(shared)
+    return "\n\n".join(parts)
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(path, mode) as f:
+        f.write(data)
+
+
+def generate_site(root, seed=0, scale=1):
+    # Lays out content/, static/ and template.html under root, mirroring the
+    # repository, and returns the number of pages and assets written.
+    rng = random.Random(seed)
+    pages = 0
+    assets = 0
+
+    write(os.path.join(root, "template.html"), TEMPLATE)
+    write(os.path.join(root, "content", "index.md"), markdown_document(rng, 12, "Home"))
+    pages += 1
+
+    # Many small pages
+    for i in range(200 * scale):
+        path = os.path.join(root, "content", "blog", f"post-{i}", "index.md")
+        write(path, markdown_document(rng, 6, f"Post {i}"))
+        pages += 1
+
+    # A few huge pages
+    for i in range(2 * scale):
+        path = os.path.join(root, "content", "reference", f"huge-{i}", "index.md")
+        write(path, markdown_document(rng, 3000, f"Reference {i}"))
+        pages += 1
+
+    # Inline-heavy paragraphs and long lists
+    path = os.path.join(root, "content", "inline", "index.md")
+    write(path, "# Inline heavy\n\n" + "\n\n".join(inline_paragraph(rng, 500) for _ in range(10 * scale)))
+    path = os.path.join(root, "content", "lists", "index.md")
+    write(path, "# Long lists\n\n" + long_list(rng, 2000 * scale) + "\n\n" + long_list(rng, 2000 * scale, True))
+    pages += 2
+
+    # A deep directory tree
+    directory = os.path.join(root, "content", "deep")
+    for depth in range(40):
+        directory = os.path.join(directory, f"level-{depth}")
+        write(os.path.join(directory, "index.md"), markdown_document(rng, 3, f"Depth {depth}"))
+        pages += 1
+
+    # Many static assets
+    write(os.path.join(root, "static", "index.css"), "body { margin: 0; }\n" * 200)
+    assets += 1
+    for i in range(300 * scale):
+        size = rng.choice((256, 4096, 65536))
+        path = os.path.join(root, "static", "images", f"group-{i % 10}", f"image-{i}.png")
+        write(path, rng.randbytes(size))
+        assets += 1
+
+    return pages, assets
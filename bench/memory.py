@@ -0,0 +1,99 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from converter import markdown_to_html_node
+from largefile import write_large_page
+from renderer import SingleTemplate, SiteRenderer
+from template import compile_template
+import main as site_main
+
+import corpus
+
+
+def count_nodes(root):
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if node.children:
+            stack.extend(node.children)
+    return count
+
+
+def measure(markdown):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    node = markdown_to_html_node(markdown)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = count_nodes(node)
+    return {
+        "nodes": nodes,
+        "retained_bytes": retained - before,
+        "peak_bytes": peak - before,
+        "bytes_per_node": (retained - before) / nodes,
+    }
+
+
+def peak_while(func):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before
+
+
+def measure_large_file(markdown):
+    # Peak memory of building one page the regular way and through the
+    # memory-mapped, block-by-block path.
+    template = compile_template(corpus.TEMPLATE)
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, "page.md")
+        dest = os.path.join(root, "page.html")
+        with open(source, "w") as f:
+            f.write(markdown)
+
+        def regular():
+            with open(source, "r") as f:
+                markdown_content = f.read()
+            site_main.write_page(dest, template, site_main.extract_title(markdown_content), markdown_to_html_node(markdown_content))
+
+        return {
+            "regular_peak_bytes": peak_while(regular),
+            "streamed_peak_bytes": peak_while(lambda: write_large_page(source, dest, SiteRenderer(SingleTemplate(template)))),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory used by markdown_to_html_node")
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--large-file", action="store_true", help="compare peak memory of the regular and streamed page builds")
+    args = parser.parse_args(argv)
+
+    markdown = corpus.markdown_document(random.Random(args.seed), args.blocks)
+    result = measure(markdown)
+    print(f"markdown size:   {len(markdown):,} chars")
+    print(f"html nodes:      {result['nodes']:,}")
+    print(f"retained memory: {result['retained_bytes']:,} bytes")
+    print(f"peak memory:     {result['peak_bytes']:,} bytes")
+    print(f"bytes per node:  {result['bytes_per_node']:.1f}")
+
+    if args.large_file:
+        result = measure_large_file(markdown)
+        print(f"regular build peak:  {result['regular_peak_bytes']:,} bytes")
+        print(f"streamed build peak: {result['streamed_peak_bytes']:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
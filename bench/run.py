@@ -0,0 +1,159 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from blockcache import BlockCache
+from converter import markdown_to_html_node, text_to_textnodes
+import main as site_main
+
+import corpus
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# A stage is a regression when it is this much slower than the baseline.
+REGRESSION_THRESHOLD = 1.25
+# Doubling the input should roughly double the time; anything above this
+# ratio is reported as superlinear growth.
+SCALING_THRESHOLD = 2.6
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def stage_inputs(seed, size):
+    rng = random.Random(seed)
+    paragraph = corpus.inline_paragraph(rng, 4000 * size)
+    document = corpus.markdown_document(rng, 1500 * size)
+    return paragraph, document
+
+
+def stages(seed, size):
+    paragraph, document = stage_inputs(seed, size)
+    node = markdown_to_html_node(document)
+    boilerplate = corpus.boilerplate_document(random.Random(seed), 200 * size)
+    return {
+        "text_to_textnodes": lambda: text_to_textnodes(paragraph),
+        "markdown_to_html_node": lambda: markdown_to_html_node(document),
+        "to_html": lambda: node.to_html(),
+        "boilerplate": lambda: markdown_to_html_node(boilerplate).to_html(),
+        "boilerplate_cached": lambda: markdown_to_html_node(boilerplate, BlockCache(1024)).to_html(),
+    }
+
+
+def time_stages(seed, size, repeat):
+    return {name: best_time(func, repeat) for name, func in stages(seed, size).items()}
+
+
+def time_build(seed, scale, repeat):
+    with tempfile.TemporaryDirectory() as root:
+        corpus.generate_site(root, seed, scale)
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                return best_time(lambda: site_main.main(["-q", "/"]), repeat)
+        finally:
+            os.chdir(cwd)
+
+
+def check_scaling(seed, repeat):
+    # Time every stage at 1x, 2x and 4x input and flag superlinear growth.
+    timings = [time_stages(seed, size, repeat) for size in (1, 2, 4)]
+    report = {}
+    for name in timings[0]:
+        ratios = [timings[i + 1][name] / timings[i][name] for i in range(len(timings) - 1)]
+        # Judge the growth over the whole range, which is much less noisy
+        # than any single doubling.
+        overall = timings[-1][name] / timings[0][name]
+        report[name] = {
+            "ratios": ratios,
+            "superlinear": overall > SCALING_THRESHOLD ** len(ratios),
+        }
+    return report
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, seconds in results["timings"].items():
+        previous = baseline.get("timings", {}).get(name)
+        if previous and seconds > previous * REGRESSION_THRESHOLD:
+            regressions.append((name, previous, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the converter and a full build")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=1, help="stage input size multiplier")
+    parser.add_argument("--scale", type=int, default=1, help="synthetic site size multiplier")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-build", action="store_true", help="only time the converter stages")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    timings = time_stages(args.seed, args.size, args.repeat)
+    if not args.skip_build:
+        timings["build"] = time_build(args.seed, args.scale, args.repeat)
+    scaling = check_scaling(args.seed, args.repeat)
+
+    results = {
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "size": args.size,
+        "scale": args.scale,
+        "timings": timings,
+        "scaling": scaling,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    for name, seconds in timings.items():
+        print(f"{name:24} {seconds * 1000:10.2f} ms")
+
+    failed = False
+    for name, report in scaling.items():
+        ratios = ", ".join(f"{ratio:.2f}" for ratio in report["ratios"])
+        status = "SUPERLINEAR" if report["superlinear"] else "ok"
+        print(f"scaling {name:16} x2 ratios: {ratios} {status}")
+        failed = failed or report["superlinear"]
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if any(baseline.get(key) != results[key] for key in ("seed", "size", "scale")):
+            print("Baseline was recorded with different --seed/--size/--scale, not comparing")
+            baseline = {}
+        for name, previous, seconds in compare(results, baseline):
+            print(f"REGRESSION {name}: {previous * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
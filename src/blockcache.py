@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+
+from htmlnode import FragmentNode
+
+
+class BlockCache:
+    # Rendered HTML for markdown blocks, keyed by the block's text. Sites
+    # repeat the same blocks (disclaimers, bios, license paragraphs) across
+    # many pages, and a hit skips both parsing and serializing the block.
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            fragment = self.entries.get(key)
+            if fragment is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return fragment
+
+    def put(self, key, fragment):
+        with self.lock:
+            self.entries[key] = fragment
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def render(self, block_type, lines, render_block):
+        # The block's node: a cached fragment when there is one, otherwise
+        # render_block(block_type, lines), captured for next time.
+        key = "\n".join(lines)
+        fragment = self.get(key)
+        if fragment is not None:
+            return fragment
+        node = render_block(block_type, lines)
+        fragment = FragmentNode.from_node(node)
+        if fragment is None:
+            return node
+        self.put(key, fragment)
+        return fragment
+
+    def counts(self):
+        return self.hits, self.misses, self.evictions
+
+    def add_counts(self, hits, misses, evictions=0):
+        # Counters reported back by caches living in worker processes
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.evictions += evictions
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (
+            f"Block cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evictions"
+        )
@@ -0,0 +1,124 @@
+import concurrent.futures
+import gzip
+import os
+import struct
+import zlib
+
+from sync import scan_files
+
+# Text formats worth precompressing; images and fonts are already compressed.
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".js", ".svg", ".xml", ".txt")
+
+# Below this many bytes the gzip overhead isn't worth a second file.
+GZIP_MIN_SIZE = 1024
+
+
+def gzip_trailer(path):
+    # (crc32, size mod 2**32) of the data compressed in a .gz file, read
+    # from its last 8 bytes, or None.
+    try:
+        with open(path, "rb") as f:
+            f.seek(-8, os.SEEK_END)
+            trailer = f.read(8)
+    except OSError:
+        return None
+    if len(trailer) != 8:
+        return None
+    return struct.unpack("<II", trailer)
+
+
+def compress_file(path, stat, sidecar_stat):
+    # Writes path + ".gz" unless the existing one already holds this exact
+    # content. Returns (written, compressed size).
+    sidecar = path + ".gz"
+    if sidecar_stat is not None and sidecar_stat.st_mtime_ns == stat.st_mtime_ns:
+        # Stamped with the source's mtime when written, so nothing changed.
+        return False, sidecar_stat.st_size
+    with open(path, "rb") as f:
+        data = f.read()
+    if sidecar_stat is not None and gzip_trailer(sidecar) == (zlib.crc32(data), len(data) & 0xFFFFFFFF):
+        # Rewritten with identical content (e.g. a page rebuilt after a
+        # template change that didn't affect it): keep the compressed file.
+        os.utime(sidecar, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return False, sidecar_stat.st_size
+    # mtime=0 keeps the output identical from build to build.
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    temp = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(temp, "wb") as f:
+            f.write(compressed)
+        os.utime(temp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temp, sidecar)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return True, len(compressed)
+
+
+class GzipResult:
+    def __init__(self):
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+
+    def ratio(self):
+        return self.compressed_bytes / self.original_bytes if self.original_bytes else 0.0
+
+    def report(self):
+        return {
+            "written": self.written,
+            "unchanged": self.unchanged,
+            "removed": self.removed,
+            "original_bytes": self.original_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": self.ratio(),
+        }
+
+    def summary(self):
+        return (
+            f"Gzip: {self.written} written, {self.unchanged} unchanged, {self.removed} removed; "
+            f"{self.original_bytes:,} -> {self.compressed_bytes:,} bytes ({self.ratio():.1%})"
+        )
+
+
+def precompress(root, min_size=GZIP_MIN_SIZE, jobs=4, extensions=COMPRESSIBLE_EXTENSIONS, assets=()):
+    # Brings the .gz siblings under root (for nginx's gzip_static) up to date
+    # with the files next to them, and deletes sidecars whose file is gone or
+    # has shrunk below min_size. Only .gz files this could have written are
+    # touched; assets holds relative paths of files copied from static/
+    # (a downloads/foo.tar.gz, say), which are never rewritten or removed.
+    files = scan_files(root)
+    assets = set(assets)
+    result = GzipResult()
+    todo = []
+    for relative in sorted(files):
+        path = os.path.join(root, relative)
+        if relative.endswith(".gz"):
+            name = relative[:-len(".gz")]
+            if relative in assets or not name.endswith(extensions):
+                continue
+            original = files.get(name)
+            if original is None or original.st_size < min_size:
+                os.remove(path)
+                result.removed += 1
+            continue
+        stat = files[relative]
+        if relative.endswith(extensions) and stat.st_size >= min_size and relative + ".gz" not in assets:
+            todo.append((path, stat, files.get(relative + ".gz")))
+
+    if todo:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            # zlib releases the GIL while compressing, so threads run in parallel.
+            futures = [executor.submit(compress_file, path, stat, sidecar_stat) for path, stat, sidecar_stat in todo]
+            for (_, stat, _), future in zip(todo, futures):
+                written, size = future.result()
+                if written:
+                    result.written += 1
+                else:
+                    result.unchanged += 1
+                result.original_bytes += stat.st_size
+                result.compressed_bytes += size
+    return result
@@ -21,53 +21,49 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
             result.append(old_node)
             continue
         
-        # Process TEXT type node
+        # Process TEXT type node, walking it by index rather than re-slicing
+        # the remaining text after every match
         text = old_node.text
-        remaining_text = text
-        current_result = []
+        position = 0
         
         # While we can find a pair of delimiters
         while True:
             # Find the first delimiter
-            start_index = remaining_text.find(delimiter)
+            start_index = text.find(delimiter, position)
             if start_index == -1:
                 # No more delimiters found
-                if remaining_text:
-                    current_result.append(TextNode(remaining_text, TextType.TEXT))
+                if position < len(text):
+                    result.append(TextNode(text[position:], TextType.TEXT))
                 break
             
             # Text before the first delimiter
-            if start_index > 0:
-                current_result.append(TextNode(remaining_text[:start_index], TextType.TEXT))
+            if start_index > position:
+                result.append(TextNode(text[position:start_index], TextType.TEXT))
             
             # Find the second delimiter
-            end_index = remaining_text.find(delimiter, start_index + len(delimiter))
+            end_index = text.find(delimiter, start_index + len(delimiter))
             if end_index == -1:
                 # No closing delimiter found - this is invalid markdown
                 raise ValueError(f"No closing delimiter '{delimiter}' found")
             
             # Text between delimiters (without the delimiters themselves)
-            between_text = remaining_text[start_index + len(delimiter):end_index]
-            current_result.append(TextNode(between_text, text_type))
+            result.append(TextNode(text[start_index + len(delimiter):end_index], text_type))
             
-            # Update remaining_text to be everything after the second delimiter
-            remaining_text = remaining_text[end_index + len(delimiter):]
-        
-        result.extend(current_result)
+            # Continue with everything after the second delimiter
+            position = end_index + len(delimiter)
     
     return result
 
+IMAGE_PATTERN = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+LINK_PATTERN = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+
 def extract_markdown_images(text):
-    pattern = r"!\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    matches = re.findall(pattern, text)
-    return matches
+    return IMAGE_PATTERN.findall(text)
 
 def extract_markdown_links(text):
-    pattern = r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    matches = re.findall(pattern, text)
-    return matches
+    return LINK_PATTERN.findall(text)
 
-def split_nodes_image(old_nodes):
+def split_nodes_pattern(old_nodes, pattern, text_type):
     result = []
 
     for old_node in old_nodes:
@@ -75,145 +71,261 @@ def split_nodes_image(old_nodes):
             result.append(old_node)
             continue
         text = old_node.text
+        position = 0
 
-        images = extract_markdown_images(text)
+        for match in pattern.finditer(text):
+            if match.start() > position:
+                result.append(TextNode(text[position:match.start()], TextType.TEXT))
+            result.append(TextNode(match.group(1), text_type, match.group(2)))
+            position = match.end()
 
-        if not images:
+        if position == 0:
             result.append(old_node)
-            continue
-
-        remaining_text = text
-
-        for image_alt, image_url in images:
-            image_markdown = f"![{image_alt}]({image_url})"
-
-            parts = remaining_text.split(image_markdown, 1)
-        
-            if parts[0]:
-                result.append(TextNode(parts[0], TextType.TEXT))
-
-            result.append(TextNode(image_alt, TextType.IMAGE, image_url))
-
-            if len(parts) > 1:
-                remaining_text = parts[1]
-            else:
-                remaining_text = ""
-        
-        if remaining_text:
-            result.append(TextNode(remaining_text,TextType.TEXT))
+        elif position < len(text):
+            result.append(TextNode(text[position:], TextType.TEXT))
     return result
 
-def split_nodes_link(old_nodes):
-    result = []
-
-    for old_node in old_nodes:
-        if old_node.text_type != TextType.TEXT:
-            result.append(old_node)
-            continue
-        text = old_node.text
-
-        links = extract_markdown_links(text)
-
-        if not links:
-            result.append(old_node)
-            continue
-
-        remaining_text = text
-
-        for link_text, link_url in links:
-            link_markdown = f"[{link_text}]({link_url})"
-
-            parts = remaining_text.split(link_markdown, 1)
-        
-            if parts[0]:
-                result.append(TextNode(parts[0], TextType.TEXT))
-
-            result.append(TextNode(link_text, TextType.LINK, link_url))
+def split_nodes_image(old_nodes):
+    return split_nodes_pattern(old_nodes, IMAGE_PATTERN, TextType.IMAGE)
 
-            if len(parts) > 1:
-                remaining_text = parts[1]
+def split_nodes_link(old_nodes):
+    return split_nodes_pattern(old_nodes, LINK_PATTERN, TextType.LINK)
+
+# Everything that can start an inline span; plain text between these tokens
+# is copied over in a single slice.
+INLINE_TOKEN_PATTERN = re.compile(r"\*\*|[_`]|!\[|\[")
+INLINE_DELIMITERS = {
+    "**": TextType.BOLD,
+    "_": TextType.ITALIC,
+}
+
+class InlineFrame:
+    # An open delimiter (or the paragraph itself) collecting the nodes that
+    # follow it until it is closed.
+    def __init__(self, delimiter=None, text_type=TextType.TEXT):
+        self.delimiter = delimiter
+        self.text_type = text_type
+        self.nodes = []
+        self.text = []
+
+    def add_text(self, text):
+        self.text.append(text)
+
+    def add(self, node):
+        self.flush()
+        self.nodes.append(node)
+
+    def flush(self):
+        if self.text:
+            self.nodes.append(TextNode("".join(self.text), TextType.TEXT))
+            self.text = []
+
+    def finish(self):
+        self.flush()
+        return self.nodes
+
+    def to_node(self):
+        nodes = self.finish()
+        if not nodes:
+            return TextNode("", self.text_type)
+        if len(nodes) == 1 and nodes[0].text_type == TextType.TEXT:
+            return TextNode(nodes[0].text, self.text_type)
+        text = "".join(node.text for node in nodes)
+        return TextNode(text, self.text_type, children=nodes)
+
+    def unwind_into(self, parent):
+        # Never closed before an outer span was: its delimiter was literal text.
+        parent.add_text(self.delimiter)
+        for node in self.finish():
+            if node.text_type == TextType.TEXT:
+                parent.add_text(node.text)
             else:
-                remaining_text = ""
-        
-        if remaining_text:
-            result.append(TextNode(remaining_text,TextType.TEXT))
-    return result
+                parent.add(node)
 
 def text_to_textnodes(text):
-    #convert text to TextNode
-    #pass TextNode to split_nodes_delimiter, and split_nodes_image, and split_nodes_link
-
-    nodes = [TextNode(text, TextType.TEXT)]
-
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
+    # One left-to-right scan. Code spans, images and links are matched in
+    # place; ** and _ go through a delimiter stack so they can nest.
+    stack = [InlineFrame()]
+    open_delimiters = set()
+    position = 0
+
+    while True:
+        match = INLINE_TOKEN_PATTERN.search(text, position)
+        if match is None:
+            break
+        frame = stack[-1]
+        start = match.start()
+        token = match.group()
+        if start > position:
+            frame.add_text(text[position:start])
+        position = match.end()
+
+        if token == "`":
+            end = text.find("`", position)
+            if end == -1:
+                raise ValueError("No closing delimiter '`' found")
+            frame.add(TextNode(text[position:end], TextType.CODE))
+            position = end + 1
+        elif token == "![" or token == "[":
+            pattern = IMAGE_PATTERN if token == "![" else LINK_PATTERN
+            span = pattern.match(text, start)
+            if span is None:
+                frame.add_text(token)
+                continue
+            text_type = TextType.IMAGE if token == "![" else TextType.LINK
+            frame.add(TextNode(span.group(1), text_type, span.group(2)))
+            position = span.end()
+        elif token in open_delimiters:
+            while stack[-1].delimiter != token:
+                inner = stack.pop()
+                open_delimiters.discard(inner.delimiter)
+                inner.unwind_into(stack[-1])
+            closed = stack.pop()
+            open_delimiters.discard(token)
+            stack[-1].add(closed.to_node())
+        else:
+            stack.append(InlineFrame(token, INLINE_DELIMITERS[token]))
+            open_delimiters.add(token)
+
+    if len(stack) > 1:
+        raise ValueError(f"No closing delimiter '{stack[1].delimiter}' found")
+    if position < len(text):
+        stack[0].add_text(text[position:])
+    return stack[0].finish()
+
+def iter_lines(source):
+    # Lines of a markdown string, or of any iterable of lines such as an open
+    # file, without their line endings. Strings are walked in place instead
+    # of being split into a list.
+    if isinstance(source, str):
+        position = 0
+        while True:
+            end = source.find("\n", position)
+            if end == -1:
+                if position < len(source):
+                    yield source[position:]
+                return
+            yield source[position:end]
+            position = end + 1
+    else:
+        for line in source:
+            yield line.rstrip("\r\n")
+
+class BlockBuilder:
+    # Collects the lines of one block and classifies it as they arrive, so
+    # a block is never re-split to work out its type.
+    def __init__(self, first_line):
+        first_line = first_line.lstrip()
+        self.lines = [first_line]
+        self.heading = first_line.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### "))
+        self.fenced = first_line.startswith("```")
+        self.quote = first_line.startswith(">")
+        self.unordered = first_line.startswith("- ")
+        self.ordered = first_line.startswith("1. ")
+
+    def add(self, line):
+        self.lines.append(line)
+        if self.quote and not line.startswith(">"):
+            self.quote = False
+        if self.unordered and not line.startswith("- "):
+            self.unordered = False
+        if self.ordered and not line.startswith(f"{len(self.lines)}. "):
+            self.ordered = False
+
+    def fence_closed(self):
+        last = self.lines[-1]
+        if len(self.lines) == 1:
+            return len(last) >= 6 and last.endswith("```")
+        return last.endswith("```")
+
+    def finish(self):
+        self.lines[-1] = self.lines[-1].rstrip()
+        return self.block_type(), self.lines
+
+    def block_type(self):
+        if self.heading:
+            return BlockType.HEADING
+        if self.fenced and self.fence_closed():
+            return BlockType.CODE
+        if self.quote:
+            return BlockType.QUOTE
+        if self.unordered:
+            return BlockType.UNORDERED_LIST
+        if self.ordered:
+            return BlockType.ORDERED_LIST
+        return BlockType.PARAGRAPH
 
-    return nodes
+def scan_blocks(source):
+    # Yields (BlockType, lines) for each block of a markdown string or line
+    # iterable, reading every line once. Blocks are separated by blank
+    # lines, except inside a fenced code block, which runs to its closing
+    # fence even if it contains blank lines.
+    builder = None
+    in_fence = False
+    for line in iter_lines(source):
+        if in_fence:
+            builder.add(line)
+            if line.rstrip().endswith("```"):
+                in_fence = False
+                yield builder.finish()
+                builder = None
+            continue
+        if not line.strip():
+            if builder is not None:
+                yield builder.finish()
+                builder = None
+            continue
+        if builder is None:
+            builder = BlockBuilder(line)
+            if builder.fenced and not builder.fence_closed():
+                in_fence = True
+        else:
+            builder.add(line)
+    if builder is not None:
+        yield builder.finish()
 
 def markdown_to_blocks(markdown):
-
-    lines = markdown.split("\n\n")
-    no_space_lines = []
-    for line in lines:
-        no_space_line = line.strip()
-        if len(no_space_line)>0:
-            no_space_lines.append(no_space_line)
-    return no_space_lines
+    return ["\n".join(lines) for _, lines in scan_blocks(markdown)]
 
 def block_to_block_type(block):
     if not block:
         return BlockType.PARAGRAPH
-        
-    if block.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### ")):
-        return BlockType.HEADING
-            
-    if block.startswith("```") and block.endswith("```"):
-        return BlockType.CODE
     lines = block.split("\n")
+    builder = BlockBuilder(lines[0])
+    for line in lines[1:]:
+        builder.add(line)
+    return builder.block_type()
+
+
+def iter_block_nodes(source, cache=None):
+    # One HTML node per block, produced as the source is read. With a
+    # BlockCache, repeated blocks come back as pre-rendered fragments.
+    for block_type, lines in scan_blocks(source):
+        if cache is None:
+            yield block_lines_to_html_node(block_type, lines)
+        else:
+            yield cache.render(block_type, lines, block_lines_to_html_node)
 
-    if all(line.startswith(">") for line in lines):
-        return BlockType.QUOTE
-    
-    if all(line.startswith("- ") for line in lines):
-        return BlockType.UNORDERED_LIST
-    
-    if len(lines) > 0:
-        is_ordered_list = True
-        for i, line in enumerate(lines, 1):
-            if not line.startswith(f"{i}. "):
-                is_ordered_list = False
-                break
-        if is_ordered_list:
-            return BlockType.ORDERED_LIST
-    
-    return BlockType.PARAGRAPH
-
-
-def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-    children = []
-    for block in blocks:
-        html_node = block_to_html_node(block)
-        children.append(html_node)
-    return ParentNode("div", children, None)
+def markdown_to_html_node(markdown, cache=None):
+    return ParentNode("div", list(iter_block_nodes(markdown, cache)), None)
 
 def block_to_html_node(block):
-    block_type = block_to_block_type(block)
+    lines = block.split("\n")
+    return block_lines_to_html_node(block_to_block_type(block), lines)
+
+def block_lines_to_html_node(block_type, lines):
     if block_type == BlockType.PARAGRAPH:
-        return paragraph_to_html_node(block)
+        return paragraph_to_html_node(lines)
     if block_type == BlockType.HEADING:
-        return heading_to_html_node(block)
+        return heading_to_html_node(lines)
     if block_type == BlockType.CODE:
-        return code_to_html_node(block)
+        return code_to_html_node(lines)
     if block_type == BlockType.ORDERED_LIST:
-        return olist_to_html_node(block)
+        return olist_to_html_node(lines)
     if block_type == BlockType.UNORDERED_LIST:
-        return ulist_to_html_node(block)
+        return ulist_to_html_node(lines)
     if block_type == BlockType.QUOTE:
-        return quote_to_html_node(block)
+        return quote_to_html_node(lines)
     raise ValueError("invalid block type")
 
 def text_to_children(text):
@@ -225,14 +337,14 @@ def text_to_children(text):
     return children
 
 
-def paragraph_to_html_node(block):
-    lines = block.split("\n")
+def paragraph_to_html_node(lines):
     paragraph = " ".join(lines)
     children = text_to_children(paragraph)
     return ParentNode("p", children)
 
 
-def heading_to_html_node(block):
+def heading_to_html_node(lines):
+    block = "\n".join(lines)
     level = 0
     for char in block:
         if char == "#":
@@ -246,38 +358,39 @@ def heading_to_html_node(block):
     return ParentNode(f"h{level}", children)
 
 
-def code_to_html_node(block):
-    if not block.startswith("```") or not block.endswith("```"):
+def code_to_html_node(lines):
+    if not lines[0].startswith("```") or not lines[-1].endswith("```"):
         raise ValueError("invalid code block")
-    text = block[4:-3]
+    if len(lines) == 1:
+        text = lines[0][3:-3]
+    else:
+        # Everything between the opening fence line and the closing fence
+        text = "\n".join(lines[1:])[:-3]
     raw_text_node = TextNode(text, TextType.TEXT)
     child = text_node_to_html_node(raw_text_node)
     code = ParentNode("code", [child])
     return ParentNode("pre", [code])
 
 
-def olist_to_html_node(block):
-    items = block.split("\n")
+def olist_to_html_node(lines):
     html_items = []
-    for item in items:
-        text = item[3:]
+    for item in lines:
+        text = item[item.index(". ") + 2:]
         children = text_to_children(text)
         html_items.append(ParentNode("li", children))
     return ParentNode("ol", html_items)
 
 
-def ulist_to_html_node(block):
-    items = block.split("\n")
+def ulist_to_html_node(lines):
     html_items = []
-    for item in items:
+    for item in lines:
         text = item[2:]
         children = text_to_children(text)
         html_items.append(ParentNode("li", children))
     return ParentNode("ul", html_items)
 
 
-def quote_to_html_node(block):
-    lines = block.split("\n")
+def quote_to_html_node(lines):
     new_lines = []
     for line in lines:
         if not line.startswith(">"):
@@ -285,4 +398,4 @@ def quote_to_html_node(block):
         new_lines.append(line.lstrip(">").strip())
     content = " ".join(new_lines)
     children = text_to_children(content)
-    return ParentNode("blockquote", children)
\ No newline at end of file
+    return ParentNode("blockquote", children)
@@ -0,0 +1,282 @@
+import json
+import os
+import posixpath
+import re
+
+from fingerprint import original_urls, site_path
+from htmlnode import FragmentNode, HTMLNode
+from manifest import hash_bytes
+from sync import scan_files
+from template import Template, basepath_rewriter
+
+COMMENT_PATTERN = re.compile(r"/\*.*?\*/", re.S)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+PUNCTUATION_PATTERN = re.compile(r"\s*([{};,])\s*")
+DECLARATION_PATTERN = re.compile(r"\s*([;:,])\s*")
+COMBINATOR_PATTERN = re.compile(r"\s*([>+~,])\s*")
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]*)\1\s*\)""")
+
+# Selector parts that don't name an element, class or id, dropped before the
+# rest is matched against a page. Dropping them only ever keeps more rules.
+PSEUDO_PATTERN = re.compile(r"::?[\w-]+(?:\([^)]*\))?")
+ATTRIBUTE_SELECTOR_PATTERN = re.compile(r"\[[^\]]*\]")
+SIMPLE_SELECTOR_PATTERN = re.compile(r"([.#]?)(-?[A-Za-z_][\w-]*)")
+
+HTML_TAG_PATTERN = re.compile(r"<([A-Za-z][\w-]*)([^>]*)>")
+LINK_PATTERN = re.compile(r"<link\b[^>]*>", re.I)
+HEAD_END_PATTERN = re.compile(r"</head\s*>", re.I)
+
+ATTRIBUTE_PATTERNS = {
+    name: re.compile(rf"""\s{name}\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+    for name in ("class", "id", "src", "href", "rel")
+}
+
+
+def attribute_value(attributes, name):
+    match = ATTRIBUTE_PATTERNS[name].search(attributes)
+    if match is None:
+        return None
+    return next(group for group in match.groups() if group is not None)
+
+
+def selector_requirements(selector):
+    # The element names, ".classes" and "#ids" a page must contain for the
+    # selector to match anything in it.
+    simple = PSEUDO_PATTERN.sub(" ", ATTRIBUTE_SELECTOR_PATTERN.sub(" ", selector))
+    return frozenset(
+        prefix + (name if prefix else name.lower()) for prefix, name in SIMPLE_SELECTOR_PATTERN.findall(simple)
+    )
+
+
+def compact(text):
+    return PUNCTUATION_PATTERN.sub(r"\1", WHITESPACE_PATTERN.sub(" ", text)).strip().replace(";}", "}")
+
+
+def matching_brace(css, start):
+    depth = 0
+    for position in range(start, len(css)):
+        if css[position] == "{":
+            depth += 1
+        elif css[position] == "}":
+            depth -= 1
+            if depth == 0:
+                return position
+    return len(css) - 1
+
+
+def parse_stylesheet(css):
+    # [(requirements, rule text)]: requirements holds one frozenset per
+    # selector of the rule, or is None for rules every page keeps (at-rules,
+    # and selectors like "*" that name nothing).
+    css = COMMENT_PATTERN.sub("", css)
+    rules = []
+    position = 0
+    while True:
+        brace = css.find("{", position)
+        if brace == -1:
+            break
+        prelude = css[position:brace].strip()
+        semicolon = css.find(";", position, brace)
+        if prelude.startswith("@") and semicolon != -1:
+            # @import / @charset statements have no block
+            rules.append((None, compact(css[position:semicolon + 1])))
+            position = semicolon + 1
+            continue
+        end = matching_brace(css, brace)
+        if prelude.startswith("@"):
+            rules.append((None, compact(css[position:end + 1])))
+        else:
+            selectors = [selector.strip() for selector in prelude.split(",")]
+            requirements = tuple(selector_requirements(selector) for selector in selectors)
+            body = DECLARATION_PATTERN.sub(r"\1", WHITESPACE_PATTERN.sub(" ", css[brace + 1:end])).strip().rstrip(";")
+            text = COMBINATOR_PATTERN.sub(r"\1", WHITESPACE_PATTERN.sub(" ", ",".join(selectors))) + "{" + body + "}"
+            rules.append((None if not all(requirements) else requirements, text))
+        position = end + 1
+    return rules
+
+
+def scan_html(html, tokens):
+    # Adds the element names, classes and ids in html to tokens and returns
+    # the src of its first <img>, if any.
+    first_image = None
+    for match in HTML_TAG_PATTERN.finditer(html):
+        name = match.group(1).lower()
+        tokens.add(name)
+        attributes = match.group(2)
+        if name == "img" and first_image is None:
+            first_image = attribute_value(attributes, "src")
+        classes = attribute_value(attributes, "class")
+        if classes:
+            tokens.update("." + value for value in classes.split())
+        element_id = attribute_value(attributes, "id")
+        if element_id:
+            tokens.add("#" + element_id)
+    return first_image
+
+
+def scan_content(node):
+    # (tokens, first image src) for a page's content node, or None for
+    # content that can't be looked at before it is written, such as a large
+    # file converted while it streams.
+    if not isinstance(node, HTMLNode):
+        return None
+    tokens = set()
+    first_image = None
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, FragmentNode):
+            src = scan_html(node.to_html(), tokens)
+            if first_image is None:
+                first_image = src
+            continue
+        if node.tag:
+            tokens.add(node.tag)
+            props = node.props or {}
+            if node.tag == "img" and first_image is None:
+                first_image = props.get("src")
+            if props.get("class"):
+                tokens.update("." + value for value in props["class"].split())
+            if props.get("id"):
+                tokens.add("#" + props["id"])
+        if node.children:
+            stack.extend(reversed(node.children))
+    return tokens, first_image
+
+
+class Stylesheet:
+    def __init__(self, rules):
+        self.rules = rules
+        self._selected = {}
+
+    def select(self, tokens):
+        # The rules that can match a page with these tokens; all of them
+        # when tokens is None.
+        if tokens is None:
+            return "".join(text for _, text in self.rules)
+        key = frozenset(tokens)
+        css = self._selected.get(key)
+        if css is None:
+            css = "".join(
+                text for requirements, text in self.rules
+                if requirements is None or any(required <= key for required in requirements)
+            )
+            self._selected[key] = css
+        return css
+
+
+class TemplateHead:
+    # What a compiled template contributes to every page using it: its
+    # tokens, the stylesheets it links to and its first image.
+    def __init__(self, template, critical):
+        self.tokens = set()
+        self.links = []
+        self.first_image = None
+        seen_content = False
+        for index, segment in enumerate(template.segments):
+            if index % 2:
+                seen_content = seen_content or segment == "Content"
+                continue
+            src = scan_html(segment, self.tokens)
+            if self.first_image is None and not seen_content:
+                self.first_image = src
+            for match in LINK_PATTERN.finditer(segment):
+                tag = match.group(0)
+                rel = attribute_value(tag, "rel")
+                href = attribute_value(tag, "href")
+                if rel is None or rel.lower() != "stylesheet" or href is None:
+                    continue
+                path = critical.resolve(href)
+                if path in critical.stylesheets:
+                    self.links.append((tag, path))
+
+
+class CriticalCSS:
+    # Inlines the site's own stylesheets into each page's <head> in place of
+    # their <link> tags, cut down to the rules that can match the page's
+    # elements, and preloads the page's first image. Stylesheets are parsed
+    # once per build; per page this is a walk of the content node and a
+    # lookup of the rules for its set of tags, classes and ids.
+    def __init__(self, stylesheets, basepath="/", assets=None):
+        # site path ("/index.css") -> Stylesheet
+        self.stylesheets = stylesheets
+        self.basepath = basepath
+        self.originals = original_urls(assets)
+        self._heads = {}
+
+    @classmethod
+    def load(cls, static_root, basepath="/", assets=None):
+        rewrite_url = basepath_rewriter(basepath, assets)
+        stylesheets = {}
+        for relative in sorted(scan_files(static_root)):
+            if not relative.lower().endswith(".css"):
+                continue
+            path = "/" + relative.replace(os.sep, "/")
+            with open(os.path.join(static_root, relative), "r") as f:
+                css = f.read()
+            stylesheets[path] = Stylesheet(parse_stylesheet(absolute_css_urls(css, path, rewrite_url)))
+        return cls(stylesheets, basepath, assets)
+
+    def resolve(self, href):
+        return site_path(href, self.basepath, self.originals)
+
+    def digest(self):
+        # Changes whenever the inlined rules could
+        rules = {path: sheet.rules for path, sheet in self.stylesheets.items()}
+        return hash_bytes(json.dumps(rules, sort_keys=True, default=sorted).encode("utf-8"))
+
+    def head_for(self, template):
+        head = self._heads.get(template)
+        if head is None:
+            head = self._heads[template] = TemplateHead(template, self)
+        return head
+
+    def apply(self, template, content):
+        # template with its stylesheet links replaced by <style> elements
+        # for this page's content and a preload for its first image.
+        head = self.head_for(template)
+        scanned = scan_content(content)
+        tokens = None
+        first_image = head.first_image
+        if scanned is not None:
+            tokens = head.tokens | scanned[0]
+            if first_image is None and scanned[1] is not None:
+                first_image = scanned[1]
+                if template.rewrite_url is not None:
+                    first_image = template.rewrite_url(first_image)
+        if not head.links and first_image is None:
+            return template
+
+        segments = list(template.segments)
+        for tag, path in head.links:
+            css = self.stylesheets[path].select(tokens).replace("</", "<\\/")
+            for index in range(0, len(segments), 2):
+                if tag in segments[index]:
+                    segments[index] = segments[index].replace(tag, f"<style>{css}</style>", 1)
+                    break
+        if first_image is not None:
+            preload = f'<link rel="preload" as="image" href="{first_image}">'
+            for index in range(0, len(segments), 2):
+                match = HEAD_END_PATTERN.search(segments[index])
+                if match is not None:
+                    segments[index] = segments[index][:match.start()] + preload + segments[index][match.start():]
+                    break
+        return Template(segments, template.rewrite_url)
+
+
+def absolute_css_urls(css, path, rewrite_url=None):
+    # Relative url()s resolve against the stylesheet, which moves once it is
+    # inlined, so they are made site-absolute (and rewritten) first.
+    directory = posixpath.dirname(path)
+
+    def absolute(match):
+        url = match.group(2).strip()
+        if not url or url.startswith(("data:", "#")) or "://" in url or url.startswith("//"):
+            return match.group(0)
+        if not url.startswith("/"):
+            url = posixpath.normpath(posixpath.join(directory, url))
+        if rewrite_url is not None:
+            url = rewrite_url(url)
+        return f'url("{url}")'
+
+    return CSS_URL_PATTERN.sub(absolute, css)
@@ -0,0 +1,246 @@
+import argparse
+import http.server
+import logging
+import mimetypes
+import os
+import threading
+import time
+
+from converter import markdown_to_html_node
+from main import discover_pages
+from renderer import extract_title
+from template import TemplateLoader
+
+logger = logging.getLogger("site")
+
+
+def snapshot(paths):
+    # path -> mtime for every file under the given files/directories
+    mtimes = {}
+    stack = list(paths)
+    while stack:
+        path = stack.pop()
+        try:
+            if os.path.isdir(path):
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                        else:
+                            mtimes[entry.path] = entry.stat().st_mtime_ns
+            else:
+                mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+    return mtimes
+
+
+class DevSite:
+    # The whole built site, kept in memory and updated file by file.
+    def __init__(self, content_root, static_root, template_path, basepath="/"):
+        self.content_root = content_root
+        self.static_root = static_root
+        self.template_path = template_path
+        self.basepath = basepath
+        self.lock = threading.Lock()
+        # URL path (relative, e.g. "blog/tom/index.html") -> bytes
+        self.files = {}
+        # markdown source -> (URL path, title, content HTML). Kept so a
+        # template change only re-renders pages instead of re-parsing them.
+        self.pages = {}
+        self.templates = None
+        self.mtimes = {}
+
+    def watched_paths(self):
+        return [self.content_root, self.static_root, self.template_path]
+
+    def build(self):
+        self.templates = TemplateLoader(self.template_path, self.content_root, self.basepath)
+        for source, dest in discover_pages(self.content_root, ""):
+            self.update_page(source, dest)
+        for path in snapshot([self.static_root]):
+            self.update_asset(path)
+        self.mtimes = snapshot(self.watched_paths())
+
+    def update_page(self, source, url_path=None):
+        if url_path is None:
+            relative = os.path.relpath(source, self.content_root)
+            url_path = os.path.splitext(relative)[0] + ".html"
+        url_path = url_path.replace(os.sep, "/")
+        with open(source, "r") as f:
+            markdown_content = f.read()
+        template = self.templates.for_page(source)
+        html_content = markdown_to_html_node(markdown_content).to_html(template.rewrite_url)
+        title = extract_title(markdown_content)
+        html = template.render(Title=title, Content=html_content)
+        with self.lock:
+            self.pages[source] = (url_path, title, html_content)
+            self.files[url_path] = html.encode("utf-8")
+
+    def remove_page(self, source):
+        with self.lock:
+            entry = self.pages.pop(source, None)
+            if entry is not None:
+                self.files.pop(entry[0], None)
+
+    def asset_url_path(self, path):
+        return os.path.relpath(path, self.static_root).replace(os.sep, "/")
+
+    def update_asset(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        with self.lock:
+            self.files[self.asset_url_path(path)] = data
+
+    def remove_asset(self, path):
+        with self.lock:
+            self.files.pop(self.asset_url_path(path), None)
+
+    def rerender_all(self):
+        self.templates = TemplateLoader(self.template_path, self.content_root, self.basepath)
+        with self.lock:
+            for source, (url_path, title, html_content) in self.pages.items():
+                template = self.templates.for_page(source)
+                self.files[url_path] = template.render(Title=title, Content=html_content).encode("utf-8")
+
+    def is_template_file(self, path):
+        name = os.path.basename(path)
+        return path == self.template_path or (
+            path.startswith(self.content_root) and name.startswith("_") and name.endswith(".html")
+        )
+
+    def poll(self):
+        # Applies whatever changed since the last poll; returns the changed paths.
+        mtimes = snapshot(self.watched_paths())
+        changed = [path for path, mtime in mtimes.items() if self.mtimes.get(path) != mtime]
+        removed = [path for path in self.mtimes if path not in mtimes]
+        self.mtimes = mtimes
+
+        templates_changed = False
+        for path in sorted(changed + removed):
+            start = time.perf_counter()
+            try:
+                if self.is_template_file(path):
+                    templates_changed = True
+                    continue
+                if path.startswith(self.static_root + os.sep):
+                    if path in mtimes:
+                        self.update_asset(path)
+                    else:
+                        self.remove_asset(path)
+                elif path.endswith(".md"):
+                    if path in mtimes:
+                        self.update_page(path)
+                    else:
+                        self.remove_page(path)
+                else:
+                    continue
+            except Exception as e:
+                logger.error("Failed to rebuild %s: %s", path, e)
+                continue
+            logger.info("Rebuilt %s in %.1f ms", path, (time.perf_counter() - start) * 1000)
+
+        if templates_changed:
+            start = time.perf_counter()
+            try:
+                self.rerender_all()
+            except Exception as e:
+                logger.error("Failed to re-render pages: %s", e)
+            else:
+                logger.info("Re-rendered %d page(s) in %.1f ms", len(self.pages), (time.perf_counter() - start) * 1000)
+        return changed + removed
+
+    def redirect(self, request_path):
+        # Where to send a request for the basepath without its trailing
+        # slash ("/static-web-page"), or None. Serving the home page there
+        # would resolve its relative links against the wrong directory.
+        path, query = (request_path.split("?", 1) + [""])[:2]
+        if self.basepath == "/" or path != self.basepath.rstrip("/"):
+            return None
+        return self.basepath + ("?" + query if query else "")
+
+    def lookup(self, request_path):
+        path = request_path.split("?", 1)[0].split("#", 1)[0]
+        if self.basepath != "/" and path.startswith(self.basepath):
+            path = "/" + path[len(self.basepath):]
+        path = path.lstrip("/")
+        # "/blog/tom" and "/blog/tom/" both serve blog/tom/index.html
+        candidates = []
+        if path and not path.endswith("/"):
+            candidates.append(path)
+        candidates.append((path.rstrip("/") + "/index.html").lstrip("/"))
+        with self.lock:
+            for candidate in candidates:
+                data = self.files.get(candidate)
+                if data is not None:
+                    return candidate, data
+        return None, None
+
+
+def watch(site, interval, stop):
+    while not stop.wait(interval):
+        site.poll()
+
+
+def make_handler(site):
+    class DevRequestHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.respond(send_body=True)
+
+        def do_HEAD(self):
+            self.respond(send_body=False)
+
+        def respond(self, send_body):
+            location = site.redirect(self.path)
+            if location is not None:
+                self.send_response(301)
+                self.send_header("Location", location)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            path, data = site.lookup(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            if send_body:
+                self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return DevRequestHandler
+
+
+def serve(argv):
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Build in memory, watch for changes and serve the site")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds between checks for changed files")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+    site = DevSite("content", "static", "template.html", args.basepath)
+    start = time.perf_counter()
+    site.build()
+    logger.info("Built %d page(s) in %.1f ms", len(site.pages), (time.perf_counter() - start) * 1000)
+
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch, args=(site, args.interval, stop), daemon=True)
+    watcher.start()
+
+    server = http.server.ThreadingHTTPServer((args.bind, args.port), make_handler(site))
+    logger.info("Serving on http://%s:%d%s", args.bind, args.port, args.basepath)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
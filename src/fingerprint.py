@@ -0,0 +1,97 @@
+import json
+import os
+
+from manifest import hash_bytes, hash_file
+from sync import scan_files
+
+# Assets that pages link to by URL and that can be renamed safely. HTML
+# pages, robots.txt, favicons and the like keep their well-known names.
+FINGERPRINT_EXTENSIONS = (
+    ".css", ".js", ".mjs",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg",
+    ".woff", ".woff2", ".ttf", ".otf",
+)
+
+FINGERPRINT_LENGTH = 8
+
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+# Netlify / Cloudflare Pages style: a path line, then indented headers.
+HEADERS_NAME = "_headers"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def fingerprinted_name(relative, digest):
+    base, ext = os.path.splitext(relative)
+    return f"{base}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+def fingerprint_assets(static_root, extensions=FINGERPRINT_EXTENSIONS):
+    # relative path -> fingerprinted relative path for every asset under
+    # static_root, named after a hash of its contents.
+    names = {}
+    for relative in sorted(scan_files(static_root)):
+        if relative.lower().endswith(extensions):
+            names[relative] = fingerprinted_name(relative, hash_file(os.path.join(static_root, relative)))
+    return names
+
+
+def asset_urls(names):
+    # The same mapping as site-absolute URL paths, for rewriting links.
+    return {
+        "/" + relative.replace(os.sep, "/"): "/" + hashed.replace(os.sep, "/")
+        for relative, hashed in sorted(names.items())
+    }
+
+
+def original_urls(urls):
+    # The reverse of asset_urls: fingerprinted URL path -> original.
+    return {hashed: original for original, hashed in (urls or {}).items()}
+
+
+def site_path(url, basepath="/", originals=None):
+    # The site path ("/images/tom.png") a rendered link refers to, undoing
+    # the basepath and fingerprint rewrites, or None for other hosts.
+    if url.startswith("//") or "://" in url or url.startswith("data:"):
+        return None
+    path = url.split("?", 1)[0].split("#", 1)[0]
+    if not path.startswith("/"):
+        return None
+    if basepath != "/" and path.startswith(basepath):
+        path = "/" + path[len(basepath):]
+    return originals.get(path, path) if originals else path
+
+
+def asset_manifest_text(urls):
+    return json.dumps(urls, indent=2, sort_keys=True) + "\n"
+
+
+def headers_text(urls, basepath="/"):
+    lines = []
+    for hashed in sorted(urls.values()):
+        lines.append(basepath + hashed[1:])
+        lines.append(f"  Cache-Control: {IMMUTABLE}")
+    return "\n".join(lines) + "\n"
+
+
+def write_if_changed(path, text, manifest=None, source=None):
+    # Writes a generated file unless it already holds text; with a manifest
+    # the output is recorded so it is pruned once it is no longer produced.
+    data = text.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            changed = f.read() != data
+    except FileNotFoundError:
+        changed = True
+    if manifest is not None:
+        if not manifest.record("generated", source, path, hash_bytes(data), changed):
+            return False
+    elif not changed:
+        return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def write_asset_files(dest_root, urls, basepath="/", manifest=None, source=None):
+    write_if_changed(os.path.join(dest_root, ASSET_MANIFEST_NAME), asset_manifest_text(urls), manifest, source)
+    write_if_changed(os.path.join(dest_root, HEADERS_NAME), headers_text(urls, basepath), manifest, source)
@@ -0,0 +1,145 @@
+import json
+import os
+
+from htmlnode import FragmentNode
+from manifest import CONVERTER_VERSION, hash_bytes
+from profiling import no_phase
+
+FRAGMENT_CACHE_DIR = ".fragment_cache"
+
+# Bump when the layout of an entry changes, so old entries are ignored.
+FORMAT_VERSION = 1
+
+
+class FragmentCache:
+    # Each page's rendered {{ Content }} and title, one JSON file per page
+    # under root, keyed by the markdown's hash and the converter version.
+    # Entries hold no paths, template output or basepath (href/src values
+    # are stored apart from the HTML and rewritten at render time), so a
+    # template or basepath change reuses every entry, and the directory can
+    # be saved and restored between CI runs as is. A read_only cache (for
+    # --plan) looks entries up but never stores or touches them.
+    def __init__(self, root=FRAGMENT_CACHE_DIR, max_bytes=256 << 20, read_only=False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def key(self, markdown):
+        return hash_bytes(f"{FORMAT_VERSION}:{CONVERTER_VERSION}\0{markdown}".encode("utf-8"))
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def load(self, key):
+        # (title, FragmentNode) for a cached page, or None
+        path = self.path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            title, parts, urls = entry["title"], entry["parts"], entry["urls"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing, truncated or from an incompatible version: rebuild it.
+            self.misses += 1
+            return None
+        if len(parts) != len(urls) + 1:
+            self.misses += 1
+            return None
+        if not self.read_only:
+            try:
+                # Eviction drops the least recently used entries first.
+                os.utime(path)
+            except OSError:
+                pass
+        self.hits += 1
+        return title, FragmentNode(tuple(parts), tuple(urls))
+
+    def store(self, key, title, fragment):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"title": title, "parts": list(fragment.parts), "urls": list(fragment.urls)}
+        # Written under a temporary name and renamed, so a build running in
+        # parallel (or killed halfway) never leaves a half-written entry.
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp, path)
+        self.writes += 1
+
+    def render(self, markdown, render_content, extract_title, phase=no_phase):
+        # (title, content node) for a page: from the cache when there is an
+        # entry, otherwise from render_content(markdown), stored for next time.
+        with phase("fragment_cache"):
+            key = self.key(markdown)
+            entry = self.load(key)
+        if entry is not None:
+            phase.cached()
+            return entry
+        node = render_content(markdown)
+        title = extract_title(markdown)
+        with phase("fragment_cache"):
+            fragment = FragmentNode.from_node(node)
+            if fragment is None:
+                return title, node
+            if not self.read_only:
+                self.store(key, title, fragment)
+        return title, fragment
+
+    def evict(self):
+        # Deletes the least recently used entries until the cache fits in
+        # max_bytes; returns the number of entries removed.
+        entries = []
+        total = 0
+        if not os.path.isdir(self.root):
+            return 0
+        with os.scandir(self.root) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                            total += stat.st_size
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def counts(self):
+        return self.hits, self.misses, self.writes
+
+    def add_counts(self, hits, misses, writes=0):
+        # Counters reported back by worker processes
+        self.hits += hits
+        self.misses += misses
+        self.writes += writes
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "root": self.root,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (
+            f"Fragment cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['writes']} written"
+        )
@@ -1,20 +1,72 @@
+import sys
+
 from textnode import TextType, TextNode
 
+# Attributes holding URLs, which get rewritten for the site's basepath.
+URL_ATTRIBUTES = ("href", "src")
+
+# Shared by every LeafNode instead of giving each one its own empty list.
+NO_CHILDREN = ()
+
+# write_html batches small chunks into writes of roughly this many characters.
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+def write_chunks(stream, chunks, buffer_size=WRITE_BUFFER_SIZE):
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= buffer_size:
+            stream.write("".join(pending))
+            pending = []
+            pending_size = 0
+    if pending:
+        stream.write("".join(pending))
+
 class HTMLNode():
+    # Pages are made of a great many small nodes, so skip the per-instance
+    # __dict__ and share one copy of each tag name.
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
+        if tag.__class__ is str:
+            tag = sys.intern(tag)
         self.tag = tag
         self.value = value
         self.children = children
         self.props = props
     
-    def to_html(self):
+    def to_html(self, rewrite_url=None):
         raise NotImplementedError
+
+    def iter_html(self, rewrite_url=None):
+        # Walks the tree with an explicit stack instead of recursing, so deep
+        # nesting can't hit the recursion limit. The stack holds nodes still
+        # to be opened and the closing tags (plain strings) owed to parents.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.__class__ is str:
+                yield node
+            elif isinstance(node, ParentNode):
+                yield node.open_tag(rewrite_url)
+                stack.append(f"</{node.tag}>")
+                stack.extend(reversed(node.children))
+            else:
+                yield node.to_html(rewrite_url)
+
+    def write_html(self, stream, rewrite_url=None):
+        write_chunks(stream, self.iter_html(rewrite_url))
     
-    def props_to_html(self):
+    def props_to_html(self, rewrite_url=None):
         if self.props is None:
             return ""
         props_html = "" 
         for prop, value in self.props.items():
+            if rewrite_url is not None and prop in URL_ATTRIBUTES:
+                value = rewrite_url(value)
             props_html += f' {prop}="{value}"'
         return props_html
         
@@ -23,43 +75,85 @@ class HTMLNode():
         return f"HTMLNode(tag={self.tag!r}, value={self.value!r}, children={self.children!r}, props={self.props!r})"
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
                 
-        super().__init__(tag, value, [], props)
+        super().__init__(tag, value, NO_CHILDREN, props)
 
-    def to_html(self):
+    def to_html(self, rewrite_url=None):
         if self.value is None:
             raise ValueError("LeafNode must have a value")
         
         if self.tag is None:
             return self.value
         
-        attrs_str = ""
-        if self.props:
-            for attr, value in self.props.items():
-                attrs_str += f' {attr}="{value}"'
-        return f"<{self.tag}{attrs_str}>{self.value}</{self.tag}>"
+        return f"<{self.tag}{self.props_to_html(rewrite_url)}>{self.value}</{self.tag}>"
     
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None ):
         super().__init__(tag, value=None, children=children, props= props )
 
-    def to_html(self):
+    def open_tag(self, rewrite_url=None):
         if not self.tag:
             raise ValueError("ParentNod is missing a tag")
         if not self.children:
             raise ValueError("ParentNode is missing required children")
-        html = f"<{self.tag}{self.props_to_html()}>"
+        return f"<{self.tag}{self.props_to_html(rewrite_url)}>"
+
+    def to_html(self, rewrite_url=None):
+        return "".join(self.iter_html(rewrite_url))
+    
+# Stands in for each href/src value while a fragment is captured.
+FRAGMENT_URL_MARKER = "\x00"
 
-        for child in self.children:
-            html += child.to_html()
+class FragmentNode(HTMLNode):
+    # Already-rendered HTML, e.g. a block served from a cache. The href/src
+    # values are kept apart from the literal text so they can still be
+    # rewritten for whatever basepath the page is rendered with.
+    __slots__ = ("parts", "urls")
 
-        html += f"</{self.tag}>"
+    def __init__(self, parts, urls):
+        super().__init__(None, None, NO_CHILDREN, None)
+        self.parts = parts
+        self.urls = urls
 
+    @classmethod
+    def from_node(cls, node):
+        urls = []
 
-        return html
+        def capture(url):
+            urls.append(url)
+            return FRAGMENT_URL_MARKER
+
+        html = node.to_html(capture)
+        parts = html.split(FRAGMENT_URL_MARKER)
+        if len(parts) != len(urls) + 1:
+            # The text itself contained the marker; this can't be captured.
+            return None
+        return cls(tuple(parts), tuple(urls))
+
+    def to_html(self, rewrite_url=None):
+        if not self.urls:
+            return self.parts[0]
+        chunks = [self.parts[0]]
+        for url, part in zip(self.urls, self.parts[1:]):
+            chunks.append(url if rewrite_url is None else rewrite_url(url))
+            chunks.append(part)
+        return "".join(chunks)
+
+    def __repr__(self):
+        return f"FragmentNode(parts={self.parts!r}, urls={self.urls!r})"
     
 def text_node_to_html_node(text_node):
+    children = getattr(text_node, "children", None)
+    if children:
+        # A span with nested spans inside, e.g. bold inside italic
+        html_node = text_node_to_html_node(TextNode(text_node.text, text_node.text_type, text_node.url))
+        html_children = [text_node_to_html_node(child) for child in children]
+        return ParentNode(html_node.tag, html_children, html_node.props)
     match text_node.text_type:
         case TextType.TEXT:
             return LeafNode(None, text_node.text)
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import re
+import struct
+
+from fingerprint import original_urls, site_path
+from manifest import hash_bytes
+from minify import CLOSING_PATTERNS, PRESERVE_TAGS
+from sync import scan_files
+
+logger = logging.getLogger("site")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+IMAGE_INDEX_PATH = ".image_index.json"
+
+# An <img> tag, or the start of an element whose content is left as is
+TAG_START_PATTERN = re.compile(rf"<(img|{'|'.join(sorted(PRESERVE_TAGS))})\b", re.I)
+SRC_PATTERN = re.compile(r"""\ssrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+
+# JPEG start-of-frame markers, which carry the image size
+JPEG_SOF_MARKERS = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+
+
+def jpeg_size(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # Markers without a length field
+            continue
+        header = f.read(2)
+        if len(header) != 2:
+            return None
+        length = struct.unpack(">H", header)[0]
+        if marker in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) != 5:
+                return None
+            height, width = struct.unpack(">xHH", frame)
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_size(path):
+    # (width, height) from the header of a PNG, GIF, JPEG or WebP file, or
+    # None when the format isn't recognised. Reads only a few bytes, except
+    # for JPEGs whose frame header follows large metadata segments.
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+            chunk = head[12:16]
+            if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+                width, height = struct.unpack("<HH", head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L" and head[20] == 0x2F:
+                b0, b1, b2, b3 = head[21:25]
+                return 1 + (b0 | (b1 & 0x3F) << 8), 1 + ((b1 >> 6) | (b2 << 2) | (b3 & 0x0F) << 10)
+            if chunk == b"VP8X":
+                return 1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little")
+            return None
+        if head.startswith(b"\xff\xd8"):
+            return jpeg_size(f)
+    return None
+
+
+class ImageIndex:
+    # Width and height of every image under static_root, kept in a JSON file
+    # keyed by relative path and checked against each file's size and mtime,
+    # so only new or changed images have their headers read.
+    def __init__(self, static_root, path=IMAGE_INDEX_PATH):
+        self.static_root = static_root
+        self.path = path
+        # relative path -> [size, mtime_ns, width, height]
+        self.entries = {}
+        # Site path ("/images/tom.svg") of every file under static_root
+        self.files = set()
+        self.read = 0
+
+    @classmethod
+    def load(cls, static_root, path=IMAGE_INDEX_PATH):
+        index = cls(static_root, path)
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    index.entries = json.load(f)
+                except json.JSONDecodeError:
+                    index.entries = {}
+        index.refresh()
+        return index
+
+    def refresh(self):
+        entries = {}
+        files = scan_files(self.static_root)
+        self.files = {"/" + relative.replace(os.sep, "/") for relative in files}
+        for relative, stat in sorted(files.items()):
+            if not relative.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            key = relative.replace(os.sep, "/")
+            old = self.entries.get(key)
+            if old is not None and old[:2] == [stat.st_size, stat.st_mtime_ns]:
+                entries[key] = old
+                continue
+            try:
+                size = read_image_size(os.path.join(self.static_root, relative))
+            except (OSError, struct.error, IndexError):
+                size = None
+            if size is None:
+                logger.warning("Can't read the size of image %s", os.path.join(self.static_root, relative))
+                continue
+            entries[key] = [stat.st_size, stat.st_mtime_ns, size[0], size[1]]
+            self.read += 1
+        self.entries = entries
+
+    def dimensions(self):
+        # "/images/tom.png" -> (width, height)
+        return {"/" + key: (entry[2], entry[3]) for key, entry in self.entries.items()}
+
+    def digest(self):
+        # Changes whenever any image's dimensions do
+        return hash_bytes(json.dumps(self.dimensions(), sort_keys=True).encode("utf-8"))
+
+    def save(self):
+        if self.path is None:
+            return
+        with open(self.path, "w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+
+
+class ImageAttributes:
+    # Adds width/height and lazy loading to the <img> tags of rendered pages.
+    # Tags are found in the final HTML, after the basepath and fingerprint
+    # rewrites, so this works the same for cached fragments and templates.
+    # With files, the site paths of every static file, an image of any type
+    # that doesn't exist is reported; without it only the formats with
+    # dimensions are checked.
+    def __init__(self, dimensions, basepath="/", assets=None, files=None):
+        self.dimensions = dimensions
+        self.basepath = basepath
+        self.files = files
+        # Fingerprinted name -> original, to find the image a link points at
+        self.originals = original_urls(assets)
+
+    def resolve(self, src):
+        return site_path(src, self.basepath, self.originals)
+
+    def annotate(self, tag, first, page=None):
+        match = SRC_PATTERN.search(tag)
+        if match is None:
+            return tag
+        lowered = tag.lower()
+        extra = []
+        src = next(group for group in match.groups() if group is not None)
+        path = self.resolve(src)
+        size = self.dimensions.get(path) if path is not None else None
+        if size is not None:
+            if " width=" not in lowered and " height=" not in lowered:
+                extra.append(f' width="{size[0]}" height="{size[1]}"')
+        elif path is not None:
+            # An SVG has no dimensions in the index but may well exist
+            missing = path not in self.files if self.files is not None else path.lower().endswith(IMAGE_EXTENSIONS)
+            if missing:
+                logger.warning("Image %s%s doesn't exist under static/", src, f" (in {page})" if page else "")
+        if not first:
+            # The first image is likely above the fold, so it loads eagerly.
+            if " loading=" not in lowered:
+                extra.append(' loading="lazy"')
+            if " decoding=" not in lowered:
+                extra.append(' decoding="async"')
+        if not extra:
+            return tag
+        end = len(tag) - 2 if tag.endswith("/>") else len(tag) - 1
+        head = tag[:end].rstrip()
+        return head + "".join(extra) + tag[len(head):]
+
+    def writer(self, stream, page=None):
+        return ImageTagWriter(stream, self, page)
+
+    def annotate_html(self, html, page=None):
+        writer = ImageTagWriter(None, self, page)
+        return writer.feed(html) + writer.flush()
+
+
+class ImageTagWriter:
+    # A text stream wrapper that annotates <img> tags as a page is written
+    # through it. Like HTMLMinifier, it leaves the content of <pre>, <code>
+    # and the other PRESERVE_TAGS alone, so an <img> written out as an
+    # example isn't changed. Only a possibly unfinished tag at the end of a
+    # write is held back.
+    def __init__(self, stream, attributes, page=None):
+        self.stream = stream
+        self.attributes = attributes
+        self.page = page
+        self.carry = ""
+        self.images = 0
+        # Pattern for the closing tag ending the preserved element we're in
+        self.raw_end = None
+
+    def feed(self, chunk):
+        buffer = self.carry + chunk if self.carry else chunk
+        self.carry = ""
+        out = []
+        position = 0
+        length = len(buffer)
+        while position < length:
+            if self.raw_end is not None:
+                match = self.raw_end.search(buffer, position)
+                if match is None:
+                    # Keep back just enough to spot a closing tag split across chunks
+                    keep = max(position, length - len(self.raw_end.pattern) + 1)
+                    out.append(buffer[position:keep])
+                    self.carry = buffer[keep:]
+                    break
+                out.append(buffer[position:match.start()])
+                position = match.start()
+                self.raw_end = None
+                continue
+            match = TAG_START_PATTERN.search(buffer, position)
+            if match is None:
+                # Hold back from the last "<" that hasn't been closed yet
+                lt = buffer.rfind("<", position)
+                if lt != -1 and buffer.find(">", lt) == -1:
+                    out.append(buffer[position:lt])
+                    self.carry = buffer[lt:]
+                else:
+                    out.append(buffer[position:])
+                break
+            gt = buffer.find(">", match.start())
+            if gt == -1:
+                out.append(buffer[position:match.start()])
+                self.carry = buffer[match.start():]
+                break
+            out.append(buffer[position:match.start()])
+            tag = buffer[match.start():gt + 1]
+            name = match.group(1).lower()
+            if name == "img":
+                first = self.images == 0
+                self.images += 1
+                tag = self.attributes.annotate(tag, first, self.page)
+            elif not tag.endswith("/>"):
+                self.raw_end = CLOSING_PATTERNS[name]
+            out.append(tag)
+            position = gt + 1
+        return "".join(out)
+
+    def flush(self):
+        rest, self.carry = self.carry, ""
+        return rest
+
+    def write(self, text):
+        self.stream.write(self.feed(text))
+
+    def close(self):
+        self.stream.write(self.flush())
@@ -0,0 +1,79 @@
+import contextlib
+import mmap
+import os
+
+from converter import iter_block_nodes
+from profiling import no_phase
+
+# Sources at least this big are memory-mapped and converted block by block
+# instead of being read into one string.
+LARGE_FILE_SIZE = 32 << 20
+
+
+@contextlib.contextmanager
+def map_file(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap can't map an empty file
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def iter_mapped_lines(mapped):
+    # Decoded lines of a mapped file, one at a time. Only the current line
+    # is ever copied out of the mapping.
+    if not mapped:
+        return
+    mapped.seek(0)
+    for line in iter(mapped.readline, b""):
+        yield line.decode("utf-8").rstrip("\r\n")
+
+
+def find_title(mapped):
+    # The same title extract_title finds, located with a search over the
+    # mapping rather than by splitting the whole file into lines.
+    if mapped[:2] == b"# ":
+        start = 0
+    else:
+        start = mapped.find(b"\n# ")
+        if start == -1:
+            raise Exception("No h1 header found in the markdown")
+        start += 1
+    end = mapped.find(b"\n", start)
+    if end == -1:
+        end = len(mapped)
+    return mapped[start + 2:end].decode("utf-8").strip()
+
+
+class StreamedContent:
+    # Stands in for the page's content node in a template slot, converting
+    # the source one block at a time while the page is written. Produces
+    # the same HTML as markdown_to_html_node(source).
+    def __init__(self, lines, cache=None, phase=no_phase):
+        self.lines = lines
+        self.cache = cache
+        self.phase = phase
+
+    def iter_html(self, rewrite_url=None):
+        yield "<div>"
+        for node in iter_block_nodes(self.lines, self.cache):
+            self.phase.converted(node)
+            yield from node.iter_html(rewrite_url)
+        yield "</div>"
+
+
+def write_large_page(from_path, dest_path, renderer, phase=no_phase):
+    # Peak memory is a small multiple of the largest block: the source stays
+    # in the page cache, the scanner holds one block's lines, and output is
+    # flushed in WRITE_BUFFER_SIZE batches.
+    with map_file(from_path) as mapped:
+        title = find_title(mapped)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        with open(dest_path, "w") as f:
+            content = StreamedContent(iter_mapped_lines(mapped), renderer.cache, phase)
+            for store in (renderer.search, renderer.links):
+                if store is not None:
+                    store.add_page(from_path, title, content)
+            renderer.write_content(f, from_path, title, content)
@@ -0,0 +1,138 @@
+import logging
+import os
+import posixpath
+
+from htmlnode import FragmentNode, HTMLNode
+from pagestore import PageStore
+
+logger = logging.getLogger("site")
+
+LINK_GRAPH_PATH = ".link_graph.json"
+
+# Links that never point at a file of the site
+EXTERNAL_PREFIXES = ("#", "//", "mailto:", "tel:", "data:", "javascript:")
+
+
+def page_links(node):
+    # Every href and src in a content node, in document order, as written in
+    # the markdown. A cached fragment keeps its URLs apart from its text.
+    links = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, FragmentNode):
+            links.extend(node.urls)
+            continue
+        if node.props:
+            for name in ("href", "src"):
+                if name in node.props:
+                    links.append(node.props[name])
+        if node.children:
+            stack.extend(reversed(node.children))
+    return links
+
+
+def resolve_link(url, page_path):
+    # The site path ("/blog/tom/") a link on the page at page_path points
+    # at, or None for links off the site.
+    if not url or url.startswith(EXTERNAL_PREFIXES) or "://" in url:
+        return None
+    path = url.split("#", 1)[0].split("?", 1)[0]
+    if not path:
+        return None
+    if not path.startswith("/"):
+        path = posixpath.join(posixpath.dirname(page_path), path)
+    trailing = path.endswith("/")
+    path = posixpath.normpath(path)
+    if trailing and path != "/":
+        path += "/"
+    return path
+
+
+def link_candidates(path):
+    # The output files a server would answer a request for path with
+    if path.endswith("/"):
+        return (path + "index.html",)
+    return (path, path + "/index.html", path + ".html")
+
+
+def output_paths(outputs, dest_root):
+    # dest path -> site path ("/blog/tom/index.html") for a manifest's outputs
+    return {dest: "/" + os.path.relpath(dest, dest_root).replace(os.sep, "/") for dest in outputs}
+
+
+class LinkReport:
+    def __init__(self):
+        self.links = 0
+        # (source, url) for internal links that match no output
+        self.broken = []
+        # page site path -> sources of the other pages linking to it
+        self.backlinks = {}
+        # site paths of pages no other page links to
+        self.orphans = []
+
+    def log(self, level=logging.WARNING):
+        for source, url in self.broken:
+            logger.log(level, "Broken link in %s: %s", source, url)
+        for path in self.orphans:
+            logger.info("No page links to %s", path)
+
+    def report(self):
+        return {
+            "links": self.links,
+            "broken": [{"source": source, "url": url} for source, url in self.broken],
+            "backlinks": self.backlinks,
+            "orphans": self.orphans,
+        }
+
+    def summary(self):
+        return (
+            f"Links: {self.links} internal link(s), {len(self.broken)} broken, "
+            f"{len(self.orphans)} orphan page(s)"
+        )
+
+
+class LinkGraph(PageStore):
+    # The links and images of every page, kept between builds so that an
+    # incremental build only walks the pages it rebuilt, and checked in one
+    # pass against the set of files the build produced.
+    def __init__(self, path=LINK_GRAPH_PATH):
+        super().__init__(path)
+
+    @classmethod
+    def load(cls, path=LINK_GRAPH_PATH):
+        graph = cls(path)
+        graph.read()
+        return graph
+
+    def document(self, source, title, node):
+        if not isinstance(node, HTMLNode):
+            # Content streamed while it is written (a large file)
+            logger.warning("Links in %s aren't checked: it is too large to walk", source)
+            return []
+        return page_links(node)
+
+    def check(self, pages, targets, root="/index.html"):
+        # pages: source -> site path of the page built from it. targets:
+        # every site path the build wrote (pages, static files and generated
+        # files). Pages other than root that nothing links to are orphans.
+        report = LinkReport()
+        targets = set(targets)
+        backlinks = {path: set() for path in pages.values()}
+        for source in sorted(self.pages):
+            page_path = pages.get(source)
+            if page_path is None:
+                continue
+            for url in self.pages[source]:
+                path = resolve_link(url, page_path)
+                if path is None:
+                    continue
+                report.links += 1
+                target = next((candidate for candidate in link_candidates(path) if candidate in targets), None)
+                if target is None:
+                    report.broken.append((source, url))
+                elif target in backlinks and target != page_path:
+                    backlinks[target].add(source)
+        report.backlinks = {path: sorted(sources) for path, sources in sorted(backlinks.items())}
+        report.orphans = [path for path, sources in report.backlinks.items() if not sources and path != root]
+        return report
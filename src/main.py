@@ -1,86 +1,522 @@
 from textnode import TextNode, TextType
+import argparse
+import concurrent.futures
+import json
+import logging
 import shutil
 import os
 from converter import *
+from manifest import BuildManifest, MANIFEST_PATH, build_settings
+from template import TemplateLoader, template_files
+from profiling import BuildProfile, PagePhases, build_phases
+from sync import LINK_MODES, sync_static
+from pipeline import generate_pages_pipelined
+from blockcache import BlockCache
+from fragmentcache import FRAGMENT_CACHE_DIR, FragmentCache
+from largefile import LARGE_FILE_SIZE, write_large_page
+from renderer import RenderOptions, SiteRenderer, extract_title
+from compress import GZIP_MIN_SIZE, precompress
+from fingerprint import asset_urls, fingerprint_assets, write_asset_files
+from minify import MinifyStats
+from images import ImageAttributes, ImageIndex
+from critical import CriticalCSS
+from search import SearchIndex
+from linkgraph import LinkGraph, output_paths
+from publish import BUILDS_DIR, KEEP_BUILDS, check_link, live_build, publish, start_build
 import sys
 
+logger = logging.getLogger("site")
 
-def main():
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the static site into docs/")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="keep docs/ and only rebuild outputs whose inputs changed",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="list what an incremental build would do without writing anything",
+    )
+    parser.add_argument(
+        "--staged",
+        metavar="LINK",
+        help=f"build into {BUILDS_DIR}/ and point the symlink LINK (the path your server serves) at it once the build succeeds",
+    )
+    parser.add_argument(
+        "--keep-builds",
+        type=int,
+        default=KEEP_BUILDS,
+        metavar="N",
+        help=f"with --staged, previous builds kept for 'main.py rollback' (default {KEEP_BUILDS})",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes for page generation (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="overlap reading, converting and writing pages (for slow or networked disks)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        help="pages buffered between pipeline stages",
+    )
+    parser.add_argument(
+        "--block-cache",
+        type=int,
+        default=0,
+        metavar="N",
+        help="reuse the rendered HTML of up to N repeated blocks (0 = off)",
+    )
+    parser.add_argument(
+        "--fragment-cache",
+        nargs="?",
+        const=FRAGMENT_CACHE_DIR,
+        metavar="DIR",
+        help=f"keep each page's rendered content in DIR across builds (default: {FRAGMENT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--fragment-cache-size",
+        type=int,
+        default=256,
+        metavar="MB",
+        help="evict the least recently used fragments beyond this size",
+    )
+    parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="compare static files by content hash instead of size and mtime",
+    )
+    parser.add_argument(
+        "--link",
+        choices=LINK_MODES,
+        help="hard link or reflink static files into docs/ instead of copying them",
+    )
+    parser.add_argument(
+        "--copy-jobs",
+        type=int,
+        default=4,
+        help="number of threads copying static files",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="also copy assets under content-hashed names and link pages to those",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="collapse whitespace, drop comments and optional quotes in generated pages",
+    )
+    parser.add_argument(
+        "--image-attributes",
+        action="store_true",
+        help="add width/height and lazy loading to <img> tags, from the images in static/",
+    )
+    parser.add_argument(
+        "--critical-css",
+        action="store_true",
+        help="inline the rules of static/ stylesheets each page uses, and preload its first image",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="write a sharded search index of every page's text to docs/search/",
+    )
+    parser.add_argument(
+        "--check-links",
+        nargs="?",
+        const="warn",
+        choices=("warn", "error"),
+        help="check every page's internal links and images against the built files; "
+        "with 'error', broken links fail the build",
+    )
+    parser.add_argument(
+        "--link-report",
+        metavar="REPORT",
+        help="with --check-links, write broken links, backlinks and orphan pages to this JSON file",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="write precompressed .gz siblings of HTML/CSS/JS outputs (for gzip_static)",
+    )
+    parser.add_argument(
+        "--gzip-min-size",
+        type=int,
+        default=GZIP_MIN_SIZE,
+        metavar="BYTES",
+        help="only precompress files at least this big",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="build_profile.json",
+        metavar="REPORT",
+        help="time each build phase per page and write a JSON report (default: build_profile.json)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        help="number of slowest pages to list after a profiled build",
+    )
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="only log warnings and errors")
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="log debug details")
+    args = parser.parse_args(argv)
+    if args.pipeline and args.jobs != 1:
+        parser.error("--pipeline cannot be combined with --jobs")
+    if args.pipeline and args.profile:
+        parser.error("--pipeline reports its own stage timings; it cannot be combined with --profile")
+    if args.staged and (args.incremental or args.plan):
+        parser.error("--staged always builds a complete new copy; it cannot be combined with --incremental or --plan")
+    return args
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve":
+        from devserver import serve
+        serve(argv[1:])
+        return
+    if argv and argv[0] == "render-server":
+        from renderserver import serve as serve_renders
+        serve_renders(argv[1:])
+        return
+    if argv and argv[0] == "rollback":
+        from publish import main as rollback
+        rollback(argv[1:])
+        return
+    args = parse_args(argv)
+    configure_logging(args)
     # Get basepath from command line args or default to "/"
-    basepath = sys.argv[1] if len(sys.argv) > 1 else "/"
+    basepath = args.basepath
     destination_path = "docs"
     source_path = "static"
-    if os.path.exists(destination_path):
-        shutil.rmtree(destination_path) 
-
-    os.mkdir(destination_path)
-
-    copy_static_files(source_path, destination_path)
     page_source = "content"
     template_source = "template.html"
     dest_path = "docs"
-    generate_pages_recursive(page_source, template_source, dest_path, basepath)
 
-def copy_static_files(current_path, destination_path):
-    contents = os.listdir(current_path)
-    for thing in contents:
-        full_source_path = os.path.join(current_path, thing)
-        full_dest_path = os.path.join(destination_path, thing)
-        if os.path.isfile(full_source_path):
-            print(f"Copying file: {full_source_path} to {full_dest_path}")
-            shutil.copy(full_source_path, full_dest_path)
-        if os.path.isdir(full_source_path):
-            os.mkdir(full_dest_path)
-            print(f"Creating directory: {full_dest_path}")
-            copy_static_files(full_source_path, full_dest_path)
+    # Fingerprinted names are decided up front: they are part of every page.
+    names = fingerprint_assets(source_path) if args.fingerprint else None
+    assets = asset_urls(names) if names is not None else None
+    images = None
+    image_digest = None
+    if args.image_attributes:
+        index = ImageIndex.load(source_path)
+        if not args.plan:
+            index.save()
+        logger.debug("Read the size of %d image(s)", index.read)
+        images = ImageAttributes(index.dimensions(), basepath, assets, index.files)
+        image_digest = index.digest()
+    critical = None
+    critical_digest = None
+    if args.critical_css:
+        critical = CriticalCSS.load(source_path, basepath, assets)
+        critical_digest = critical.digest()
+    settings = build_settings(
+        template_files(template_source, page_source), basepath, assets, image_digest, critical_digest, args.minify
+    )
+    if live_build(destination_path) is not None and not (args.staged or args.plan):
+        # Writing in place would change a kept build
+        raise Exception(f"{destination_path} links to a staged build; build with --staged")
+    if args.staged:
+        # Refused before anything is built rather than after
+        check_link(args.staged)
+        # Everything is written to a new directory that nothing serves yet
+        destination_path = dest_path = start_build(BUILDS_DIR)
+        manifest = BuildManifest(MANIFEST_PATH, settings, root=destination_path)
+    elif args.incremental or args.plan:
+        manifest = BuildManifest.load(MANIFEST_PATH, settings, dry_run=args.plan, root=destination_path)
+        if args.incremental and manifest.previous_root not in (None, destination_path) and live_build(manifest.previous_root) is not None:
+            # Its outputs live in a kept build, not in destination_path
+            raise Exception(
+                f"The last build was published to {manifest.previous_root} with --staged; "
+                f"build with --staged {manifest.previous_root}, or without --incremental"
+            )
+    else:
+        if os.path.exists(destination_path):
+            shutil.rmtree(destination_path)
+        manifest = BuildManifest(MANIFEST_PATH, settings, root=destination_path)
 
-def extract_title(markdown):
+    if not manifest.dry_run:
+        os.makedirs(destination_path, exist_ok=True)
 
-    lines = markdown.split("\n")
+    profile = BuildProfile() if args.profile else None
+    phase = build_phases(profile)
+    cache = BlockCache(args.block_cache) if args.block_cache > 0 else None
+    minify = MinifyStats() if args.minify else None
+    search = SearchIndex.load(page_source, basepath) if args.search else None
+    links = LinkGraph.load() if args.check_links else None
+    fragments = None
+    if args.fragment_cache:
+        fragments = FragmentCache(args.fragment_cache, args.fragment_cache_size << 20, read_only=manifest.dry_run)
 
-    for line in lines:
-        if line.startswith('# '):
-            return line[2:].strip()
-    raise Exception("No h1 header found in the markdown")
+    static_options = {"checksum": args.checksum, "link": args.link, "jobs": args.copy_jobs, "aliases": names}
+    with phase("static"):
+        copy_static_files(source_path, destination_path, manifest, **static_options)
+    if assets is not None:
+        write_asset_files(destination_path, assets, basepath, manifest, source_path)
+    options = RenderOptions(cache, fragments, assets, minify, images, critical, search, links)
+    if args.pipeline:
+        generate_pages_recursive(page_source, template_source, dest_path, basepath, manifest, pipeline=True, queue_size=args.queue_size, options=options)
+    else:
+        generate_pages_recursive(page_source, template_source, dest_path, basepath, manifest, args.jobs, profile, options=options)
+    # Every page of the site, including those an incremental build skipped
+    page_outputs = {output["source"]: dest for dest, output in manifest.outputs.items() if output["kind"] == "page"}
+    if search is not None:
+        sources = list(page_outputs)
+        renderer = SiteRenderer(None, cache, fragments)
+        with phase("search"):
+            search.update(sources, renderer.content)
+            search.write(destination_path, manifest)
+        if profile is not None:
+            profile.extra["search"] = search.report()
+        logger.info(search.summary())
+        if not manifest.dry_run:
+            search.save()
+    if links is not None:
+        check_links(links, page_outputs, manifest, destination_path, SiteRenderer(None, cache, fragments), args, profile)
+    manifest.prune(destination_path)
 
-def generate_page(from_path, template_path, dest_path, basepath):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+    if args.gzip and not manifest.dry_run:
+        # Copied static files are left alone, even ones ending in .gz
+        static_outputs = [os.path.relpath(dest, destination_path) for dest, output in manifest.outputs.items() if output["kind"] == "static"]
+        gzip_options = {"min_size": args.gzip_min_size, "jobs": os.cpu_count() or 1, "assets": static_outputs}
+        with phase("gzip"):
+            gzipped = precompress(destination_path, **gzip_options)
+        if profile is not None:
+            profile.extra["gzip"] = gzipped.report()
+        logger.info(gzipped.summary())
 
-    with open(from_path, 'r') as f:
-        markdown_content = f.read()
+    if args.staged:
+        with phase("publish"):
+            published = publish(destination_path, args.staged, BUILDS_DIR, args.keep_builds)
+        logger.info(published.summary())
+        manifest.rebase(destination_path, args.staged)
+
+    if cache is not None:
+        logger.info(cache.summary())
+    if minify is not None:
+        logger.info(minify.summary())
+    if fragments is not None:
+        if not manifest.dry_run:
+            fragments.evict()
+        logger.info(fragments.summary())
+    if profile is not None:
+        if cache is not None:
+            profile.extra["block_cache"] = cache.stats()
+        if fragments is not None:
+            profile.extra["fragment_cache"] = fragments.stats()
+        if minify is not None:
+            profile.extra["minify"] = minify.report()
+        profile.write_report(args.profile)
+        print(profile.summary(args.profile_top))
+        print(f"Profile report written to {args.profile}")
 
-    with open(template_path, 'r') as f:
-        template_content = f.read()
+    if manifest.dry_run:
+        for action, path in manifest.plan:
+            print(f"{action}: {path}")
+        print(f"{len(manifest.plan)} output(s) would change")
+        return
+    manifest.save()
 
-    html_node = markdown_to_html_node(markdown_content)
-    html_content = html_node.to_html()
+def check_links(links, page_outputs, manifest, destination_path, renderer, args, profile=None):
+    # One pass over the recorded links: no output is read back from disk.
+    with build_phases(profile)("links"):
+        links.update(page_outputs, renderer.content)
+        sites = output_paths(manifest.outputs, destination_path)
+        report = links.check({source: sites[dest] for source, dest in page_outputs.items()}, sites.values())
+    if profile is not None:
+        profile.extra["links"] = {"links": report.links, "broken": len(report.broken), "orphans": len(report.orphans)}
+    report.log(logging.ERROR if args.check_links == "error" else logging.WARNING)
+    logger.info(report.summary())
+    if args.link_report and not manifest.dry_run:
+        with open(args.link_report, "w") as f:
+            json.dump(report.report(), f, indent=2, sort_keys=True)
+    if not manifest.dry_run:
+        links.save()
+    if args.check_links == "error" and report.broken:
+        raise Exception(f"{len(report.broken)} broken link(s)")
 
-    title = extract_title(markdown_content)
+def configure_logging(args):
+    level = logging.INFO
+    if args.quiet:
+        level = logging.WARNING
+    elif args.verbose:
+        level = logging.DEBUG
+    logging.basicConfig(format="%(message)s", level=level)
 
-    final_html = template_content.replace("{{ Title }}", title)
-    final_html = final_html.replace("{{ Content }}", html_content)
-    final_html = final_html.replace('href="/', f'href="{basepath}')
-    final_html = final_html.replace('src="/', f'src="{basepath}')
+def copy_static_files(current_path, destination_path, manifest=None, checksum=False, link=None, jobs=4, aliases=None):
+    result = sync_static(current_path, destination_path, manifest, checksum, link, jobs, aliases=aliases)
+    logger.info(result.summary())
+    return result
 
+def write_page(dest_path, template, title, html_node):
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
 
+    # Stream the page to disk rather than building the final HTML string.
+    with open(dest_path, 'w') as f:
+        template.write(f, Title=title, Content=html_node)
+
+def build_page(from_path, dest_path, renderer, profile=None):
+    if os.path.getsize(from_path) >= LARGE_FILE_SIZE:
+        # Too big to hold the source, its tree and the output in memory at
+        # once. Reading, converting and writing are interleaved, so a
+        # profile times them as one phase.
+        if profile is None:
+            write_large_page(from_path, dest_path, renderer)
+        else:
+            phase = PagePhases(profile, from_path)
+            with phase("stream"):
+                write_large_page(from_path, dest_path, renderer, phase)
+        return
+    if profile is not None:
+        profile_page(from_path, dest_path, renderer, profile)
+        return
+
+    with open(from_path, 'r') as f:
+        markdown_content = f.read()
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    # Stream the page to disk rather than building the final HTML string.
     with open(dest_path, 'w') as f:
-        f.write(final_html)
+        renderer.write(f, from_path, markdown_content)
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath):
-    contents = os.listdir(dir_path_content)
-    for thing in contents:
+def profile_page(from_path, dest_path, renderer, profile):
+    # build_page with each step of SiteRenderer.render timed as a phase. The
+    # page is rendered to a string first so that writing is timed apart.
+    phase = PagePhases(profile, from_path)
+    with phase("read"):
+        with open(from_path, 'r') as f:
+            markdown_content = f.read()
+    title, html_node = renderer.page_content(from_path, markdown_content, phase)
+    final_html = renderer.render_content(from_path, title, html_node, phase)
+    with phase("write"):
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        with open(dest_path, 'w') as f:
+            f.write(final_html)
+
+def log_page(from_path, dest_path, template_path):
+    # Logged once a page is written, in page order, both for pages built
+    # here and for pages built in worker processes.
+    logger.info("Generated page from %s to %s using %s", from_path, dest_path, template_path)
+
+def generate_page(from_path, template_path, dest_path, basepath, renderer=None, profile=None):
+    if renderer is None:
+        renderer = SiteRenderer(TemplateLoader(template_path, os.path.dirname(from_path), basepath))
+
+    build_page(from_path, dest_path, renderer, profile)
+    log_page(from_path, dest_path, template_path)
+
+def discover_pages(dir_path_content, dest_dir_path):
+    # Sorted so that build order (and therefore output and the first
+    # reported failure) does not depend on the filesystem's listing order.
+    pages = []
+    for thing in sorted(os.listdir(dir_path_content)):
         base, ext = os.path.splitext(thing)
         full_content_path = os.path.join(dir_path_content, thing)
-        full_dest_dir_path = os.path.join(dest_dir_path, thing)
         if os.path.isfile(full_content_path) and thing.endswith(".md"):
             html_filename = base + ".html"
-            full_dest_html_path = os.path.join(dest_dir_path, html_filename)
-            generate_page(full_content_path, template_path, full_dest_html_path, basepath)
+            pages.append((full_content_path, os.path.join(dest_dir_path, html_filename)))
         if os.path.isdir(full_content_path):
-            if not os.path.exists(full_dest_dir_path):
-                os.mkdir(full_dest_dir_path)
-            generate_pages_recursive(full_content_path, template_path, full_dest_dir_path, basepath)
+            pages.extend(discover_pages(full_content_path, os.path.join(dest_dir_path, thing)))
+    return pages
+
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath, manifest=None, jobs=1, profile=None, pipeline=False, queue_size=16, options=None):
+    options = options if options is not None else RenderOptions()
+    with build_phases(profile)("discover"):
+        pages = discover_pages(dir_path_content, dest_dir_path)
+    if manifest is not None:
+        pages = [(src, dest) for src, dest in pages if manifest.needs_build("page", src, dest)]
+
+    if pipeline:
+        renderer = options.renderer(template_path, dir_path_content, basepath)
+
+        def written(from_path, dest_path):
+            log_page(from_path, dest_path, template_path)
+
+        stats = generate_pages_pipelined(pages, renderer.render, queue_size=queue_size, written=written)
+        logger.info(stats.summary())
+        return stats
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs > 1 and len(pages) > 1:
+        generate_pages_parallel(pages, template_path, dir_path_content, basepath, jobs, profile, options)
+        return
+    renderer = options.renderer(template_path, dir_path_content, basepath)
+    for from_path, dest_path in pages:
+        generate_page(from_path, template_path, dest_path, basepath, renderer, profile)
+
+# Per-process state for worker processes, set up once by _init_worker so
+# templates are read and compiled once per worker rather than once per page.
+_worker_options = None
+_worker_renderer = None
+_worker_profile = False
+
+def _init_worker(template_path, content_root, basepath, profile, options):
+    global _worker_options, _worker_renderer, _worker_profile
+    # options arrives as a copy with caches and stores of its own
+    _worker_options = options
+    _worker_renderer = options.renderer(template_path, content_root, basepath)
+    _worker_profile = profile
+
+def _cache_counts(caches):
+    return [None if cache is None else cache.counts() for cache in caches]
+
+def _generate_page_worker(page):
+    from_path, dest_path = page
+    profile = BuildProfile() if _worker_profile else None
+    caches = _worker_options.counters()
+    before = _cache_counts(caches)
+    try:
+        build_page(from_path, dest_path, _worker_renderer, profile)
+    except Exception as e:
+        # Hand the error back instead of raising, so the parent reports
+        # failures in page order rather than in completion order.
+        return f"{type(e).__name__}: {e}", None, None, None
+    record = profile.pages[from_path] if profile is not None else None
+    # Cache and minify counters since the previous page, for the parent to add up
+    counts = [
+        None if old is None else tuple(new - was for new, was in zip(counts, old))
+        for counts, old in zip(_cache_counts(caches), before)
+    ]
+    documents = [None if store is None else store.take(from_path) for store in _worker_options.stores()]
+    return None, record, counts, documents
+
+def generate_pages_parallel(pages, template_path, content_root, basepath, jobs, profile=None, options=None):
+    options = options if options is not None else RenderOptions()
+    chunksize = max(1, len(pages) // (jobs * 4))
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(template_path, content_root, basepath, profile is not None, options),
+    ) as executor:
+        results = executor.map(_generate_page_worker, pages, chunksize=chunksize)
+        for (from_path, dest_path), (error, record, counts, documents) in zip(pages, results):
+            if error is not None:
+                executor.shutdown(cancel_futures=True)
+                raise Exception(f"Failed to generate page {from_path}: {error}")
+            if record is not None:
+                profile.merge_page(from_path, record)
+            for parent_cache, delta in zip(options.counters(), counts):
+                if delta is not None:
+                    parent_cache.add_counts(*delta)
+            for store, document in zip(options.stores(), documents):
+                if document is not None:
+                    store.add_document(from_path, document)
+            log_page(from_path, dest_path, template_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+
+# Bump this whenever a converter change alters the generated HTML, so that
+# incremental builds know every page needs to be regenerated.
+CONVERTER_VERSION = "3"
+
+MANIFEST_PATH = ".build_manifest.json"
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_settings(template_paths, basepath, assets=None, images=None, critical=None, minify=False):
+    # template_paths: the root template plus any layouts and partials.
+    # assets: the fingerprinted asset names pages link to, if any.
+    # images: a digest of the image sizes written into <img> tags, if any.
+    # critical: a digest of the stylesheet rules inlined into pages, if any.
+    # minify: whether pages are minified.
+    settings = {
+        "template": {path: hash_file(path) for path in template_paths},
+        "basepath": basepath,
+        "converter": CONVERTER_VERSION,
+    }
+    if assets:
+        settings["assets"] = assets
+    if images:
+        settings["images"] = images
+    if critical:
+        settings["critical"] = critical
+    if minify:
+        settings["minify"] = True
+    return settings
+
+
+def is_under(path, root):
+    root = os.path.normpath(root)
+    return os.path.normpath(path).startswith(os.path.join(root, ""))
+
+
+class BuildManifest:
+    # root is the directory the outputs are written to. A manifest left by
+    # a build into another directory (e.g. a --staged link) is ignored, so
+    # its outputs are neither trusted nor pruned.
+    def __init__(self, path, settings, previous=None, dry_run=False, root=None):
+        self.path = path
+        self.settings = settings
+        self.dry_run = dry_run
+        self.root = root
+        # The root of the last successful build, if it recorded one
+        self.previous_root = None
+        # dest path -> {"kind", "source", "hash"} from the last successful build
+        self.previous = {}
+        # Pages depend on the template, basepath and converter too, so if any
+        # of those changed every page is stale even if its markdown is not.
+        self.pages_stale = True
+        if previous is not None:
+            self.previous_root = previous.get("root")
+            if root is None or self.previous_root in (None, root):
+                self.previous = previous.get("outputs", {})
+                self.pages_stale = previous.get("settings") != settings
+        self.outputs = {}
+        self.plan = []
+
+    @classmethod
+    def load(cls, path, settings, dry_run=False, root=None):
+        previous = None
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    previous = json.load(f)
+                except json.JSONDecodeError:
+                    previous = None
+        return cls(path, settings, previous, dry_run, root)
+
+    def needs_build(self, kind, source, dest):
+        digest = hash_file(source)
+        old = self.previous.get(dest)
+        changed = (
+            old is None
+            or old["hash"] != digest
+            or old["source"] != source
+            or not os.path.exists(dest)
+            or (kind == "page" and self.pages_stale)
+        )
+        return self.record(kind, source, dest, digest, changed)
+
+    def record(self, kind, source, dest, digest, changed):
+        # For outputs whose freshness the caller has already decided; returns
+        # whether the output should be written now.
+        self.outputs[dest] = {"kind": kind, "source": source, "hash": digest}
+        if not changed:
+            return False
+        self.plan.append((kind, dest))
+        return not self.dry_run
+
+    def prune(self, root):
+        for dest in sorted(self.previous):
+            if dest in self.outputs or not is_under(dest, root):
+                # Never delete outside the directory being built
+                continue
+            self.plan.append(("delete", dest))
+            if self.dry_run:
+                continue
+            if os.path.exists(dest):
+                os.remove(dest)
+            remove_empty_parents(dest, root)
+
+    def rebase(self, old_root, new_root):
+        # Outputs written under old_root (a staging directory) are read from
+        # new_root by the next build.
+        prefix = os.path.join(old_root, "")
+        self.root = new_root
+        self.outputs = {
+            os.path.join(new_root, dest[len(prefix):]) if dest.startswith(prefix) else dest: output
+            for dest, output in self.outputs.items()
+        }
+
+    def save(self):
+        if self.dry_run:
+            return
+        data = {"settings": self.settings, "root": self.root, "outputs": self.outputs}
+        with open(self.path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+
+def remove_empty_parents(path, root):
+    root = os.path.normpath(root)
+    parent = os.path.dirname(path)
+    while parent and os.path.normpath(parent) != root:
+        try:
+            os.rmdir(parent)
+        except OSError:
+            # Not empty (or already gone): stop climbing.
+            return
+        parent = os.path.dirname(parent)
@@ -0,0 +1,221 @@
+import logging
+import re
+
+logger = logging.getLogger("site")
+
+# Elements whose content is passed through untouched.
+PRESERVE_TAGS = frozenset(("pre", "code", "textarea", "script", "style"))
+
+# Whitespace next to these tags never renders, so it can be dropped rather
+# than collapsed to a single space.
+BLOCK_TAGS = frozenset((
+    "!doctype", "html", "head", "body", "title", "meta", "link", "base", "script", "style",
+    "article", "aside", "blockquote", "div", "footer", "header", "main", "nav", "section",
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "hr", "pre", "ul", "ol", "li", "dl", "dt", "dd",
+    "table", "thead", "tbody", "tfoot", "tr", "th", "td", "figure", "figcaption", "form",
+))
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TAG_PATTERN = re.compile(r"<(/?)([A-Za-z][\w:-]*)(.*?)(/?)>\Z", re.S)
+ATTRIBUTE_PATTERN = re.compile(r"""\s+([^\s"'=<>/]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'=<>`]+))?""")
+# Attribute values that are still parsed the same way without quotes
+UNQUOTED_VALUE_PATTERN = re.compile(r"""[^\s"'=<>`]+\Z""")
+CLOSING_PATTERNS = {name: re.compile(f"</{name}", re.I) for name in PRESERVE_TAGS}
+
+
+def minify_tag(tag):
+    # Collapses whitespace between attributes and drops quotes that aren't
+    # needed. Returns (minified tag, lowercase name, closing?).
+    match = TAG_PATTERN.match(tag)
+    if match is None:
+        # <!doctype ...> and anything unusual: only collapse whitespace
+        name = tag[1:].split(None, 1)[0].rstrip(">").lower() if len(tag) > 2 else ""
+        return WHITESPACE_PATTERN.sub(" ", tag), name, False
+    closing, name, attributes, self_closing = match.groups()
+    parts = ["<", closing, name]
+    position = 0
+    unquoted_last = False
+    for attribute in ATTRIBUTE_PATTERN.finditer(attributes):
+        if attribute.start() != position:
+            return WHITESPACE_PATTERN.sub(" ", tag), name.lower(), bool(closing)
+        position = attribute.end()
+        parts.append(" ")
+        parts.append(attribute.group(1))
+        value = attribute.group(2)
+        unquoted_last = False
+        if value is not None:
+            if value[0] in "\"'":
+                inner = value[1:-1]
+                # A trailing "/" would read as part of the value before "/>"
+                if inner and UNQUOTED_VALUE_PATTERN.match(inner) and not inner.endswith("/"):
+                    value = inner
+                    unquoted_last = True
+            else:
+                unquoted_last = True
+            parts.append("=")
+            parts.append(value)
+    if attributes[position:].strip():
+        return WHITESPACE_PATTERN.sub(" ", tag), name.lower(), bool(closing)
+    if self_closing:
+        parts.append(" /" if unquoted_last else "/")
+    parts.append(">")
+    return "".join(parts), name.lower(), bool(closing)
+
+
+class HTMLMinifier:
+    # Minifies HTML fed in arbitrary chunks, e.g. as a page is streamed to
+    # disk. Each character is scanned once; only an unfinished tag or
+    # comment at the end of a chunk is held back for the next one.
+    def __init__(self):
+        self.carry = ""
+        # Pattern for the closing tag ending the preserved element we're in
+        self.raw_end = None
+        # Whitespace seen but not yet written: it is dropped if a block tag
+        # follows, and written as one space otherwise.
+        self.space_pending = False
+        # Just after a block tag (or at the start), where whitespace is dropped
+        self.after_block = True
+
+    def text(self, out, text):
+        if not text:
+            return
+        collapsed = WHITESPACE_PATTERN.sub(" ", text)
+        if collapsed == " ":
+            self.space_pending = True
+            return
+        if collapsed[0] == " ":
+            collapsed = collapsed[1:]
+            self.space_pending = True
+        if self.space_pending and not self.after_block:
+            out.append(" ")
+        self.space_pending = collapsed[-1] == " "
+        out.append(collapsed.rstrip(" ") if self.space_pending else collapsed)
+        self.after_block = False
+
+    def tag(self, out, tag):
+        minified, name, closing = minify_tag(tag)
+        block = name in BLOCK_TAGS
+        if self.space_pending and not block and not self.after_block:
+            out.append(" ")
+        self.space_pending = False
+        out.append(minified)
+        self.after_block = block
+        if not closing and name in PRESERVE_TAGS and not minified.endswith("/>"):
+            self.raw_end = CLOSING_PATTERNS[name]
+
+    def feed(self, chunk):
+        buffer = self.carry + chunk if self.carry else chunk
+        self.carry = ""
+        out = []
+        position = 0
+        length = len(buffer)
+        while position < length:
+            if self.raw_end is not None:
+                match = self.raw_end.search(buffer, position)
+                if match is None:
+                    # Keep back just enough to spot a closing tag split across chunks
+                    keep = max(position, length - len(self.raw_end.pattern) + 1)
+                    out.append(buffer[position:keep])
+                    self.carry = buffer[keep:]
+                    break
+                out.append(buffer[position:match.start()])
+                position = match.start()
+                self.raw_end = None
+                continue
+            lt = buffer.find("<", position)
+            # Only "<" followed by a letter, "/" or "!" starts a tag; any
+            # other "<" (as in "a < b") is text.
+            while lt != -1 and lt + 1 < length and not (buffer[lt + 1].isalpha() or buffer[lt + 1] in "/!"):
+                lt = buffer.find("<", lt + 1)
+            if lt == -1:
+                self.text(out, buffer[position:])
+                break
+            self.text(out, buffer[position:lt])
+            if lt + 1 == length:
+                # Can't tell yet what this "<" starts
+                self.carry = buffer[lt:]
+                break
+            if buffer.startswith("<!--", lt):
+                end = buffer.find("-->", lt + 4)
+                if end == -1:
+                    self.carry = buffer[lt:]
+                    break
+                if buffer.startswith("<!--[if", lt):
+                    # Conditional comments mean something to old browsers
+                    out.append(buffer[lt:end + 3])
+                position = end + 3
+                continue
+            gt = buffer.find(">", lt)
+            if gt == -1:
+                self.carry = buffer[lt:]
+                break
+            self.tag(out, buffer[lt:gt + 1])
+            position = gt + 1
+        return "".join(out)
+
+    def finish(self):
+        # Whatever is still held back, as is; trailing whitespace is dropped.
+        rest, self.carry = self.carry, ""
+        return rest
+
+
+def minify_html(html):
+    minifier = HTMLMinifier()
+    return minifier.feed(html) + minifier.finish()
+
+
+def utf8_size(text):
+    # Pages are written as UTF-8; most chunks are ASCII and need no encoding
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+class MinifyingWriter:
+    # A text stream wrapper that minifies what is written through it,
+    # counting the UTF-8 bytes that go in and come out.
+    def __init__(self, stream):
+        self.stream = stream
+        self.minifier = HTMLMinifier()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def write(self, text):
+        self.bytes_in += utf8_size(text)
+        out = self.minifier.feed(text)
+        self.bytes_out += utf8_size(out)
+        self.stream.write(out)
+
+    def close(self):
+        out = self.minifier.finish()
+        self.bytes_out += utf8_size(out)
+        self.stream.write(out)
+
+
+class MinifyStats:
+    # UTF-8 sizes of pages before and after minifying
+    def __init__(self):
+        self.pages = 0
+        self.before = 0
+        self.after = 0
+
+    def add_page(self, path, before, after):
+        self.pages += 1
+        self.before += before
+        self.after += after
+        logger.debug("Minified %s: %d -> %d bytes (saved %d)", path, before, after, before - after)
+
+    def counts(self):
+        return self.pages, self.before, self.after
+
+    def add_counts(self, pages, before, after):
+        # Counters reported back by worker processes
+        self.pages += pages
+        self.before += before
+        self.after += after
+
+    def report(self):
+        return {"pages": self.pages, "before": self.before, "after": self.after, "saved": self.before - self.after}
+
+    def summary(self):
+        saved = self.before - self.after
+        share = saved / self.before if self.before else 0.0
+        return f"Minify: {self.pages} page(s), {self.before:,} -> {self.after:,} bytes, saved {saved:,} ({share:.1%})"
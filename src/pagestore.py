@@ -0,0 +1,67 @@
+import json
+import os
+
+
+class PageStore:
+    # Something recorded about every page as it is rendered, kept between
+    # builds in a JSON file keyed by source path so that an incremental
+    # build only recomputes it for the pages it rebuilt. Subclasses turn a
+    # page's title and content node into a JSON-able document.
+    FORMAT_VERSION = 1
+
+    def __init__(self, path=None):
+        self.path = path
+        # source path -> document
+        self.pages = {}
+        self.added = 0
+
+    def read(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return
+        if data.get("version") == self.FORMAT_VERSION:
+            self.restore(data)
+
+    def restore(self, data):
+        self.pages = data["pages"]
+
+    def data(self):
+        return {"version": self.FORMAT_VERSION, "pages": self.pages}
+
+    def save(self):
+        if self.path is None:
+            return
+        with open(self.path, "w") as f:
+            json.dump(self.data(), f, separators=(",", ":"), sort_keys=True)
+
+    def document(self, source, title, node):
+        raise NotImplementedError
+
+    def add_page(self, source, title, node):
+        self.add_document(source, self.document(source, title, node))
+
+    def add_document(self, source, document):
+        self.pages[source] = document
+        self.added += 1
+
+    def take(self, source):
+        # The document stored for source, removed again; used by worker
+        # processes to hand each page's document to the parent.
+        return self.pages.pop(source, None)
+
+    def update(self, sources, render_content):
+        # Drops pages that no longer exist and adds live pages missing from
+        # the store (e.g. when it was deleted), with render_content returning
+        # (title, node) for a page's markdown.
+        sources = set(sources)
+        for source in [source for source in self.pages if source not in sources]:
+            del self.pages[source]
+        for source in sorted(sources):
+            if source not in self.pages:
+                with open(source, "r") as f:
+                    title, node = render_content(f.read())
+                self.add_page(source, title, node)
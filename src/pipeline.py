@@ -0,0 +1,209 @@
+import asyncio
+import concurrent.futures
+import os
+import time
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        # Time spent waiting for the previous stage (empty input queue) and
+        # for the next stage (full output queue).
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.depth_samples = 0
+
+    def sample_depth(self, queue):
+        depth = queue.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        self.depth_total += depth
+        self.depth_samples += 1
+
+    def mean_depth(self):
+        return self.depth_total / self.depth_samples if self.depth_samples else 0.0
+
+    def report(self):
+        return {
+            "items": self.items,
+            "busy": self.busy,
+            "starved": self.starved,
+            "blocked": self.blocked,
+            "max_queue_depth": self.max_depth,
+            "mean_queue_depth": self.mean_depth(),
+        }
+
+
+class PipelineStats:
+    def __init__(self):
+        self.read = StageStats("read")
+        self.convert = StageStats("convert")
+        self.write = StageStats("write")
+        self.wall = 0.0
+
+    def stages(self):
+        return (self.read, self.convert, self.write)
+
+    def bottleneck(self):
+        # The converter waiting on reads means the build is I/O-bound on
+        # input; the converter waiting on writes means it is I/O-bound on
+        # output; otherwise conversion itself is the limit.
+        convert = self.convert
+        if convert.starved > convert.busy:
+            return "read I/O"
+        if convert.blocked > convert.busy:
+            return "write I/O"
+        return "CPU"
+
+    def report(self):
+        report = {stage.name: stage.report() for stage in self.stages()}
+        report["wall"] = self.wall
+        report["bottleneck"] = self.bottleneck()
+        return report
+
+    def summary(self):
+        lines = []
+        for stage in self.stages():
+            lines.append(
+                f"{stage.name:8} {stage.items:6} item(s)  busy {stage.busy * 1000:9.2f} ms"
+                f"  starved {stage.starved * 1000:9.2f} ms  blocked {stage.blocked * 1000:9.2f} ms"
+                f"  out-queue max {stage.max_depth} mean {stage.mean_depth():.1f}"
+            )
+        lines.append(f"Pipeline took {self.wall * 1000:.2f} ms; bottleneck: {self.bottleneck()}")
+        return "\n".join(lines)
+
+
+def read_file(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+def write_file(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+async def timed_get(queue, stats):
+    start = time.perf_counter()
+    item = await queue.get()
+    stats.starved += time.perf_counter() - start
+    return item
+
+
+async def timed_put(queue, item, stats):
+    start = time.perf_counter()
+    await queue.put(item)
+    stats.blocked += time.perf_counter() - start
+    stats.sample_depth(queue)
+
+
+async def run_pipeline(pages, render, readers=4, writers=4, queue_size=16, written=None):
+    # pages: [(source, dest)] in build order. render(source, markdown) -> HTML
+    # runs on a single conversion thread, while file reads and writes run on
+    # their own threads, so disk waits overlap with conversion. The bounded
+    # queues between the stages cap how many pages are in memory at once.
+    # written(source, dest) is called for each page once it is on disk, in
+    # build order like a serial build, whatever order the writers finish in.
+    loop = asyncio.get_running_loop()
+    stats = PipelineStats()
+    start = time.perf_counter()
+
+    todo = asyncio.Queue()
+    for page in pages:
+        todo.put_nowait(page)
+    read_queue = asyncio.Queue(queue_size)
+    write_queue = asyncio.Queue(queue_size)
+    errors = []
+    order = {source: index for index, (source, _) in enumerate(pages)}
+    finished = set()
+    next_page = 0
+
+    def page_written(source):
+        nonlocal next_page
+        finished.add(order[source])
+        while next_page in finished:
+            finished.discard(next_page)
+            if written is not None:
+                written(*pages[next_page])
+            next_page += 1
+
+    io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=readers + writers)
+    convert_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def reader():
+        while not todo.empty():
+            source, dest = todo.get_nowait()
+            began = time.perf_counter()
+            try:
+                markdown = await loop.run_in_executor(io_pool, read_file, source)
+            except Exception as e:
+                errors.append((source, e))
+                markdown = None
+            stats.read.busy += time.perf_counter() - began
+            stats.read.items += 1
+            await timed_put(read_queue, (source, dest, markdown), stats.read)
+
+    async def converter():
+        while True:
+            item = await timed_get(read_queue, stats.convert)
+            if item is None:
+                await timed_put(write_queue, None, stats.convert)
+                return
+            source, dest, markdown = item
+            if markdown is None:
+                continue
+            began = time.perf_counter()
+            try:
+                html = await loop.run_in_executor(convert_pool, render, source, markdown)
+            except Exception as e:
+                errors.append((source, e))
+                continue
+            finally:
+                stats.convert.busy += time.perf_counter() - began
+            stats.convert.items += 1
+            await timed_put(write_queue, (source, dest, html), stats.convert)
+
+    async def writer():
+        while True:
+            item = await timed_get(write_queue, stats.write)
+            if item is None:
+                # Pass the end marker on to the other writers
+                write_queue.put_nowait(None)
+                return
+            source, dest, html = item
+            began = time.perf_counter()
+            try:
+                await loop.run_in_executor(io_pool, write_file, dest, html)
+            except Exception as e:
+                errors.append((source, e))
+            else:
+                page_written(source)
+            stats.write.busy += time.perf_counter() - began
+            stats.write.items += 1
+
+    try:
+        convert_task = asyncio.create_task(converter())
+        writer_tasks = [asyncio.create_task(writer()) for _ in range(max(1, writers))]
+        await asyncio.gather(*(reader() for _ in range(max(1, readers))))
+        await read_queue.put(None)
+        await convert_task
+        await asyncio.gather(*writer_tasks)
+    finally:
+        io_pool.shutdown()
+        convert_pool.shutdown()
+    stats.wall = time.perf_counter() - start
+
+    if errors:
+        # Report the failure that comes first in build order, whichever
+        # stage or thread happened to hit it first.
+        source, error = min(errors, key=lambda item: order[item[0]])
+        raise Exception(f"Failed to generate page {source}: {type(error).__name__}: {error}")
+    return stats
+
+
+def generate_pages_pipelined(pages, render, readers=4, writers=4, queue_size=16, written=None):
+    return asyncio.run(run_pipeline(pages, render, readers, writers, queue_size, written))
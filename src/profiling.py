@@ -0,0 +1,154 @@
+import contextlib
+import json
+import time
+
+# Per-page phases, in pipeline order.
+PAGE_PHASES = ("read", "block_parse", "inline_parse", "serialize", "template", "write")
+
+
+class BuildProfile:
+    def __init__(self):
+        # Whole-build phases such as discovering the content tree
+        self.build = {}
+        # page -> {"phases": {phase: [wall, cpu]}, "nodes": count}
+        self.pages = {}
+        # Other build statistics to include in the report, e.g. cache counters
+        self.extra = {}
+
+    @contextlib.contextmanager
+    def phase(self, name, page=None):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, page)
+
+    def add(self, name, wall, cpu, page=None):
+        if page is None:
+            phases = self.build
+        else:
+            phases = self.page(page)["phases"]
+        totals = phases.setdefault(name, [0.0, 0.0])
+        totals[0] += wall
+        totals[1] += cpu
+
+    def page(self, page):
+        record = self.pages.get(page)
+        if record is None:
+            # cached: the content came from the fragment cache, so no nodes
+            # were built for it.
+            record = {"phases": {}, "nodes": 0, "cached": False}
+            self.pages[page] = record
+        return record
+
+    def count_nodes(self, page, count):
+        self.page(page)["nodes"] += count
+
+    def merge_page(self, page, record):
+        # Records handed back by worker processes
+        self.pages[page] = record
+
+    def page_wall(self, page):
+        return sum(wall for wall, _ in self.pages[page]["phases"].values())
+
+    def report(self):
+        totals = {}
+        for record in self.pages.values():
+            for name, (wall, cpu) in record["phases"].items():
+                total = totals.setdefault(name, [0.0, 0.0])
+                total[0] += wall
+                total[1] += cpu
+        return {
+            **self.extra,
+            "build": {name: {"wall": wall, "cpu": cpu} for name, (wall, cpu) in self.build.items()},
+            "phase_totals": {name: {"wall": wall, "cpu": cpu} for name, (wall, cpu) in totals.items()},
+            "nodes": sum(record["nodes"] for record in self.pages.values()),
+            "cached": sum(record["cached"] for record in self.pages.values()),
+            "pages": {
+                page: {
+                    "phases": {name: {"wall": wall, "cpu": cpu} for name, (wall, cpu) in record["phases"].items()},
+                    "nodes": record["nodes"],
+                    "cached": record["cached"],
+                }
+                for page, record in self.pages.items()
+            },
+        }
+
+    def write_report(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+    def slowest(self, top):
+        return sorted(self.pages, key=self.page_wall, reverse=True)[:top]
+
+    def summary(self, top=10):
+        lines = []
+        for name, (wall, cpu) in self.build.items():
+            lines.append(f"{name:14} {wall * 1000:10.2f} ms wall {cpu * 1000:10.2f} ms cpu")
+        report = self.report()
+        # Phases only some builds have (e.g. fragment_cache) come last.
+        extra_phases = sorted(name for name in report["phase_totals"] if name not in PAGE_PHASES)
+        for name in PAGE_PHASES + tuple(extra_phases):
+            total = report["phase_totals"].get(name)
+            if total is not None:
+                lines.append(f"{name:14} {total['wall'] * 1000:10.2f} ms wall {total['cpu'] * 1000:10.2f} ms cpu")
+        lines.append(f"{len(self.pages)} page(s), {report['nodes']} node(s), {report['cached']} from the fragment cache")
+        if self.pages:
+            lines.append(f"Slowest {min(top, len(self.pages))} page(s):")
+            for page in self.slowest(top):
+                record = self.pages[page]
+                nodes = f"{'cached':>14}" if record["cached"] else f"{record['nodes']:8} nodes"
+                lines.append(f"{self.page_wall(page) * 1000:10.2f} ms {nodes}  {page}")
+        return "\n".join(lines)
+
+
+class NoPhases:
+    # The phase hook of an unprofiled build. The renderer runs each step of
+    # a page under hook(name), reports the trees it converts to
+    # hook.converted(node) and a page taken from the fragment cache to
+    # hook.cached(); none of it is recorded here.
+    def __call__(self, name):
+        return contextlib.nullcontext()
+
+    def converted(self, node):
+        pass
+
+    def cached(self):
+        pass
+
+
+no_phase = NoPhases()
+
+
+def build_phases(profile):
+    # The hook for whole-build phases: profile.phase, or no_phase when the
+    # build isn't profiled.
+    return profile.phase if profile is not None else no_phase
+
+
+class PagePhases(NoPhases):
+    # The phase hook for one page of a profiled build
+    def __init__(self, profile, page):
+        self.profile = profile
+        self.page = page
+
+    def __call__(self, name):
+        return self.profile.phase(name, self.page)
+
+    def converted(self, node):
+        self.profile.count_nodes(self.page, count_nodes(node))
+
+    def cached(self):
+        self.profile.page(self.page)["cached"] = True
+
+
+def count_nodes(root):
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if node.children:
+            stack.extend(node.children)
+    return count
@@ -0,0 +1,160 @@
+import argparse
+import filecmp
+import logging
+import os
+import shutil
+import subprocess
+import time
+
+from sync import scan_files
+
+logger = logging.getLogger("site")
+
+# Staged builds live here, one directory each; the path the web server
+# serves is a symlink to one of them.
+BUILDS_DIR = ".builds"
+KEEP_BUILDS = 3
+PARTIAL_SUFFIX = ".partial"
+
+
+def build_dirs(builds_root):
+    # Finished builds, oldest first (names sort by build time)
+    if not os.path.isdir(builds_root):
+        return []
+    return sorted(
+        os.path.join(builds_root, name) for name in os.listdir(builds_root)
+        if not name.endswith(PARTIAL_SUFFIX) and os.path.isdir(os.path.join(builds_root, name))
+    )
+
+
+def live_build(destination):
+    # The build destination links to, or None if it isn't a staged build
+    if not os.path.islink(destination):
+        return None
+    return os.path.realpath(destination)
+
+
+def is_tracked(path):
+    # Whether git tracks anything at path; False outside a repository or
+    # without git.
+    try:
+        result = subprocess.run(["git", "ls-files", "-z", "--", path], capture_output=True, check=False)
+    except OSError:
+        return False
+    return result.returncode == 0 and bool(result.stdout)
+
+
+def check_link(link):
+    # link must be a symlink from an earlier staged build or not exist yet.
+    # An existing directory can't be swapped for a link in one rename, and a
+    # directory under version control (docs/ for GitHub Pages) must stay one.
+    if os.path.islink(link):
+        return
+    if is_tracked(link):
+        raise Exception(f"{link} is tracked by git; --staged needs a path of its own to link")
+    if os.path.exists(link):
+        raise Exception(f"{link} already exists and isn't a link; move it aside before the first --staged build")
+
+
+def start_build(builds_root=BUILDS_DIR):
+    # A fresh directory to build into, which nothing serves until publish
+    # renames it and points the destination at it.
+    os.makedirs(builds_root, exist_ok=True)
+    for name in os.listdir(builds_root):
+        if name.endswith(PARTIAL_SUFFIX):
+            # Left behind by a build that crashed
+            shutil.rmtree(os.path.join(builds_root, name))
+    name = time.strftime("%Y%m%d-%H%M%S")
+    suffix = 0
+    while os.path.exists(os.path.join(builds_root, name)):
+        suffix += 1
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix:03d}"
+    staging = os.path.join(builds_root, name + PARTIAL_SUFFIX)
+    os.makedirs(staging)
+    return staging
+
+
+class PublishResult:
+    def __init__(self, build):
+        self.build = build
+        self.unchanged = 0
+        self.changed = 0
+        self.removed_builds = 0
+
+    def summary(self):
+        return (
+            f"Published {self.build}: {self.changed} changed file(s), {self.unchanged} unchanged, "
+            f"{self.removed_builds} old build(s) removed"
+        )
+
+
+def keep_unchanged(staging, live):
+    # Gives each staged file whose bytes match the live build's copy that
+    # copy's mtime, so rsync/CDN syncs see nothing to do. Every build keeps
+    # its own files: nothing is hard-linked, so editing the live tree can't
+    # change a rollback copy. Returns (unchanged, changed).
+    live_files = scan_files(live) if live is not None else {}
+    unchanged = changed = 0
+    for relative, stat in scan_files(staging).items():
+        old = live_files.get(relative)
+        path = os.path.join(staging, relative)
+        if old is None or old.st_size != stat.st_size or not filecmp.cmp(os.path.join(live, relative), path, shallow=False):
+            changed += 1
+            continue
+        os.utime(path, ns=(old.st_atime_ns, old.st_mtime_ns))
+        unchanged += 1
+    return unchanged, changed
+
+
+def switch_link(destination, target):
+    # Points destination at target in one rename, so readers see either the
+    # old build or the new one and never a missing or half-written site.
+    temp = f"{destination}.{os.getpid()}.link"
+    os.symlink(os.path.relpath(target, os.path.dirname(os.path.abspath(destination))), temp)
+    os.replace(temp, destination)
+
+
+def publish(staging, destination, builds_root=BUILDS_DIR, keep=KEEP_BUILDS):
+    check_link(destination)
+    live = live_build(destination)
+    build = staging[:-len(PARTIAL_SUFFIX)] if staging.endswith(PARTIAL_SUFFIX) else staging
+    result = PublishResult(build)
+    result.unchanged, result.changed = keep_unchanged(staging, live)
+    os.rename(staging, build)
+    switch_link(destination, build)
+    result.removed_builds = remove_old_builds(builds_root, build, keep)
+    return result
+
+
+def remove_old_builds(builds_root, live, keep=KEEP_BUILDS):
+    # Keeps the live build and the keep most recent before it for rollback
+    builds = [build for build in build_dirs(builds_root) if os.path.realpath(build) != os.path.realpath(live)]
+    old = builds[:max(0, len(builds) - keep)]
+    for build in old:
+        shutil.rmtree(build)
+    return len(old)
+
+
+def rollback(destination, builds_root=BUILDS_DIR, steps=1):
+    # Points destination back at the build published steps builds earlier
+    live = live_build(destination)
+    if live is None:
+        raise Exception(f"{destination} isn't a staged build")
+    builds = [os.path.realpath(build) for build in build_dirs(builds_root)]
+    if live not in builds:
+        raise Exception(f"{destination} points outside {builds_root}")
+    index = builds.index(live) - steps
+    if index < 0:
+        raise Exception(f"Only {builds.index(live)} older build(s) kept")
+    switch_link(destination, builds[index])
+    return builds[index]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="main.py rollback", description="Serve an earlier staged build again")
+    parser.add_argument("link", help="the link --staged publishes to")
+    parser.add_argument("steps", nargs="?", type=int, default=1, help="how many builds to go back (default 1)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    build = rollback(args.link, BUILDS_DIR, args.steps)
+    logger.info("%s now serves %s", args.link, os.path.relpath(build))
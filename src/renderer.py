@@ -0,0 +1,289 @@
+import collections
+import concurrent.futures
+
+from blockcache import BlockCache
+from converter import block_lines_to_html_node, scan_blocks
+from fragmentcache import FragmentCache
+from htmlnode import ParentNode
+from linkgraph import LinkGraph
+from minify import MinifyStats, MinifyingWriter, minify_html, utf8_size
+from profiling import no_phase
+from search import SearchIndex
+from template import TemplateLoader, compile_template
+
+
+def extract_title(markdown):
+
+    lines = markdown.split("\n")
+
+    for line in lines:
+        if line.startswith('# '):
+            return line[2:].strip()
+    raise Exception("No h1 header found in the markdown")
+
+def convert(markdown_content, cache=None, phase=no_phase):
+    # markdown_to_html_node, with finding the blocks and rendering them
+    # timed as separate phases.
+    with phase("block_parse"):
+        blocks = list(scan_blocks(markdown_content))
+    with phase("inline_parse"):
+        if cache is None:
+            children = [block_lines_to_html_node(block_type, lines) for block_type, lines in blocks]
+        else:
+            children = [cache.render(block_type, lines, block_lines_to_html_node) for block_type, lines in blocks]
+    node = ParentNode("div", children)
+    phase.converted(node)
+    return node
+
+def page_content(markdown_content, cache=None, fragments=None, phase=no_phase):
+    # (title, content node) for a page, from the fragment cache if there is one
+    if fragments is not None:
+        return fragments.render(markdown_content, lambda markdown: convert(markdown, cache, phase), extract_title, phase)
+    html_node = convert(markdown_content, cache, phase)
+    return extract_title(markdown_content), html_node
+
+def render_page(markdown_content, template, cache=None, fragments=None):
+    title, html_node = page_content(markdown_content, cache, fragments)
+    return template.render(Title=title, Content=html_node)
+
+
+class SingleTemplate:
+    # Gives every page the same compiled template, in place of a
+    # TemplateLoader's per-directory layouts.
+    def __init__(self, template):
+        self.template = template
+
+    def for_page(self, path):
+        return self.template
+
+
+class SiteRenderer:
+    # Turns markdown into finished pages with no disk I/O of its own.
+    # templates is a TemplateLoader or SingleTemplate; cache and fragments
+    # are an optional BlockCache and FragmentCache. With a MinifyStats as
+    # minify, pages are minified and their sizes recorded there; with an
+    # ImageAttributes as images, <img> tags get sizes and lazy loading; with
+    # a CriticalCSS as critical, stylesheets are inlined into each page;
+    # with a SearchIndex as search and a LinkGraph as links, each page's
+    # terms and links are recorded there.
+    #
+    # Each step runs inside phase(name), a profiling.NoPhases hook; a
+    # profiled build passes a PagePhases that times the steps.
+    def __init__(self, templates, cache=None, fragments=None, minify=None, images=None, critical=None, search=None, links=None):
+        self.templates = templates
+        self.cache = cache
+        self.fragments = fragments
+        self.minify = minify
+        self.images = images
+        self.critical = critical
+        self.search = search
+        self.links = links
+
+    def template_for(self, path):
+        return self.templates.for_page(path)
+
+    def page_template(self, path, content, phase=no_phase):
+        # The template for one page, which differs from page to page once
+        # stylesheets are inlined.
+        template = self.templates.for_page(path)
+        if self.critical is not None:
+            with phase("critical_css"):
+                template = self.critical.apply(template, content)
+        return template
+
+    def content(self, markdown_content, phase=no_phase):
+        return page_content(markdown_content, self.cache, self.fragments, phase)
+
+    def page_content(self, path, markdown_content, phase=no_phase):
+        title, html_node = self.content(markdown_content, phase)
+        for name, store in (("search", self.search), ("links", self.links)):
+            if store is not None:
+                with phase(name):
+                    store.add_page(path, title, html_node)
+        return title, html_node
+
+    def render(self, path, markdown_content, phase=no_phase):
+        title, html_node = self.page_content(path, markdown_content, phase)
+        return self.render_content(path, title, html_node, phase)
+
+    def render_content(self, path, title, content, phase=no_phase):
+        # The content is serialized on its own first, so that converting
+        # the tree and filling the template are timed apart.
+        template = self.page_template(path, content, phase)
+        with phase("serialize"):
+            html_content = content.to_html(template.rewrite_url)
+        with phase("template"):
+            html = template.render(Title=title, Content=html_content)
+        if self.images is not None:
+            with phase("images"):
+                html = self.images.annotate_html(html, path)
+        if self.minify is not None:
+            with phase("minify"):
+                minified = minify_html(html)
+            self.minify.add_page(path, utf8_size(html), utf8_size(minified))
+            return minified
+        return html
+
+    def write(self, stream, path, markdown_content):
+        # Like render, but streamed to stream rather than built as a string.
+        title, html_node = self.page_content(path, markdown_content)
+        self.write_content(stream, path, title, html_node)
+
+    def write_content(self, stream, path, title, content):
+        # Output passes through the image writer, then the minifier.
+        minifier = None
+        if self.minify is not None:
+            stream = minifier = MinifyingWriter(stream)
+        images = None
+        if self.images is not None:
+            stream = images = self.images.writer(stream, path)
+        self.page_template(path, content).write(stream, Title=title, Content=content)
+        if images is not None:
+            images.close()
+        if minifier is not None:
+            minifier.close()
+            self.minify.add_page(path, minifier.bytes_in, minifier.bytes_out)
+
+
+class RenderOptions:
+    # What a build renders its pages with besides the templates, set up once
+    # in main() and handed to the serial, pipelined and parallel paths
+    # alike: the optional caches, stats and stores SiteRenderer takes, plus
+    # the fingerprinted asset names the templates rewrite links to.
+    def __init__(self, cache=None, fragments=None, assets=None, minify=None, images=None, critical=None, search=None, links=None):
+        self.cache = cache
+        self.fragments = fragments
+        self.assets = assets
+        self.minify = minify
+        self.images = images
+        self.critical = critical
+        self.search = search
+        self.links = links
+
+    def renderer(self, template_path, content_root, basepath):
+        templates = TemplateLoader(template_path, content_root, basepath, self.assets)
+        return SiteRenderer(
+            templates, self.cache, self.fragments, self.minify, self.images, self.critical, self.search, self.links
+        )
+
+    def counters(self):
+        # Caches and stats whose counts workers report back
+        return (self.cache, self.fragments, self.minify)
+
+    def stores(self):
+        # Stores whose per-page documents workers report back
+        return (self.search, self.links)
+
+    def __getstate__(self):
+        # A worker process gets the same settings but empty caches, stats
+        # and stores of its own; what they gather goes back to the parent
+        # with each page's result. Only the parent evicts fragments.
+        return {
+            "cache_size": self.cache.maxsize if self.cache is not None else 0,
+            "fragment_root": self.fragments.root if self.fragments is not None else None,
+            "fragment_read_only": self.fragments is not None and self.fragments.read_only,
+            "assets": self.assets,
+            "minify": self.minify is not None,
+            "images": self.images,
+            "critical": self.critical,
+            "search": (self.search.content_root, self.search.basepath) if self.search is not None else None,
+            "links": self.links is not None,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(
+            BlockCache(state["cache_size"]) if state["cache_size"] > 0 else None,
+            FragmentCache(state["fragment_root"], read_only=state["fragment_read_only"]) if state["fragment_root"] is not None else None,
+            state["assets"],
+            MinifyStats() if state["minify"] else None,
+            state["images"],
+            state["critical"],
+            SearchIndex(*state["search"], None) if state["search"] is not None else None,
+            LinkGraph(None) if state["links"] else None,
+        )
+
+
+def compile_site_template(template, basepath="/", partials=None):
+    def load_partial(name):
+        if partials is None or name not in partials:
+            raise ValueError(f"Partial not found: {name}")
+        return partials[name]
+
+    return compile_template(template, basepath, load_partial)
+
+
+def render_site(pages, template, basepath="/", partials=None, jobs=1, batch_size=64, cache_size=0):
+    # Yields (path, html) for each (path, markdown) in pages (a mapping or
+    # an iterable of pairs), in order. template is the template text and
+    # partials maps partial names to their text; both are compiled once.
+    # With jobs > 1, batches of batch_size pages are rendered in worker
+    # processes. cache_size > 0 gives each process a BlockCache.
+    if hasattr(pages, "items"):
+        pages = pages.items()
+    if jobs <= 1:
+        templates = SingleTemplate(compile_site_template(template, basepath, partials))
+        renderer = SiteRenderer(templates, BlockCache(cache_size) if cache_size > 0 else None)
+        for path, markdown_content in pages:
+            try:
+                html = renderer.render(path, markdown_content)
+            except Exception as e:
+                raise Exception(f"Failed to render page {path}: {type(e).__name__}: {e}") from e
+            yield path, html
+        return
+    yield from render_site_parallel(pages, template, basepath, partials, jobs, batch_size, cache_size)
+
+
+def iter_batches(pages, batch_size):
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Per-process renderer for worker processes, set up once by _init_renderer
+_worker_renderer = None
+
+def _init_renderer(template, basepath, partials, cache_size):
+    global _worker_renderer
+    templates = SingleTemplate(compile_site_template(template, basepath, partials))
+    _worker_renderer = SiteRenderer(templates, BlockCache(cache_size) if cache_size > 0 else None)
+
+def _render_batch(batch):
+    results = []
+    for path, markdown_content in batch:
+        try:
+            results.append((path, _worker_renderer.render(path, markdown_content), None))
+        except Exception as e:
+            # Stop at the first failure; the parent raises it in page order.
+            results.append((path, None, f"{type(e).__name__}: {e}"))
+            break
+    return results
+
+def render_site_parallel(pages, template, basepath, partials, jobs, batch_size, cache_size):
+    # Keeps only a few batches per worker in flight, so a slow consumer or
+    # a huge page source doesn't pile every rendered page up in memory.
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_renderer,
+        initargs=(template, basepath, partials, cache_size),
+    ) as executor:
+        pending = collections.deque()
+        batches = iter_batches(pages, batch_size)
+        for batch in batches:
+            pending.append(executor.submit(_render_batch, batch))
+            if len(pending) >= jobs * 2:
+                break
+        while pending:
+            results = pending.popleft().result()
+            for batch in batches:
+                pending.append(executor.submit(_render_batch, batch))
+                break
+            for path, html, error in results:
+                if error is not None:
+                    executor.shutdown(cancel_futures=True)
+                    raise Exception(f"Failed to render page {path}: {error}")
+                yield path, html
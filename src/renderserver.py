@@ -0,0 +1,289 @@
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import logging
+import mimetypes
+import os
+import socketserver
+import threading
+import time
+
+from blockcache import BlockCache
+from manifest import build_settings, hash_bytes
+from renderer import SiteRenderer
+from template import TemplateLoader, template_files
+
+logger = logging.getLogger("site")
+
+
+def safe_join(root, relative):
+    # root/relative, or None if relative escapes root
+    root = os.path.abspath(root)
+    path = os.path.normpath(os.path.join(root, relative))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def parse_if_none_match(header):
+    if not header:
+        return set()
+    return {tag.strip() for tag in header.split(",")}
+
+
+# Per-process renderer for pool workers. The generation number changes when
+# the templates do, telling a worker to drop its compiled templates.
+_worker_renderer = None
+_worker_generation = None
+_worker_settings = None
+
+def _init_render_worker(template_path, content_root, basepath, cache_size):
+    global _worker_settings
+    _worker_settings = (template_path, content_root, basepath, cache_size)
+
+def _render_in_worker(generation, source, markdown_content):
+    global _worker_renderer, _worker_generation
+    if generation != _worker_generation:
+        template_path, content_root, basepath, cache_size = _worker_settings
+        cache = BlockCache(cache_size) if cache_size > 0 else None
+        _worker_renderer = SiteRenderer(TemplateLoader(template_path, content_root, basepath), cache)
+        _worker_generation = generation
+    return _worker_renderer.render(source, markdown_content)
+
+
+class RenderService:
+    # Renders content/...md on request and answers with strong ETags built
+    # from the source's hash and a fingerprint of every template file, the
+    # basepath and the converter version. A request whose If-None-Match
+    # still matches gets a 304 without the page being read or rendered.
+    def __init__(self, content_root, static_root, template_path, basepath="/",
+                 workers=2, cache_size=1024, max_pages=256, rescan_interval=1.0):
+        self.content_root = content_root
+        self.static_root = static_root
+        self.template_path = template_path
+        self.basepath = basepath
+        self.cache_size = cache_size
+        self.max_pages = max_pages
+        self.rescan_interval = rescan_interval
+        self.lock = threading.Lock()
+        # source -> ((size, mtime_ns), sha256), so an unchanged file isn't
+        # re-read just to work out its ETag
+        self.digests = {}
+        # source -> (etag, body), least recently used first
+        self.pages = collections.OrderedDict()
+        self.generation = 0
+        self.template_stamps = None
+        self.scanned = 0.0
+        self.fingerprint = None
+        self.renderer = None
+        # workers == 0 renders on the request thread, one page at a time
+        self.pool = None
+        self.slots = threading.BoundedSemaphore(max(1, workers))
+        if workers > 0:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_render_worker,
+                initargs=(template_path, content_root, basepath, cache_size),
+            )
+        self.refresh_templates(force=True)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def stat_templates(self, paths):
+        stamps = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamps[path] = (stat.st_size, stat.st_mtime_ns)
+        return stamps
+
+    def refresh_templates(self, force=False):
+        # Stats the known template files on every request, and looks for
+        # new layouts/partials at most every rescan_interval seconds.
+        with self.lock:
+            now = time.monotonic()
+            if force or now - self.scanned >= self.rescan_interval:
+                paths = template_files(self.template_path, self.content_root)
+                self.scanned = now
+            else:
+                paths = list(self.template_stamps)
+            stamps = self.stat_templates(paths)
+            if stamps == self.template_stamps:
+                return
+            settings = build_settings(list(stamps), self.basepath)
+            self.fingerprint = hash_bytes(json.dumps(settings, sort_keys=True).encode("utf-8"))
+            self.template_stamps = stamps
+            self.generation += 1
+            self.pages.clear()
+            cache = BlockCache(self.cache_size) if self.cache_size > 0 else None
+            self.renderer = SiteRenderer(TemplateLoader(self.template_path, self.content_root, self.basepath), cache)
+            if self.generation > 1:
+                logger.info("Templates changed, cached pages dropped")
+
+    def resolve(self, request_path):
+        # (kind, file) for a request path: a markdown page or a static file
+        path = request_path.split("?", 1)[0].split("#", 1)[0]
+        if self.basepath != "/" and path.startswith(self.basepath):
+            path = "/" + path[len(self.basepath):]
+        path = path.lstrip("/")
+        if not path or path.endswith("/"):
+            path += "index.html"
+        candidates = []
+        if path.endswith(".html"):
+            candidates.append(("page", self.content_root, path[:-len(".html")] + ".md"))
+        else:
+            candidates.append(("page", self.content_root, path + "/index.md"))
+        candidates.append(("static", self.static_root, path))
+        for kind, root, relative in candidates:
+            full = safe_join(root, relative)
+            if full is not None and os.path.isfile(full):
+                return kind, full
+        return None, None
+
+    def digest(self, path, stat):
+        # (sha256, bytes or None); bytes are only read when the stamp changed
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            known = self.digests.get(path)
+        if known is not None and known[0] == stamp:
+            return known[1], None
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hash_bytes(data)
+        with self.lock:
+            self.digests[path] = (stamp, digest)
+        return digest, data
+
+    def render(self, source, markdown_content):
+        with self.slots:
+            if self.pool is None:
+                return self.renderer.render(source, markdown_content)
+            future = self.pool.submit(_render_in_worker, self.generation, source, markdown_content)
+            return future.result()
+
+    def respond(self, request_path, if_none_match=None):
+        # (status, headers, body) for a GET
+        kind, path = self.resolve(request_path)
+        if path is None:
+            return 404, {}, b""
+        self.refresh_templates()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return 404, {}, b""
+        digest, data = self.digest(path, stat)
+        if kind == "page":
+            etag = '"' + hash_bytes(f"{self.fingerprint}:{digest}".encode("utf-8"))[:40] + '"'
+            content_type = "text/html; charset=utf-8"
+        else:
+            etag = '"' + digest[:40] + '"'
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        tags = parse_if_none_match(if_none_match)
+        if etag in tags or "*" in tags:
+            return 304, headers, b""
+        headers["Content-Type"] = content_type
+
+        if kind == "static":
+            if data is None:
+                with open(path, "rb") as f:
+                    data = f.read()
+            return 200, headers, data
+
+        with self.lock:
+            cached = self.pages.get(path)
+            if cached is not None and cached[0] == etag:
+                self.pages.move_to_end(path)
+                return 200, headers, cached[1]
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        body = self.render(path, data.decode("utf-8")).encode("utf-8")
+        with self.lock:
+            self.pages[path] = (etag, body)
+            self.pages.move_to_end(path)
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+        return 200, headers, body
+
+
+def make_handler(service):
+    class RenderRequestHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.reply(send_body=True)
+
+        def do_HEAD(self):
+            self.reply(send_body=False)
+
+        def reply(self, send_body):
+            start = time.perf_counter()
+            try:
+                status, headers, body = service.respond(self.path, self.headers.get("If-None-Match"))
+            except Exception as e:
+                logger.error("Failed to render %s: %s", self.path, e)
+                self.send_error(500, explain=str(e))
+                return
+            if status == 404:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if status == 200:
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body and status == 200:
+                self.wfile.write(body)
+            logger.debug("%s %d in %.1f ms", self.path, status, (time.perf_counter() - start) * 1000)
+
+        def log_message(self, format, *args):
+            # The default logs the client address, which a Unix socket lacks
+            logger.debug(format, *args)
+
+    return RenderRequestHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(argv):
+    parser = argparse.ArgumentParser(prog="main.py render-server", description="Render pages on request, with ETags")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--port", type=int, default=8889)
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--socket", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=2, help="render processes (0 = render on the request thread)")
+    parser.add_argument("--block-cache", type=int, default=1024, metavar="N", help="blocks kept by each renderer")
+    parser.add_argument("--max-pages", type=int, default=256, help="rendered pages kept in memory")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+    service = RenderService(
+        "content", "static", "template.html", args.basepath,
+        workers=args.workers, cache_size=args.block_cache, max_pages=args.max_pages,
+    )
+    handler = make_handler(service)
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, handler)
+        logger.info("Rendering on unix:%s", args.socket)
+    else:
+        server = http.server.ThreadingHTTPServer((args.bind, args.port), handler)
+        logger.info("Rendering on http://%s:%d%s", args.bind, args.port, args.basepath)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
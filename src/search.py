@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import re
+
+from fingerprint import write_if_changed
+from htmlnode import FragmentNode, HTMLNode
+from pagestore import PageStore
+
+logger = logging.getLogger("site")
+
+SEARCH_INDEX_PATH = ".search_index.json"
+SEARCH_DIR = "search"
+
+# Terms are sharded by their first characters, so a query only downloads
+# the shards for the prefixes of its words.
+SHARD_PREFIX_LENGTH = 2
+
+WORD_PATTERN = re.compile(r"\w+")
+TAG_PATTERN = re.compile(r"<(/?)([A-Za-z][\w-]*)[^<>]*>")
+ALT_PATTERN = re.compile(r'\salt="([^"]*)"')
+SHARD_NAME_PATTERN = re.compile(r"[a-z0-9_]+\Z")
+
+# Elements whose text is a separate run of words. Text in any other element
+# runs on into its neighbours, so foo**bar** is the one word "foobar".
+BLOCK_TAGS = frozenset((
+    "div", "p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li",
+    "pre", "blockquote", "table", "tr", "td", "th", "br", "hr",
+))
+
+
+def tag_text(match):
+    # What a tag in a cached fragment stands for: its alt text if it has
+    # any, a word break at a block boundary and nothing otherwise.
+    alt = ALT_PATTERN.search(match.group(0))
+    if alt is not None:
+        return f" {alt.group(1)} "
+    return " " if match.group(2).lower() in BLOCK_TAGS else ""
+
+
+def node_text(node):
+    # The plain text of a content node in document order, in pieces to be
+    # joined with "": inline text is joined as written and blocks and image
+    # alt text are set apart by spaces. Cached fragments are already HTML,
+    # so their tags are dropped the same way.
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.__class__ is str:
+            yield node
+            continue
+        if isinstance(node, FragmentNode):
+            yield TAG_PATTERN.sub(tag_text, node.to_html())
+            continue
+        if node.tag == "img" and node.props:
+            yield f" {node.props.get('alt', '')} "
+        if node.value:
+            yield node.value
+        if node.children:
+            if node.tag in BLOCK_TAGS:
+                yield " "
+                stack.append(" ")
+            stack.extend(reversed(node.children))
+
+
+def page_terms(text):
+    # term -> positions (word offsets) for a page's text
+    terms = {}
+    for position, word in enumerate(WORD_PATTERN.findall(text.lower())):
+        if len(word) > 1:
+            terms.setdefault(word, []).append(position)
+    return terms
+
+
+def shard_name(term):
+    prefix = term[:SHARD_PREFIX_LENGTH]
+    if SHARD_NAME_PATTERN.match(prefix):
+        return prefix
+    # Non-ASCII prefixes get a filename any server will serve
+    return "_" + prefix.encode("utf-8").hex()
+
+
+def page_url(source, content_root, basepath="/"):
+    # content/blog/tom/index.md -> /blog/tom/ and content/a.md -> /a.html
+    relative = os.path.relpath(source, content_root).replace(os.sep, "/")
+    relative = relative[:-len(".md")] + ".html" if relative.endswith(".md") else relative
+    if relative == "index.html":
+        relative = ""
+    elif relative.endswith("/index.html"):
+        relative = relative[:-len("index.html")]
+    return basepath + relative
+
+
+class SearchIndex(PageStore):
+    # Terms of every page, kept between builds so an incremental build only
+    # re-tokenizes the pages it rebuilt, and written to dest_root/search/ as
+    # an inverted index: index.json lists the pages and shards, and each
+    # shard maps its terms to [[page id, [positions]], ...].
+
+    # 2: words no longer break at inline tags, so stored terms are redone
+    FORMAT_VERSION = 2
+
+    def __init__(self, content_root, basepath="/", path=SEARCH_INDEX_PATH):
+        super().__init__(path)
+        self.content_root = content_root
+        self.basepath = basepath
+        # Documents are {"id", "title", "terms"}
+        self.next_id = 0
+        self.shards = 0
+        self.written = 0
+
+    @classmethod
+    def load(cls, content_root, basepath="/", path=SEARCH_INDEX_PATH):
+        index = cls(content_root, basepath, path)
+        index.read()
+        return index
+
+    def restore(self, data):
+        super().restore(data)
+        self.next_id = data["next_id"]
+
+    def data(self):
+        return dict(super().data(), next_id=self.next_id)
+
+    def document(self, source, title, node):
+        if isinstance(node, HTMLNode):
+            return {"title": title, "terms": page_terms("".join(node_text(node)))}
+        # Content streamed while it is written (a large file) can't be
+        # walked beforehand; the page is listed by title only.
+        logger.warning("Only the title of %s is searchable: it is too large to index", source)
+        return {"title": title, "terms": page_terms(title)}
+
+    def add_document(self, source, document):
+        old = self.pages.get(source)
+        if old is not None:
+            document["id"] = old["id"]
+        else:
+            # Ids are never reused, so shards of unchanged pages stay valid.
+            document["id"] = self.next_id
+            self.next_id += 1
+        super().add_document(source, document)
+
+    def shard_texts(self):
+        shards = {}
+        for page in self.pages.values():
+            for term, positions in page["terms"].items():
+                shards.setdefault(shard_name(term), {}).setdefault(term, []).append([page["id"], positions])
+        for terms in shards.values():
+            for postings in terms.values():
+                postings.sort()
+        return {name: json.dumps(terms, separators=(",", ":"), sort_keys=True) + "\n" for name, terms in shards.items()}
+
+    def index_text(self, shard_names):
+        pages = [None] * self.next_id
+        for source, page in self.pages.items():
+            pages[page["id"]] = [page_url(source, self.content_root, self.basepath), page["title"]]
+        data = {"prefix": SHARD_PREFIX_LENGTH, "pages": pages, "shards": sorted(shard_names)}
+        return json.dumps(data, separators=(",", ":"), sort_keys=True) + "\n"
+
+    def write(self, dest_root, manifest=None):
+        # Only shards whose terms changed are rewritten; with a manifest,
+        # shards no longer produced are pruned with the other outputs.
+        directory = os.path.join(dest_root, SEARCH_DIR)
+        if manifest is None or not manifest.dry_run:
+            os.makedirs(directory, exist_ok=True)
+        shards = self.shard_texts()
+        self.shards = len(shards)
+        self.written = 0
+        for name, text in sorted(shards.items()):
+            if write_if_changed(os.path.join(directory, f"{name}.json"), text, manifest, self.content_root):
+                self.written += 1
+        if write_if_changed(os.path.join(directory, "index.json"), self.index_text(shards), manifest, self.content_root):
+            self.written += 1
+
+    def report(self):
+        terms = sum(len(page["terms"]) for page in self.pages.values())
+        return {"pages": len(self.pages), "indexed": self.added, "terms": terms, "shards": self.shards, "written": self.written}
+
+    def summary(self):
+        return (
+            f"Search: {len(self.pages)} page(s), {self.added} indexed this build, "
+            f"{self.shards} shard(s), {self.written} file(s) written"
+        )
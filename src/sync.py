@@ -0,0 +1,184 @@
+import concurrent.futures
+import errno
+import logging
+import os
+import shutil
+
+from manifest import hash_file, remove_empty_parents
+
+logger = logging.getLogger("site")
+
+# ioctl request for a copy-on-write clone (Linux btrfs/xfs/overlayfs)
+FICLONE = 0x40049409
+
+LINK_MODES = ("hardlink", "reflink")
+
+# Errors that mean "this copy method isn't available here", after which the
+# next method is tried. Anything else is a real failure.
+UNSUPPORTED_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY}
+
+
+def scan_files(root):
+    # relative path -> os.stat_result for every file under root, from a
+    # single os.scandir walk.
+    files = {}
+    if not os.path.isdir(root):
+        return files
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        with os.scandir(os.path.join(root, relative)) as entries:
+            for entry in entries:
+                path = os.path.join(relative, entry.name)
+                if entry.is_dir():
+                    stack.append(path)
+                elif entry.is_file():
+                    files[path] = entry.stat()
+    return files
+
+
+def file_stamp(stat):
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def is_unchanged(source, source_stat, dest, dest_stat, checksum=False):
+    if dest_stat is None or dest_stat.st_size != source_stat.st_size:
+        return False
+    if checksum:
+        return hash_file(source) == hash_file(dest)
+    # Copies keep the source's mtime, so equal size and mtime means the
+    # destination is already up to date.
+    return dest_stat.st_mtime_ns == source_stat.st_mtime_ns
+
+
+def copy_range(fsrc, fdst, size, copy):
+    offset = 0
+    while offset < size:
+        try:
+            sent = copy(fsrc.fileno(), fdst.fileno(), offset, size - offset)
+        except OSError as e:
+            if offset == 0 and e.errno in UNSUPPORTED_ERRORS:
+                return False
+            raise
+        if sent == 0:
+            break
+        offset += sent
+    return True
+
+
+def copy_contents(fsrc, fdst, size, reflink=False):
+    # Returns the method used: the cheapest one the filesystem supports.
+    if reflink:
+        try:
+            import fcntl
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return "reflink"
+        except (ImportError, OSError):
+            pass
+    if hasattr(os, "copy_file_range"):
+        def copy(src_fd, dst_fd, offset, count):
+            return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        if copy_range(fsrc, fdst, size, copy):
+            return "copy_file_range"
+    if hasattr(os, "sendfile"):
+        def copy(src_fd, dst_fd, offset, count):
+            return os.sendfile(dst_fd, src_fd, offset, count)
+        if copy_range(fsrc, fdst, size, copy):
+            return "sendfile"
+    fsrc.seek(0)
+    fdst.seek(0)
+    fdst.truncate()
+    shutil.copyfileobj(fsrc, fdst, 1 << 20)
+    return "copy"
+
+
+def copy_file(source, dest, source_stat, link=None):
+    # Copies into a temporary name and renames over dest, so a reader never
+    # sees a half-written file and an existing hard link is replaced rather
+    # than written through.
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    temp = f"{dest}.{os.getpid()}.tmp"
+    if link == "hardlink":
+        try:
+            os.link(source, temp)
+            os.replace(temp, dest)
+            return "hardlink"
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+    try:
+        with open(source, "rb") as fsrc, open(temp, "wb") as fdst:
+            method = copy_contents(fsrc, fdst, source_stat.st_size, reflink=link == "reflink")
+        shutil.copymode(source, temp)
+        os.utime(temp, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.replace(temp, dest)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return method
+
+
+class SyncResult:
+    def __init__(self):
+        self.copied = []
+        self.skipped = 0
+        self.removed = []
+        self.methods = {}
+
+    def summary(self):
+        methods = ", ".join(f"{count} by {method}" for method, count in sorted(self.methods.items()))
+        return f"Static files: {len(self.copied)} copied ({methods or 'none'}), {self.skipped} unchanged, {len(self.removed)} removed"
+
+
+def sync_static(source_root, dest_root, manifest=None, checksum=False, link=None, jobs=4, prune=False, aliases=None):
+    # Brings dest_root up to date with source_root, copying only files whose
+    # size/mtime (or, with checksum, content) differ. With a manifest the
+    # copies are recorded there, so a later prune can delete outputs whose
+    # source was removed; prune=True instead deletes every file under
+    # dest_root that has no source, for directories holding only assets.
+    # aliases maps a relative source path to a second relative destination
+    # it is copied to as well (e.g. its fingerprinted name).
+    if link is not None and link not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {link}")
+    dry_run = manifest is not None and manifest.dry_run
+    source_files = scan_files(source_root)
+    dest_files = scan_files(dest_root)
+    result = SyncResult()
+
+    aliases = aliases or {}
+    targets = {}
+    to_copy = []
+    for relative in sorted(source_files):
+        source = os.path.join(source_root, relative)
+        source_stat = source_files[relative]
+        for target in (relative, aliases.get(relative)):
+            if target is None:
+                continue
+            targets[target] = relative
+            dest = os.path.join(dest_root, target)
+            changed = not is_unchanged(source, source_stat, dest, dest_files.get(target), checksum)
+            if manifest is not None:
+                manifest.record("static", source, dest, file_stamp(source_stat), changed)
+            if not changed:
+                result.skipped += 1
+            elif not dry_run:
+                to_copy.append((source, dest, source_stat))
+
+    if to_copy:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = [executor.submit(copy_file, source, dest, stat, link) for source, dest, stat in to_copy]
+            for (source, dest, _), future in zip(to_copy, futures):
+                method = future.result()
+                logger.info("Copying file: %s to %s", source, dest)
+                result.copied.append(dest)
+                result.methods[method] = result.methods.get(method, 0) + 1
+
+    if prune and not dry_run:
+        for relative in sorted(set(dest_files) - set(targets)):
+            dest = os.path.join(dest_root, relative)
+            os.remove(dest)
+            remove_empty_parents(dest, dest_root)
+            result.removed.append(dest)
+
+    return result
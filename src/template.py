@@ -0,0 +1,191 @@
+import os
+import re
+
+from htmlnode import write_chunks
+
+LAYOUT_NAME = "_layout.html"
+
+# {{ Title }} / {{ Content }} style slots, and {{> name }} partial includes.
+SLOT_PATTERN = re.compile(r"\{\{\s*(>?)\s*([\w-]+)\s*\}\}")
+TAG_PATTERN = re.compile(r"<[^<>]+>")
+URL_ATTRIBUTE_PATTERN = re.compile(r'(\s(?:href|src)=")([^"]*)(")')
+
+MAX_PARTIAL_DEPTH = 16
+
+
+def basepath_rewriter(basepath, assets=None):
+    # assets maps site-absolute asset paths to their fingerprinted names,
+    # e.g. {"/index.css": "/index.3f2a9c1b.css"}.
+    if basepath == "/" and not assets:
+        return None
+
+    def rewrite_url(url):
+        # Only site-absolute paths; "//host/..." is protocol-relative.
+        if url.startswith("/") and not url.startswith("//"):
+            if assets:
+                end = len(url)
+                for mark in "?#":
+                    index = url.find(mark)
+                    if index != -1 and index < end:
+                        end = index
+                url = assets.get(url[:end], url[:end]) + url[end:]
+            return basepath + url[1:]
+        return url
+
+    return rewrite_url
+
+
+def rewrite_tag_urls(html, rewrite_url):
+    # Rewrite href/src values inside real tags only, never in text content.
+    def rewrite_attribute(match):
+        return match.group(1) + rewrite_url(match.group(2)) + match.group(3)
+
+    def rewrite_tag(match):
+        return URL_ATTRIBUTE_PATTERN.sub(rewrite_attribute, match.group(0))
+
+    return TAG_PATTERN.sub(rewrite_tag, html)
+
+
+class Template:
+    def __init__(self, segments, rewrite_url=None):
+        # Literal text at even indices, slot names at odd indices.
+        self.segments = segments
+        self.slots = segments[1::2]
+        self.rewrite_url = rewrite_url
+
+    def iter_chunks(self, values):
+        # Slot values are either strings or HTML nodes, which are serialized
+        # straight into the output rather than into an intermediate string.
+        for name in self.slots:
+            if name not in values:
+                raise ValueError(f"No value for template slot: {name}")
+        segments = self.segments
+        for i in range(0, len(segments) - 1, 2):
+            yield segments[i]
+            value = values[segments[i + 1]]
+            if isinstance(value, str):
+                yield value
+            else:
+                yield from value.iter_html(self.rewrite_url)
+        yield segments[-1]
+
+    def render(self, **values):
+        return "".join(self.iter_chunks(values))
+
+    def write(self, stream, **values):
+        write_chunks(stream, self.iter_chunks(values))
+
+
+def compile_template(text, basepath="/", load_partial=None, assets=None):
+    rewrite_url = basepath_rewriter(basepath, assets)
+    text = expand_partials(text, load_partial)
+    if rewrite_url is not None:
+        text = rewrite_tag_urls(text, rewrite_url)
+
+    segments = []
+    position = 0
+    for match in SLOT_PATTERN.finditer(text):
+        segments.append(text[position:match.start()])
+        segments.append(match.group(2))
+        position = match.end()
+    segments.append(text[position:])
+    return Template(segments, rewrite_url)
+
+
+def expand_partials(text, load_partial, depth=0):
+    def include(match):
+        if not match.group(1):
+            return match.group(0)
+        if load_partial is None:
+            raise ValueError(f"No partial loader for: {match.group(2)}")
+        if depth >= MAX_PARTIAL_DEPTH:
+            raise ValueError(f"Partials nested too deeply at: {match.group(2)}")
+        return expand_partials(load_partial(match.group(2)), load_partial, depth + 1)
+
+    return SLOT_PATTERN.sub(include, text)
+
+
+def template_files(template_path, content_root):
+    # Every file that can affect a page's wrapper: the root template plus any
+    # _layout.html / _partial.html files in the content tree.
+    files = [template_path]
+    for directory, dirnames, filenames in os.walk(content_root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.startswith("_") and filename.endswith(".html"):
+                files.append(os.path.join(directory, filename))
+    return files
+
+
+class TemplateLoader:
+    def __init__(self, template_path, content_root, basepath="/", assets=None):
+        self.template_path = template_path
+        self.content_root = content_root
+        self.basepath = basepath
+        self.assets = assets
+        self._texts = {}
+        self._templates = {}
+
+    def for_page(self, page_path):
+        return self.for_directory(os.path.dirname(page_path))
+
+    def for_directory(self, directory):
+        directory = os.path.abspath(directory)
+        template = self._templates.get(directory)
+        if template is not None:
+            return template
+
+        search_path = self.search_path(directory)
+        if len(search_path) > 2 and not self.has_overrides(directory):
+            # A subdirectory with nothing that changes the layout shares the
+            # compiled template of its parent.
+            template = self.for_directory(os.path.dirname(directory))
+        else:
+            layout_path = self.find(search_path[:-1], LAYOUT_NAME) or self.template_path
+
+            def load_partial(name):
+                partial_path = self.find(search_path, f"_{name}.html")
+                if partial_path is None:
+                    raise ValueError(f"Partial not found: {name} (needed by {layout_path})")
+                return self.read(partial_path)
+
+            template = compile_template(self.read(layout_path), self.basepath, load_partial, self.assets)
+        self._templates[directory] = template
+        return template
+
+    def search_path(self, directory):
+        # Nearest directory first, up to the content root, then the
+        # directory holding the root template.
+        root = os.path.abspath(self.content_root)
+        current = os.path.abspath(directory)
+        dirs = []
+        if os.path.commonpath([root, current]) == root:
+            while True:
+                dirs.append(current)
+                if current == root:
+                    break
+                current = os.path.dirname(current)
+        dirs.append(os.path.abspath(os.path.dirname(self.template_path)))
+        return dirs
+
+    def has_overrides(self, directory):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return False
+        return any(name.startswith("_") and name.endswith(".html") for name in names)
+
+    def find(self, search_path, filename):
+        for directory in search_path:
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def read(self, path):
+        text = self._texts.get(path)
+        if text is None:
+            with open(path, "r") as f:
+                text = f.read()
+            self._texts[path] = text
+        return text
@@ -0,0 +1,60 @@
+import unittest
+
+from blockcache import BlockCache
+from converter import markdown_to_html_node
+from htmlnode import FragmentNode
+from template import basepath_rewriter
+
+BOILERPLATE = """This post is licensed under **CC BY 4.0**, see [the license](/license).
+
+- shared
+- list
+"""
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_same_html_as_uncached(self):
+        cache = BlockCache(16)
+        markdown = "# Title\n\n" + BOILERPLATE + "\n```\ncode\n\nmore\n```\n\n> quote\n\n1. one\n2. two"
+        expected = markdown_to_html_node(markdown).to_html()
+        self.assertEqual(markdown_to_html_node(markdown, cache).to_html(), expected)
+        self.assertEqual(markdown_to_html_node(markdown, cache).to_html(), expected)
+        self.assertEqual(cache.misses, 6)
+        self.assertEqual(cache.hits, 6)
+
+    def test_repeated_block_is_a_hit(self):
+        cache = BlockCache(16)
+        markdown_to_html_node("# One\n\n" + BOILERPLATE, cache)
+        node = markdown_to_html_node("# Two\n\n" + BOILERPLATE, cache)
+        self.assertIsInstance(node.children[1], FragmentNode)
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 4)
+
+    def test_hit_rewrites_urls_for_basepath(self):
+        cache = BlockCache(16)
+        markdown_to_html_node(BOILERPLATE, cache)
+        node = markdown_to_html_node(BOILERPLATE, cache)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(
+            node.to_html(basepath_rewriter("/site/")),
+            markdown_to_html_node(BOILERPLATE).to_html(basepath_rewriter("/site/")),
+        )
+        self.assertIn('href="/site/license"', node.to_html(basepath_rewriter("/site/")))
+
+    def test_lru_eviction(self):
+        cache = BlockCache(2)
+        markdown_to_html_node("a\n\nb", cache)
+        markdown_to_html_node("a", cache)
+        markdown_to_html_node("c", cache)
+        self.assertEqual(set(cache.entries), {"a", "c"})
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_add_counts(self):
+        cache = BlockCache(2)
+        cache.add_counts(3, 1, 2)
+        self.assertEqual(cache.summary(), "Block cache: 3 hits, 1 misses (75% hit rate), 2 evictions")
+
+
+if __name__ == "__main__":
+    unittest.main()
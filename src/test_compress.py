@@ -0,0 +1,82 @@
+import gzip
+import os
+import unittest
+
+from compress import gzip_trailer, precompress
+from testutil import TempDirTestCase
+
+PAGE = "<p>" + "hello world " * 200 + "</p>"
+
+
+class TestPrecompress(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.page = os.path.join(self.root, "blog", "index.html")
+        self.write(self.page, PAGE)
+        self.write(os.path.join(self.root, "small.css"), "body {}")
+        self.write(os.path.join(self.root, "image.png"), "x" * 4096)
+
+    def write(self, path, text, mtime=None):
+        super().write(path, text)
+        if mtime is not None:
+            os.utime(path, ns=(mtime, mtime))
+
+    def test_writes_sidecars_above_threshold(self):
+        result = precompress(self.root)
+        with gzip.open(self.page + ".gz", "rt") as f:
+            self.assertEqual(f.read(), PAGE)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "small.css.gz")))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "image.png.gz")))
+        self.assertEqual((result.written, result.unchanged), (1, 0))
+        self.assertLess(result.ratio(), 0.1)
+
+    def test_unchanged_output_is_not_recompressed(self):
+        precompress(self.root)
+        sidecar_mtime = os.stat(self.page + ".gz").st_mtime_ns
+        self.assertEqual(precompress(self.root).unchanged, 1)
+        # Same bytes, new mtime: recognised from the gzip trailer
+        self.write(self.page, PAGE, mtime=sidecar_mtime + 10**9)
+        result = precompress(self.root)
+        self.assertEqual((result.written, result.unchanged), (0, 1))
+        self.assertEqual(os.stat(self.page + ".gz").st_mtime_ns, sidecar_mtime + 10**9)
+
+    def test_changed_output_is_recompressed(self):
+        precompress(self.root)
+        changed = PAGE.replace("hello", "bye")
+        self.write(self.page, changed, mtime=os.stat(self.page).st_mtime_ns + 10**9)
+        self.assertEqual(precompress(self.root).written, 1)
+        with gzip.open(self.page + ".gz", "rt") as f:
+            self.assertEqual(f.read(), changed)
+        self.assertEqual(gzip_trailer(self.page + ".gz")[1], len(changed))
+
+    def test_static_gz_assets_are_kept(self):
+        archive = os.path.join(self.root, "downloads", "foo.tar.gz")
+        data = os.path.join(self.root, "data.json.gz")
+        bundle = os.path.join(self.root, "app.js")
+        self.write(archive, "archive")
+        self.write(data, "data")
+        self.write(bundle, "x" * 4096)
+        self.write(bundle + ".gz", "hand-made")
+        result = precompress(self.root, assets=[os.path.join("downloads", "foo.tar.gz"), "app.js.gz"])
+        self.assertEqual(result.removed, 0)
+        for path in (archive, data):
+            self.assertTrue(os.path.exists(path))
+        with open(bundle + ".gz") as f:
+            self.assertEqual(f.read(), "hand-made")
+        # Not a static file, but not a sidecar of anything precompress writes
+        os.remove(bundle + ".gz")
+        self.write(os.path.join(self.root, "notes.txt.gz"), "x")
+        result = precompress(self.root)
+        self.assertTrue(os.path.exists(data))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "notes.txt.gz")))
+
+    def test_removes_orphaned_sidecars(self):
+        precompress(self.root)
+        os.remove(self.page)
+        self.assertEqual(precompress(self.root).removed, 1)
+        self.assertFalse(os.path.exists(self.page + ".gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
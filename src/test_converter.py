@@ -1,3 +1,4 @@
+import io
 import unittest
 from textnode import *
 from converter import *
@@ -233,6 +234,44 @@ class TestConverter(unittest.TestCase):
         # Test with an image
         text = "See this ![cool image](https://example.com/img.jpg)"
 
+    def test_text_to_textnodes_bold_inside_italic(self):
+        nodes = text_to_textnodes("a _b **c** d_ e")
+        self.assertListEqual(
+            [
+                TextNode("a ", TextType.TEXT),
+                TextNode("b c d", TextType.ITALIC, children=[
+                    TextNode("b ", TextType.TEXT),
+                    TextNode("c", TextType.BOLD),
+                    TextNode(" d", TextType.TEXT),
+                ]),
+                TextNode(" e", TextType.TEXT),
+            ],
+            nodes,
+        )
+        html = ParentNode("p", text_to_children("a _b **c** d_ e")).to_html()
+        self.assertEqual(html, "<p>a <i>b <b>c</b> d</i> e</p>")
+
+    def test_text_to_textnodes_code_is_literal(self):
+        nodes = text_to_textnodes("`a_b_c` and [x](/some_path_here)")
+        self.assertListEqual(
+            [
+                TextNode("a_b_c", TextType.CODE),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("x", TextType.LINK, "/some_path_here"),
+            ],
+            nodes,
+        )
+
+    def test_text_to_textnodes_unclosed_delimiter(self):
+        with self.assertRaises(ValueError):
+            text_to_textnodes("this is **not closed")
+
+    def test_text_to_textnodes_many_spans(self):
+        text = "word **bold** _it_ `c` [l](u) ![i](p) " * 2000
+        nodes = text_to_textnodes(text)
+        self.assertEqual(len(nodes), 20001)
+        self.assertEqual(nodes[-2], TextNode("i", TextType.IMAGE, "p"))
+
     def test_markdown_to_blocks(self):
         md = """
 This is **bolded** paragraph
@@ -392,6 +431,32 @@ the **same** even with inline stuff
         "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff\n</code></pre></div>",
     )
 
+    def test_codeblock_with_blank_lines(self):
+        md = "```python\ndef f():\n\n    return 1\n```\n\nafter"
+        blocks = list(scan_blocks(md))
+        self.assertEqual(
+            blocks,
+            [
+                (BlockType.CODE, ["```python", "def f():", "", "    return 1", "```"]),
+                (BlockType.PARAGRAPH, ["after"]),
+            ],
+        )
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><pre><code>def f():\n\n    return 1\n</code></pre><p>after</p></div>",
+        )
+
+    def test_scan_blocks_from_file(self):
+        md = "# Title\r\n\r\n- a\r\n- b\r\n\r\n1. x\r\n2. y\r\n"
+        blocks = list(scan_blocks(io.StringIO(md, newline="")))
+        self.assertEqual(
+            [block_type for block_type, _ in blocks],
+            [BlockType.HEADING, BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST],
+        )
+        self.assertEqual(blocks[1][1], ["- a", "- b"])
+
+    def test_whitespace_only_line_separates_blocks(self):
+        self.assertEqual(markdown_to_blocks("a\n   \nb"), ["a", "b"])
 
 if __name__ == "__main__":
     unittest.main()
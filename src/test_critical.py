@@ -0,0 +1,107 @@
+import os
+import unittest
+
+from critical import CriticalCSS, Stylesheet, parse_stylesheet, scan_content, selector_requirements
+from htmlnode import FragmentNode, LeafNode, ParentNode
+from renderer import SiteRenderer, SingleTemplate
+from template import compile_template
+from testutil import TempDirTestCase
+
+CSS = """
+/* site styles */
+body { margin: 0; }
+h1, h2 { color: red; }
+pre code { padding: 0; }
+a:hover { color: blue; }
+.note > p { font-style: italic; }
+* { box-sizing: border-box; }
+@media (max-width: 600px) { body { padding: 0; } }
+"""
+
+TEMPLATE = (
+    '<html><head><title>{{ Title }}</title><link href="/index.css" rel="stylesheet" /></head>'
+    "<body>{{ Content }}</body></html>"
+)
+
+
+def page(*children):
+    return ParentNode("div", list(children))
+
+
+class TestCritical(unittest.TestCase):
+    def test_selector_requirements(self):
+        self.assertEqual(selector_requirements("pre code"), {"pre", "code"})
+        self.assertEqual(selector_requirements("a:hover"), {"a"})
+        self.assertEqual(selector_requirements("div.note > #top"), {"div", ".note", "#top"})
+        self.assertEqual(selector_requirements("input[type=text]"), {"input"})
+        self.assertEqual(selector_requirements("li:not(.done)"), {"li"})
+        self.assertEqual(selector_requirements("::-webkit-scrollbar"), frozenset())
+
+    def test_selects_rules_the_page_can_use(self):
+        sheet = Stylesheet(parse_stylesheet(CSS))
+        css = sheet.select({"html", "body", "h1", "p"})
+        self.assertEqual(
+            css,
+            "body{margin:0}h1,h2{color:red}*{box-sizing:border-box}"
+            "@media (max-width: 600px){body{padding: 0}}",
+        )
+        self.assertIn("pre code{padding:0}", sheet.select({"pre", "code"}))
+        self.assertIn(".note>p{font-style:italic}", sheet.select({"div", ".note", "p"}))
+        self.assertIn("a:hover{color:blue}", sheet.select(None))
+
+    def test_scans_nodes_and_fragments(self):
+        fragment = FragmentNode.from_node(ParentNode("p", [LeafNode("img", "", {"src": "/b.png", "alt": ""})], {"class": "lead"}))
+        tokens, first_image = scan_content(page(LeafNode("h1", "Title"), fragment, LeafNode("img", "", {"src": "/c.png"})))
+        self.assertEqual(tokens, {"div", "h1", "p", ".lead", "img"})
+        self.assertEqual(first_image, "/b.png")
+        self.assertIsNone(scan_content(object()))
+
+
+class TestCriticalRendering(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.write(os.path.join(self.static, "index.css"), CSS)
+        self.write(os.path.join(self.static, "css", "fonts.css"), "@font-face { src: url('../fonts/a.woff2'); }")
+
+    def render(self, content, basepath="/", assets=None):
+        critical = CriticalCSS.load(self.static, basepath, assets)
+        template = compile_template(TEMPLATE, basepath, assets=assets)
+        renderer = SiteRenderer(SingleTemplate(template), critical=critical)
+        return renderer.page_template("content/index.md", content).render(Title="T", Content=content)
+
+    def test_inlines_stylesheet_and_preloads_first_image(self):
+        html = self.render(page(LeafNode("h1", "Hi"), LeafNode("img", "", {"src": "/images/a.png"})))
+        self.assertNotIn('rel="stylesheet"', html)
+        self.assertIn("<style>body{margin:0}h1,h2{color:red}*{box-sizing:border-box}", html)
+        self.assertNotIn("pre code", html)
+        self.assertIn('<link rel="preload" as="image" href="/images/a.png"></head>', html)
+
+    def test_fingerprinted_links_under_a_basepath(self):
+        assets = {"/index.css": "/index.0123abcd.css", "/images/a.png": "/images/a.89abcdef.png"}
+        html = self.render(page(LeafNode("img", "", {"src": "/images/a.png"})), "/site/", assets)
+        self.assertIn("<style>body{margin:0}", html)
+        self.assertIn('href="/site/images/a.89abcdef.png"', html)
+
+    def test_streamed_content_gets_every_rule(self):
+        class Streamed:
+            def iter_html(self, rewrite_url=None):
+                yield "<div></div>"
+
+        html = self.render(Streamed())
+        self.assertIn("pre code{padding:0}", html)
+        self.assertNotIn("preload", html)
+
+    def test_relative_css_urls_become_absolute(self):
+        critical = CriticalCSS.load(self.static, "/site/")
+        self.assertEqual(critical.stylesheets["/css/fonts.css"].select(None), '@font-face{src: url("/site/fonts/a.woff2")}')
+
+    def test_digest_follows_rules(self):
+        digest = CriticalCSS.load(self.static).digest()
+        with open(os.path.join(self.static, "index.css"), "a") as f:
+            f.write("p { margin: 0; }")
+        self.assertNotEqual(CriticalCSS.load(self.static).digest(), digest)
+
+
+if __name__ == "__main__":
+    unittest.main()
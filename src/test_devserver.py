@@ -0,0 +1,77 @@
+import os
+import unittest
+
+from devserver import DevSite
+from testutil import TempDirTestCase
+
+
+class TestDevSite(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.template = os.path.join(root, "template.html")
+        self.write(self.template, "<link href=\"/index.css\">{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Blog")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.site = DevSite(self.content, self.static, self.template, "/base/")
+        self.site.build()
+
+    def write(self, path, text):
+        mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+        super().write(path, text)
+        # Make sure the poller sees a new mtime even on coarse clocks
+        os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+    def get(self, path):
+        return self.site.lookup(path)[1]
+
+    def test_lookup(self):
+        self.assertEqual(self.get("/base/"), b'<link href="/base/index.css"><div><h1>Home</h1></div>')
+        self.assertEqual(self.get("/base/blog"), self.get("/base/blog/index.html"))
+        self.assertEqual(self.get("/base/index.css"), b"body {}")
+        self.assertIsNone(self.get("/base/missing"))
+
+    def test_bare_basepath_redirects(self):
+        self.assertEqual(self.site.redirect("/base"), "/base/")
+        self.assertEqual(self.site.redirect("/base?q=1"), "/base/?q=1")
+        self.assertIsNone(self.site.redirect("/base/"))
+        self.assertIsNone(self.site.redirect("/basement"))
+
+    def test_page_change(self):
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Changed")
+        changed = self.site.poll()
+        self.assertEqual(changed, [os.path.join(self.content, "blog", "index.md")])
+        self.assertIn(b"<h1>Changed</h1>", self.get("/base/blog/"))
+
+    def test_page_added_and_removed(self):
+        path = os.path.join(self.content, "new.md")
+        self.write(path, "# New")
+        self.site.poll()
+        self.assertIn(b"<h1>New</h1>", self.get("/base/new.html"))
+        os.remove(path)
+        self.site.poll()
+        self.assertIsNone(self.get("/base/new.html"))
+
+    def test_asset_change(self):
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.site.poll()
+        self.assertEqual(self.get("/base/index.css"), b"body { margin: 0 }")
+
+    def test_template_change_rerenders_every_page(self):
+        self.write(self.template, "<main>{{ Content }}</main>")
+        self.site.poll()
+        self.assertEqual(self.get("/base/"), b"<main><div><h1>Home</h1></div></main>")
+        self.assertEqual(self.get("/base/blog/"), b"<main><div><h1>Blog</h1></div></main>")
+
+    def test_broken_page_keeps_last_good_version(self):
+        self.write(os.path.join(self.content, "index.md"), "no title")
+        with self.assertLogs("site", level="ERROR"):
+            self.site.poll()
+        self.assertIn(b"<h1>Home</h1>", self.get("/base/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
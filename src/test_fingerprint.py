@@ -0,0 +1,59 @@
+import os
+import unittest
+
+from fingerprint import asset_urls, fingerprint_assets, headers_text, write_asset_files
+from manifest import hash_bytes
+from sync import sync_static
+from template import basepath_rewriter, compile_template
+from testutil import TempDirTestCase
+
+ASSETS = {"/index.css": "/index.0123abcd.css", "/images/tom.png": "/images/tom.89abcdef.png"}
+
+
+class TestFingerprint(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.docs = os.path.join(self.tmp.name, "docs")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "tom.png"), "png")
+        self.write(os.path.join(self.static, "robots.txt"), "User-agent: *")
+
+    def test_names_follow_content(self):
+        names = fingerprint_assets(self.static)
+        digest = hash_bytes(b"body {}")[:8]
+        self.assertEqual(names["index.css"], f"index.{digest}.css")
+        self.assertNotIn("robots.txt", names)
+        self.assertEqual(asset_urls(names)["/index.css"], f"/index.{digest}.css")
+
+    def test_rewriter_maps_assets(self):
+        rewrite = basepath_rewriter("/site/", ASSETS)
+        self.assertEqual(rewrite("/index.css"), "/site/index.0123abcd.css")
+        self.assertEqual(rewrite("/images/tom.png?v=1#top"), "/site/images/tom.89abcdef.png?v=1#top")
+        self.assertEqual(rewrite("/blog/tom"), "/site/blog/tom")
+        self.assertEqual(rewrite("//cdn.example/index.css"), "//cdn.example/index.css")
+        self.assertEqual(basepath_rewriter("/", ASSETS)("/index.css"), "/index.0123abcd.css")
+
+    def test_template_links_are_rewritten(self):
+        template = compile_template('<link href="/index.css">{{ Content }}', "/", assets=ASSETS)
+        self.assertEqual(template.render(Content="/index.css"), '<link href="/index.0123abcd.css">/index.css')
+
+    def test_sync_copies_both_names(self):
+        names = fingerprint_assets(self.static)
+        sync_static(self.static, self.docs, aliases=names)
+        for relative in list(names) + list(names.values()) + ["robots.txt"]:
+            self.assertTrue(os.path.isfile(os.path.join(self.docs, relative)), relative)
+
+    def test_headers_and_manifest(self):
+        self.assertEqual(
+            headers_text({"/index.css": "/index.0123abcd.css"}, "/site/"),
+            "/site/index.0123abcd.css\n  Cache-Control: public, max-age=31536000, immutable\n",
+        )
+        os.makedirs(self.docs)
+        write_asset_files(self.docs, ASSETS)
+        with open(os.path.join(self.docs, "asset-manifest.json")) as f:
+            self.assertIn('"/index.css": "/index.0123abcd.css"', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import unittest
+from unittest import mock
+
+import fragmentcache
+from converter import markdown_to_html_node
+from fragmentcache import FragmentCache
+from main import extract_title, generate_pages_recursive
+from renderer import RenderOptions
+from template import basepath_rewriter
+from testutil import TempDirTestCase
+
+MARKDOWN = "# Tom\n\nSee [the blog](/blog/tom) and ![a pic](/images/tom.png)."
+
+
+class TestFragmentCache(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(self.tmp.name, "cache")
+
+    def render(self, cache, markdown=MARKDOWN):
+        return cache.render(markdown, markdown_to_html_node, extract_title)
+
+    def test_hit_survives_a_new_process(self):
+        self.render(FragmentCache(self.root))
+        cache = FragmentCache(self.root)
+        title, node = self.render(cache)
+        self.assertEqual(title, "Tom")
+        self.assertEqual(node.to_html(), markdown_to_html_node(MARKDOWN).to_html())
+        self.assertEqual(cache.counts(), (1, 0, 0))
+
+    def test_hit_is_rewritten_for_any_basepath(self):
+        self.render(FragmentCache(self.root))
+        _, node = self.render(FragmentCache(self.root))
+        rewrite = basepath_rewriter("/site/")
+        self.assertEqual(node.to_html(rewrite), markdown_to_html_node(MARKDOWN).to_html(rewrite))
+        self.assertIn('src="/site/images/tom.png"', node.to_html(rewrite))
+
+    def test_converter_version_is_part_of_the_key(self):
+        cache = FragmentCache(self.root)
+        self.render(cache)
+        with mock.patch.object(fragmentcache, "CONVERTER_VERSION", "next"):
+            self.render(cache)
+        self.assertEqual(cache.counts(), (0, 2, 2))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = FragmentCache(self.root)
+        self.render(cache)
+        with open(cache.path(cache.key(MARKDOWN)), "w") as f:
+            f.write('{"title": "Tom", "parts": [')
+        title, _ = self.render(cache)
+        self.assertEqual(title, "Tom")
+        self.assertEqual(cache.counts(), (0, 2, 2))
+
+    def test_read_only_cache_stores_nothing(self):
+        cache = FragmentCache(self.root, read_only=True)
+        title, node = self.render(cache)
+        self.assertEqual(title, "Tom")
+        self.assertEqual(node.to_html(), markdown_to_html_node(MARKDOWN).to_html())
+        self.assertEqual(cache.counts(), (0, 1, 0))
+        self.assertFalse(os.path.exists(self.root))
+
+    def test_evicts_least_recently_used(self):
+        cache = FragmentCache(self.root)
+        pages = [f"# Page {i}\n\n" + "text " * 100 for i in range(4)]
+        for i, markdown in enumerate(pages):
+            self.render(cache, markdown)
+            os.utime(cache.path(cache.key(markdown)), ns=(i, i))
+        cache.max_bytes = 2 * os.path.getsize(cache.path(cache.key(pages[0])))
+        self.assertEqual(cache.evict(), 2)
+        kept = [os.path.exists(cache.path(cache.key(markdown))) for markdown in pages]
+        self.assertEqual(kept, [False, False, True, True])
+
+    def test_template_change_reuses_fragments(self):
+        content = os.path.join(self.tmp.name, "content")
+        dest = os.path.join(self.tmp.name, "docs")
+        template = os.path.join(self.tmp.name, "template.html")
+        os.makedirs(content)
+        with open(os.path.join(content, "index.md"), "w") as f:
+            f.write(MARKDOWN)
+        for i, text in enumerate(["<h1>{{ Title }}</h1>{{ Content }}", "<title>{{ Title }}</title>{{ Content }}"]):
+            with open(template, "w") as f:
+                f.write(text)
+            cache = FragmentCache(self.root)
+            generate_pages_recursive(content, template, dest, "/site/", options=RenderOptions(fragments=cache))
+            self.assertEqual(cache.hits, i)
+        with open(os.path.join(dest, "index.html")) as f:
+            html = f.read()
+        self.assertTrue(html.startswith("<title>Tom</title><div><h1>Tom</h1>"))
+        self.assertIn('href="/site/blog/tom"', html)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import io
 import unittest
 from htmlnode import HTMLNode, LeafNode, ParentNode, text_node_to_html_node
 from textnode import TextNode, TextType
@@ -117,6 +118,28 @@ class TestHTMLNode(unittest.TestCase):
         parent2 = ParentNode("div", [parent1])
         parent3 = ParentNode("section", [parent2])
 
+    def test_very_deep_nesting(self):
+        node = LeafNode("b", "text")
+        for _ in range(10000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span><span>"))
+        self.assertEqual(html.count("</span>"), 10000)
+
+    def test_write_html(self):
+        parent = ParentNode("div", [LeafNode("a", "x", {"href": "/a"}), LeafNode(None, "y")])
+        stream = io.StringIO()
+        parent.write_html(stream)
+        self.assertEqual(stream.getvalue(), parent.to_html())
+        self.assertEqual(stream.getvalue(), '<div><a href="/a">x</a>y</div>')
+
+    def test_to_html_rewrite_url(self):
+        parent = ParentNode("p", [LeafNode("img", "", {"src": "/a.png", "alt": "/a"})])
+        self.assertEqual(
+            parent.to_html(lambda url: "/base" + url),
+            '<p><img src="/base/a.png" alt="/a"></img></p>',
+        )
+
     def test_text(self):
         node = TextNode("This is a text node", TextType.TEXT)
         html_node = text_node_to_html_node(node)
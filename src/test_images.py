@@ -0,0 +1,128 @@
+import io
+import os
+import struct
+import unittest
+import zlib
+
+from images import ImageAttributes, ImageIndex, read_image_size
+from testutil import TempDirTestCase
+
+
+def png(width, height):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    return b"\x89PNG\r\n\x1a\n" + chunk
+
+
+def gif(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00\x00\x00;"
+
+
+def jpeg(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + sof + b"\xff\xd9"
+
+
+def webp(width, height):
+    vp8x = b"VP8X" + struct.pack("<I", 10) + b"\x00" * 4
+    vp8x += (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+    return b"RIFF" + struct.pack("<I", 4 + len(vp8x)) + b"WEBP" + vp8x
+
+
+class TestImages(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.index_path = os.path.join(self.tmp.name, "index.json")
+
+    def write_static(self, relative, data):
+        return self.write(os.path.join(self.static, relative), data)
+
+    def test_reads_header_sizes(self):
+        self.assertEqual(read_image_size(self.write_static("a.png", png(640, 480))), (640, 480))
+        self.assertEqual(read_image_size(self.write_static("b.gif", gif(16, 9))), (16, 9))
+        self.assertEqual(read_image_size(self.write_static("c.jpg", jpeg(1024, 768))), (1024, 768))
+        self.assertEqual(read_image_size(self.write_static("d.webp", webp(300, 200))), (300, 200))
+        self.assertIsNone(read_image_size(self.write_static("e.png", b"not an image")))
+
+    def test_index_rereads_only_changed_images(self):
+        self.write_static("images/a.png", png(10, 20))
+        self.write_static("images/b.gif", gif(30, 40))
+        self.write_static("images/c.svg", b"<svg/>")
+        index = ImageIndex.load(self.static, self.index_path)
+        self.assertEqual(index.read, 2)
+        self.assertEqual(index.dimensions(), {"/images/a.png": (10, 20), "/images/b.gif": (30, 40)})
+        self.assertEqual(index.files, {"/images/a.png", "/images/b.gif", "/images/c.svg"})
+        index.save()
+
+        index = ImageIndex.load(self.static, self.index_path)
+        self.assertEqual(index.read, 0)
+        digest = index.digest()
+
+        path = self.write_static("images/a.png", png(50, 60))
+        os.utime(path, ns=(1, 1))
+        index = ImageIndex.load(self.static, self.index_path)
+        self.assertEqual(index.read, 1)
+        self.assertEqual(index.dimensions()["/images/a.png"], (50, 60))
+        self.assertNotEqual(index.digest(), digest)
+
+    def test_first_image_stays_eager(self):
+        attributes = ImageAttributes({"/a.png": (10, 20), "/b.png": (30, 40)})
+        html = attributes.annotate_html('<p><img src="/a.png" alt="a"><img src="/b.png" alt="b" /></p>')
+        self.assertEqual(
+            html,
+            '<p><img src="/a.png" alt="a" width="10" height="20">'
+            '<img src="/b.png" alt="b" width="30" height="40" loading="lazy" decoding="async" /></p>',
+        )
+
+    def test_existing_attributes_are_kept(self):
+        attributes = ImageAttributes({"/a.png": (10, 20)})
+        html = attributes.annotate_html('<img src="/x.svg"><img src="/a.png" width="5" loading="eager">')
+        self.assertEqual(html, '<img src="/x.svg"><img src="/a.png" width="5" loading="eager" decoding="async">')
+
+    def test_resolves_basepath_and_fingerprints(self):
+        attributes = ImageAttributes({"/images/tom.png": (1, 2)}, "/site/", {"/images/tom.png": "/images/tom.89abcdef.png"})
+        self.assertEqual(attributes.resolve("/site/images/tom.89abcdef.png?v=1"), "/images/tom.png")
+        self.assertIsNone(attributes.resolve("https://example.com/tom.png"))
+        self.assertIn('width="1"', attributes.annotate_html('<img src="/site/images/tom.89abcdef.png">'))
+
+    def test_missing_image_warns(self):
+        attributes = ImageAttributes({})
+        with self.assertLogs("site", level="WARNING") as logs:
+            html = attributes.annotate_html('<img src="/gone.png">', "content/index.md")
+        self.assertEqual(html, '<img src="/gone.png">')
+        self.assertIn("/gone.png", logs.output[0])
+        self.assertIn("content/index.md", logs.output[0])
+
+    def test_missing_svg_warns_when_files_are_known(self):
+        attributes = ImageAttributes({}, files={"/logo.svg"})
+        with self.assertLogs("site", level="WARNING") as logs:
+            attributes.annotate_html('<img src="/logo.svg"><img src="/gone.svg">')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("/gone.svg", logs.output[0])
+
+    def test_preformatted_images_are_left_alone(self):
+        attributes = ImageAttributes({"/a.png": (10, 20)})
+        html = '<pre><code><img src="/a.png"></code></pre><code><img src="/a.png"></code><img src="/a.png">'
+        expected = '<pre><code><img src="/a.png"></code></pre><code><img src="/a.png"></code><img src="/a.png" width="10" height="20">'
+        self.assertEqual(attributes.annotate_html(html), expected)
+        out = io.StringIO()
+        writer = attributes.writer(out)
+        for chunk in ('<pre><code><img src="/a.png"></co', 'de></pre', '><img src="/a.png">'):
+            writer.write(chunk)
+        writer.close()
+        self.assertEqual(out.getvalue(), '<pre><code><img src="/a.png"></code></pre><img src="/a.png" width="10" height="20">')
+
+    def test_writer_handles_split_tags(self):
+        attributes = ImageAttributes({"/a.png": (10, 20)})
+        out = io.StringIO()
+        writer = attributes.writer(out)
+        for chunk in ('<p>a <', 'img src="/a', '.png"', '> b</p>'):
+            writer.write(chunk)
+        writer.close()
+        self.assertEqual(out.getvalue(), '<p>a <img src="/a.png" width="10" height="20"> b</p>')
+
+
+if __name__ == "__main__":
+    unittest.main()
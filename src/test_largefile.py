@@ -0,0 +1,85 @@
+import os
+import unittest
+from unittest import mock
+
+import main
+from converter import markdown_to_html_node
+from largefile import StreamedContent, find_title, iter_mapped_lines, map_file, write_large_page
+from renderer import SingleTemplate, SiteRenderer
+from template import compile_template
+from testutil import TempDirTestCase
+
+MARKDOWN = """Intro before the title
+
+# The **Title**
+
+A [link](/blog/tom) and ![img](/images/tom.png)
+
+```
+code
+
+with a blank line
+```
+
+- one
+- two
+"""
+
+
+class TestLargeFile(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.tmp.name, "page.md")
+        self.write(self.source, MARKDOWN)
+
+    def write(self, path, text):
+        with open(path, "w", newline="") as f:
+            f.write(text)
+
+    def test_find_title(self):
+        with map_file(self.source) as mapped:
+            self.assertEqual(find_title(mapped), main.extract_title(MARKDOWN))
+        self.write(self.source, "# First\n# Second")
+        with map_file(self.source) as mapped:
+            self.assertEqual(find_title(mapped), "First")
+
+    def test_no_title(self):
+        for text in ("", "no title\n## here"):
+            self.write(self.source, text)
+            with map_file(self.source) as mapped:
+                with self.assertRaises(Exception):
+                    find_title(mapped)
+
+    def test_lines_strip_crlf(self):
+        self.write(self.source, "a\r\nb\r\n\r\nc")
+        with map_file(self.source) as mapped:
+            self.assertEqual(list(iter_mapped_lines(mapped)), ["a", "b", "", "c"])
+
+    def test_streamed_content_matches_markdown_to_html_node(self):
+        with map_file(self.source) as mapped:
+            html = "".join(StreamedContent(iter_mapped_lines(mapped)).iter_html())
+        self.assertEqual(html, markdown_to_html_node(MARKDOWN).to_html())
+
+    def test_large_page_matches_regular_build(self):
+        template = compile_template("<title>{{ Title }}</title>{{ Content }}", "/site/")
+        dest = os.path.join(self.tmp.name, "out", "page.html")
+        write_large_page(self.source, dest, SiteRenderer(SingleTemplate(template)))
+        with open(dest) as f:
+            html = f.read()
+        self.assertEqual(html, template.render(Title="The **Title**", Content=markdown_to_html_node(MARKDOWN)))
+        self.assertIn('href="/site/blog/tom"', html)
+
+    def test_build_page_uses_large_path_above_threshold(self):
+        template = os.path.join(self.tmp.name, "template.html")
+        self.write(template, "{{ Title }}|{{ Content }}")
+        dest = os.path.join(self.tmp.name, "page.html")
+        with mock.patch.object(main, "write_large_page", wraps=main.write_large_page) as large:
+            with mock.patch.object(main, "LARGE_FILE_SIZE", 1):
+                main.generate_page(self.source, template, dest, "/")
+        large.assert_called_once()
+        with open(dest) as f:
+            self.assertEqual(f.read(), "The **Title**|" + markdown_to_html_node(MARKDOWN).to_html())
+
+
+if __name__ == "__main__":
+    unittest.main()
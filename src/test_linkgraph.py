@@ -0,0 +1,89 @@
+
+import logging
+import os
+import unittest
+
+from converter import markdown_to_html_node
+from htmlnode import FragmentNode, ParentNode
+from linkgraph import LinkGraph, output_paths, page_links, resolve_link
+from renderer import SiteRenderer, SingleTemplate, page_content
+from template import compile_template
+from testutil import TempDirTestCase
+
+PAGES = {
+    "content/index.md": "/index.html",
+    "content/blog/tom/index.md": "/blog/tom/index.html",
+    "content/about.md": "/about.html",
+    "content/lost.md": "/lost.html",
+}
+
+TARGETS = list(PAGES.values()) + ["/images/tom.png", "/index.css"]
+
+
+class TestLinks(unittest.TestCase):
+    def test_page_links_in_order(self):
+        node = markdown_to_html_node("# T\n\n[a](/a) ![b](/b.png)\n\n- [c](https://example.com)")
+        self.assertEqual(page_links(node), ["/a", "/b.png", "https://example.com"])
+        fragment = FragmentNode.from_node(node)
+        self.assertEqual(page_links(ParentNode("div", [fragment])), ["/a", "/b.png", "https://example.com"])
+
+    def test_resolve_link(self):
+        self.assertEqual(resolve_link("/blog/tom", "/index.html"), "/blog/tom")
+        self.assertEqual(resolve_link("../", "/blog/tom/index.html"), "/blog/")
+        self.assertEqual(resolve_link("tom.png?v=1#top", "/blog/index.html"), "/blog/tom.png")
+        self.assertEqual(resolve_link("/", "/blog/tom/index.html"), "/")
+        for url in ("https://example.com/", "//cdn.example.com/a.js", "mailto:a@b.c", "#top", ""):
+            self.assertIsNone(resolve_link(url, "/index.html"))
+
+    def test_output_paths(self):
+        self.assertEqual(output_paths(["docs/blog/tom/index.html"], "docs"), {"docs/blog/tom/index.html": "/blog/tom/index.html"})
+
+
+class TestLinkGraph(TempDirTestCase):
+    def graph(self, pages):
+        graph = LinkGraph(None)
+        for source, markdown in pages.items():
+            graph.add_page(source, "T", markdown_to_html_node(markdown))
+        return graph
+
+    def test_check_reports_broken_backlinks_and_orphans(self):
+        graph = self.graph({
+            "content/index.md": "# Home\n\n[Tom](/blog/tom) [About](/about) ![x](/images/tom.png) [Out](https://example.com)",
+            "content/blog/tom/index.md": "# Tom\n\n[Home](/) [Self](./) [Gone](/blog/gone) ![Missing](../../images/missing.png)",
+            "content/about.md": "# About\n\n[Home](index.html#top)",
+            "content/lost.md": "# Lost\n\n[Home](/)",
+        })
+        report = graph.check(PAGES, TARGETS)
+        self.assertEqual(report.links, 9)
+        self.assertEqual(report.broken, [("content/blog/tom/index.md", "/blog/gone"), ("content/blog/tom/index.md", "../../images/missing.png")])
+        self.assertEqual(report.backlinks["/index.html"], ["content/about.md", "content/blog/tom/index.md", "content/lost.md"])
+        self.assertEqual(report.backlinks["/blog/tom/index.html"], ["content/index.md"])
+        self.assertEqual(report.orphans, ["/lost.html"])
+
+    def test_log_levels(self):
+        graph = self.graph({"content/index.md": "# Home\n\n[Gone](/gone)"})
+        report = graph.check({"content/index.md": "/index.html"}, ["/index.html"])
+        with self.assertLogs("site", level="ERROR") as logs:
+            report.log(logging.ERROR)
+        self.assertIn("Broken link in content/index.md: /gone", logs.output[0])
+
+    def test_store_survives_between_builds(self):
+        path = os.path.join(self.tmp.name, "links.json")
+        source = self.write(os.path.join(self.tmp.name, "index.md"), "# Home\n\n[a](/a)")
+        renderer = SiteRenderer(SingleTemplate(compile_template("{{ Content }}")), links=LinkGraph(path))
+        renderer.render(source, "# Home\n\n[b](/b)")
+        renderer.links.save()
+
+        graph = LinkGraph.load(path)
+        graph.update([source], page_content)
+        self.assertEqual(graph.added, 0)
+        self.assertEqual(graph.pages, {source: ["/b"]})
+
+        # A page missing from the store is read and converted once
+        graph = LinkGraph(path)
+        graph.update([source], page_content)
+        self.assertEqual(graph.pages, {source: ["/a"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
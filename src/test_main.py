@@ -1,5 +1,8 @@
+import os
 import unittest
-from main import extract_title
+import main
+from main import extract_title, discover_pages, generate_pages_recursive
+from testutil import TempDirTestCase
 
 class TestExtractTitle(unittest.TestCase):
     def test_extract_simple_title(self):
@@ -24,5 +27,75 @@ class TestExtractTitle(unittest.TestCase):
         with self.assertRaises(Exception):
             extract_title(markdown)
 
+
+class TestGeneratePages(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "b", "index.md"), "# B")
+        self.write(os.path.join(self.content, "a", "index.md"), "# A")
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_discover_pages_is_sorted(self):
+        pages = discover_pages(self.content, self.dest)
+        self.assertEqual(
+            [os.path.relpath(dest, self.dest) for _, dest in pages],
+            [os.path.join("a", "index.html"), os.path.join("b", "index.html"), "index.html"],
+        )
+
+    def test_parallel_matches_serial(self):
+        generate_pages_recursive(self.content, self.template, self.dest, "/", jobs=1)
+        serial = self.read(os.path.join(self.dest, "a", "index.html"))
+        parallel_dest = os.path.join(self.tmp.name, "parallel")
+        generate_pages_recursive(self.content, self.template, parallel_dest, "/", jobs=2)
+        self.assertEqual(self.read(os.path.join(parallel_dest, "a", "index.html")), serial)
+        self.assertEqual(serial, "<title>A</title><div><h1>A</h1></div>")
+
+    def test_parallel_logs_like_serial(self):
+        logs = []
+        for jobs, dest in ((1, self.dest), (2, os.path.join(self.tmp.name, "parallel"))):
+            with self.assertLogs("site", level="INFO") as cm:
+                generate_pages_recursive(self.content, self.template, dest, "/", jobs=jobs)
+            logs.append([line.replace(dest, "DEST") for line in cm.output])
+        self.assertEqual(logs[0], logs[1])
+        self.assertEqual(len(logs[0]), 3)
+
+    def test_pipeline_logs_like_serial(self):
+        logs = []
+        for pipeline, dest in ((False, self.dest), (True, os.path.join(self.tmp.name, "pipelined"))):
+            with self.assertLogs("site", level="INFO") as cm:
+                generate_pages_recursive(self.content, self.template, dest, "/", pipeline=pipeline)
+            logs.append([line.replace(dest, "DEST") for line in cm.output if "Generated page" in line])
+        self.assertEqual(logs[0], logs[1])
+        self.assertEqual(len(logs[0]), 3)
+
+    def test_parallel_reports_first_failed_page(self):
+        self.write(os.path.join(self.content, "a", "index.md"), "no title")
+        self.write(os.path.join(self.content, "b", "index.md"), "no title either")
+        with self.assertRaises(Exception) as cm:
+            generate_pages_recursive(self.content, self.template, self.dest, "/", jobs=2)
+        self.assertIn(os.path.join("a", "index.md"), str(cm.exception))
+
+class TestPlan(TempDirTestCase):
+    def files(self):
+        return sorted(os.path.join(path, name) for path, _, names in os.walk(".") for name in names)
+
+    def test_plan_writes_nothing(self):
+        self.chdir()
+        os.makedirs("static")
+        self.write(os.path.join("content", "index.md"), "# Home\n\n[Missing](/missing)")
+        self.write("template.html", "{{ Title }}{{ Content }}")
+        main.main(["-q"])
+        before = self.files()
+        main.main(["-q", "--plan", "--search", "--check-links", "--link-report", "links.json", "--fragment-cache", "fragments"])
+        self.assertEqual(self.files(), before)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import os
+import unittest
+
+from manifest import BuildManifest, hash_file
+from testutil import TempDirTestCase
+
+
+class TestBuildManifest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.source = os.path.join(self.root, "index.md")
+        self.dest_root = os.path.join(self.root, "docs")
+        self.dest = os.path.join(self.dest_root, "index.html")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        os.makedirs(self.dest_root)
+        self.write(self.source, "# Hello")
+
+    def build(self, settings, dry_run=False):
+        manifest = BuildManifest.load(self.manifest_path, settings, dry_run)
+        if manifest.needs_build("page", self.source, self.dest):
+            self.write(self.dest, "built")
+        manifest.prune(self.dest_root)
+        manifest.save()
+        return manifest
+
+    def test_first_build_builds_everything(self):
+        manifest = self.build({"basepath": "/"})
+        self.assertEqual(manifest.plan, [("page", self.dest)])
+
+    def test_unchanged_source_is_skipped(self):
+        self.build({"basepath": "/"})
+        manifest = self.build({"basepath": "/"})
+        self.assertEqual(manifest.plan, [])
+
+    def test_changed_source_is_rebuilt(self):
+        self.build({"basepath": "/"})
+        self.write(self.source, "# Hello again")
+        manifest = self.build({"basepath": "/"})
+        self.assertEqual(manifest.plan, [("page", self.dest)])
+
+    def test_settings_change_rebuilds_pages(self):
+        self.build({"basepath": "/"})
+        manifest = self.build({"basepath": "/static-web-page/"})
+        self.assertEqual(manifest.plan, [("page", self.dest)])
+
+    def test_missing_output_is_rebuilt(self):
+        self.build({"basepath": "/"})
+        os.remove(self.dest)
+        manifest = self.build({"basepath": "/"})
+        self.assertEqual(manifest.plan, [("page", self.dest)])
+
+    def test_removed_source_output_is_pruned(self):
+        old_dest = os.path.join(self.dest_root, "blog", "old.html")
+        old_source = os.path.join(self.root, "blog", "old.md")
+        self.write(old_source, "# Old")
+        manifest = BuildManifest.load(self.manifest_path, {})
+        manifest.needs_build("page", old_source, old_dest)
+        self.write(old_dest, "built")
+        manifest.save()
+
+        manifest = self.build({})
+        self.assertIn(("delete", old_dest), manifest.plan)
+        self.assertFalse(os.path.exists(old_dest))
+        self.assertFalse(os.path.exists(os.path.dirname(old_dest)))
+        self.assertTrue(os.path.exists(self.dest_root))
+
+    def test_outputs_of_another_root_are_ignored(self):
+        staged = os.path.join(self.root, "site", "index.html")
+        self.write(staged, "live")
+        manifest = BuildManifest(self.manifest_path, {}, root=os.path.join(self.root, "site"))
+        manifest.needs_build("page", self.source, staged)
+        manifest.save()
+
+        manifest = BuildManifest.load(self.manifest_path, {}, root=self.dest_root)
+        self.assertEqual(manifest.previous, {})
+        self.assertTrue(manifest.needs_build("page", self.source, self.dest))
+        manifest.prune(self.dest_root)
+        self.assertTrue(os.path.exists(staged))
+
+    def test_prune_stays_under_root(self):
+        outside = os.path.join(self.root, "site", "index.html")
+        self.write(outside, "live")
+        manifest = BuildManifest(self.manifest_path, {})
+        manifest.needs_build("page", self.source, outside)
+        manifest.save()
+        manifest = self.build({})
+        self.assertTrue(os.path.exists(outside))
+        self.assertNotIn(("delete", outside), manifest.plan)
+
+    def test_plan_writes_nothing(self):
+        manifest = self.build({"basepath": "/"}, dry_run=True)
+        self.assertEqual(manifest.plan, [("page", self.dest)])
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(self.manifest_path))
+
+    def test_hash_file(self):
+        self.assertEqual(hash_file(self.source), hash_file(self.source))
+        self.assertEqual(len(hash_file(self.source)), 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
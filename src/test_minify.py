@@ -0,0 +1,101 @@
+import io
+import os
+import unittest
+
+import main
+from minify import HTMLMinifier, MinifyingWriter, minify_html, minify_tag
+from testutil import TempDirTestCase
+
+PAGE = """<!doctype html>
+<html>
+  <head>
+    <meta charset="utf-8" />
+    <!-- styles -->
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <p>Some <b>bold</b>   and <i>italic</i>
+       text</p>
+    <pre><code>  keep
+    this   </code></pre>
+    <a href="/blog/" class="a b">link</a>
+  </body>
+</html>
+"""
+
+MINIFIED = (
+    '<!doctype html><html><head><meta charset=utf-8 /><link href=/index.css rel=stylesheet /></head>'
+    '<body><p>Some <b>bold</b> and <i>italic</i> text</p><pre><code>  keep\n    this   </code></pre>'
+    '<a href="/blog/" class="a b">link</a></body></html>'
+)
+
+
+class TestMinify(unittest.TestCase):
+    def test_minify_page(self):
+        self.assertEqual(minify_html(PAGE), MINIFIED)
+
+    def test_any_chunking_gives_the_same_output(self):
+        for size in (1, 2, 3, 5, 8, 13, 64):
+            minifier = HTMLMinifier()
+            chunks = [minifier.feed(PAGE[i:i + size]) for i in range(0, len(PAGE), size)]
+            self.assertEqual("".join(chunks) + minifier.finish(), MINIFIED, size)
+
+    def test_tags(self):
+        self.assertEqual(minify_tag('<img src="a.png"  alt="x y" />')[0], '<img src=a.png alt="x y"/>')
+        self.assertEqual(minify_tag('<img alt="x y" src="a.png"/>')[0], '<img alt="x y" src=a.png />')
+        self.assertEqual(minify_tag('<a href="/">')[0], '<a href="/">')
+        self.assertEqual(minify_tag("<input disabled value='' >")[0], "<input disabled value=''>")
+        self.assertEqual(minify_tag("</P >"), ("</P>", "p", True))
+
+    def test_preserved_elements_and_conditional_comments(self):
+        html = '<textarea>  a  \n b</textarea> <SCRIPT>if (a  <  b) {}</SCRIPT><!--[if IE]>x<![endif]-->'
+        self.assertEqual(minify_html(html), '<textarea>  a  \n b</textarea><SCRIPT>if (a  <  b) {}</SCRIPT><!--[if IE]>x<![endif]-->')
+
+    def test_stray_less_than_is_text(self):
+        # Read as a tag, "< b <code>" would hide the <code> element
+        html = "<p>a < b,   c <3 and 2<=3 <code>  x  y</code></p> <p>1 <\n 2</p>"
+        expected = "<p>a < b, c <3 and 2<=3 <code>  x  y</code></p><p>1 < 2</p>"
+        self.assertEqual(minify_html(html), expected)
+        for size in (1, 2, 3):
+            minifier = HTMLMinifier()
+            chunks = [minifier.feed(html[i:i + size]) for i in range(0, len(html), size)]
+            self.assertEqual("".join(chunks) + minifier.finish(), expected, size)
+
+    def test_writer_counts(self):
+        stream = io.StringIO()
+        writer = MinifyingWriter(stream)
+        writer.write(PAGE[:40])
+        writer.write(PAGE[40:])
+        writer.close()
+        self.assertEqual(stream.getvalue(), MINIFIED)
+        self.assertEqual((writer.bytes_in, writer.bytes_out), (len(PAGE), len(MINIFIED)))
+
+    def test_sizes_are_utf8_bytes(self):
+        stream = io.StringIO()
+        writer = MinifyingWriter(stream)
+        writer.write("<p>caf\u00e9   \u2014</p>")
+        writer.close()
+        self.assertEqual(stream.getvalue(), "<p>caf\u00e9 \u2014</p>")
+        self.assertEqual((writer.bytes_in, writer.bytes_out), (18, 16))
+
+
+
+class TestIncrementalMinify(TempDirTestCase):
+    def test_toggling_minify_rebuilds_every_page(self):
+        self.chdir()
+        os.makedirs("static")
+        self.write(os.path.join("content", "index.md"), "# Home\n\nSome   text")
+        self.write("template.html", "<p>\n  {{ Title }}\n</p>\n{{ Content }}")
+        main.main(["-q"])
+        pages = []
+        for argv in (["--minify"], [], ["--minify"]):
+            main.main(["-q", "--incremental"] + argv)
+            with open(os.path.join("docs", "index.html")) as f:
+                pages.append(f.read())
+        self.assertEqual(pages[0], "<p>Home</p><div><h1>Home</h1><p>Some text</p></div>")
+        self.assertEqual(pages[1], "<p>\n  Home\n</p>\n<div><h1>Home</h1><p>Some   text</p></div>")
+        self.assertEqual(pages[2], pages[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import time
+import unittest
+
+from pipeline import generate_pages_pipelined
+from testutil import TempDirTestCase
+
+
+class TestPipeline(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pages = []
+        for i in range(20):
+            source = self.write(os.path.join(self.tmp.name, "content", f"page-{i}.md"), f"# Page {i}")
+            dest = os.path.join(self.tmp.name, "docs", f"page-{i}", "index.html")
+            self.pages.append((source, dest))
+
+    def test_writes_every_page(self):
+        stats = generate_pages_pipelined(self.pages, lambda source, markdown: markdown.upper())
+        for i, (_, dest) in enumerate(self.pages):
+            with open(dest) as f:
+                self.assertEqual(f.read(), f"# PAGE {i}")
+        self.assertEqual([stage.items for stage in stats.stages()], [20, 20, 20])
+
+    def test_reports_written_pages_in_build_order(self):
+        written = []
+        generate_pages_pipelined(self.pages, lambda source, markdown: markdown, written=lambda source, dest: written.append((source, dest)))
+        self.assertEqual(written, self.pages)
+
+    def test_queues_are_bounded(self):
+        def slow_render(source, markdown):
+            time.sleep(0.002)
+            return markdown
+
+        stats = generate_pages_pipelined(self.pages, slow_render, queue_size=2)
+        self.assertLessEqual(stats.read.max_depth, 2)
+        self.assertLessEqual(stats.convert.max_depth, 2)
+        self.assertGreater(stats.read.blocked, 0)
+        self.assertEqual(stats.bottleneck(), "CPU")
+
+    def test_reports_first_failure_in_page_order(self):
+        def render(source, markdown):
+            if source.endswith(("page-3.md", "page-7.md")):
+                raise ValueError("bad page")
+            return markdown
+
+        with self.assertRaises(Exception) as cm:
+            generate_pages_pipelined(self.pages, render)
+        self.assertIn("page-3.md", str(cm.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
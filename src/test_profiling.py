@@ -0,0 +1,77 @@
+import os
+import unittest
+
+from unittest import mock
+
+from fragmentcache import FragmentCache
+from profiling import BuildProfile, PAGE_PHASES, count_nodes
+from htmlnode import LeafNode, ParentNode
+import main
+from main import generate_pages_recursive
+from renderer import RenderOptions
+from testutil import TempDirTestCase
+
+
+class TestBuildProfile(TempDirTestCase):
+    def test_phase_accumulates(self):
+        profile = BuildProfile()
+        profile.add("read", 0.5, 0.25, "a.md")
+        profile.add("read", 0.5, 0.25, "a.md")
+        profile.add("discover", 1.0, 1.0)
+        self.assertEqual(profile.pages["a.md"]["phases"]["read"], [1.0, 0.5])
+        self.assertEqual(profile.build["discover"], [1.0, 1.0])
+
+    def test_slowest(self):
+        profile = BuildProfile()
+        profile.add("read", 0.1, 0.1, "fast.md")
+        profile.add("read", 0.3, 0.1, "slow.md")
+        profile.add("write", 0.1, 0.1, "medium.md")
+        profile.add("read", 0.1, 0.1, "medium.md")
+        self.assertEqual(profile.slowest(2), ["slow.md", "medium.md"])
+
+    def test_count_nodes(self):
+        root = ParentNode("div", [ParentNode("p", [LeafNode(None, "a"), LeafNode("b", "c")])])
+        self.assertEqual(count_nodes(root), 4)
+
+    def test_profiled_build_records_every_phase(self):
+        root = self.tmp.name
+        content = os.path.join(root, "content")
+        self.write(os.path.join(content, "index.md"), "# Title\n\nSome **bold** text")
+        template = self.write(os.path.join(root, "template.html"), "{{ Title }}{{ Content }}")
+
+        profile = BuildProfile()
+        generate_pages_recursive(content, template, os.path.join(root, "docs"), "/", profile=profile)
+
+        record = profile.pages[os.path.join(content, "index.md")]
+        self.assertEqual(sorted(record["phases"]), sorted(PAGE_PHASES))
+        self.assertEqual(record["nodes"], 7)
+        self.assertIn("discover", profile.build)
+        with open(os.path.join(root, "docs", "index.html")) as f:
+            self.assertEqual(f.read(), "Title<div><h1>Title</h1><p>Some <b>bold</b> text</p></div>")
+
+    def build(self, options=None):
+        root = self.tmp.name
+        content = os.path.join(root, "content")
+        self.write(os.path.join(content, "index.md"), "# Title\n\nSome **bold** text")
+        template = self.write(os.path.join(root, "template.html"), "{{ Title }}{{ Content }}")
+        profile = BuildProfile()
+        generate_pages_recursive(content, template, os.path.join(root, "docs"), "/", profile=profile, options=options)
+        return profile.pages[os.path.join(content, "index.md")]
+
+    def test_fragment_cache_hits_are_reported_as_cached(self):
+        fragments = FragmentCache(os.path.join(self.tmp.name, "fragments"))
+        miss = self.build(RenderOptions(fragments=fragments))
+        self.assertEqual((miss["nodes"], miss["cached"]), (7, False))
+        hit = self.build(RenderOptions(fragments=fragments))
+        self.assertEqual((hit["nodes"], hit["cached"]), (0, True))
+        self.assertNotIn("inline_parse", hit["phases"])
+
+    def test_large_files_are_streamed_when_profiled(self):
+        with mock.patch.object(main, "LARGE_FILE_SIZE", 0):
+            record = self.build()
+        self.assertEqual(sorted(record["phases"]), ["stream"])
+        self.assertEqual(record["nodes"], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
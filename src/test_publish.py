@@ -0,0 +1,98 @@
+import os
+import unittest
+
+import main
+from manifest import BuildManifest
+from publish import build_dirs, check_link, live_build, publish, rollback, start_build
+from testutil import TempDirTestCase
+
+
+class TestPublish(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.builds = os.path.join(self.tmp.name, ".builds")
+        self.link = os.path.join(self.tmp.name, "site")
+
+    def read(self, relative):
+        with open(os.path.join(self.link, relative)) as f:
+            return f.read()
+
+    def build(self, files, keep=3):
+        staging = start_build(self.builds)
+        for relative, text in files.items():
+            self.write(os.path.join(staging, relative), text)
+        return publish(staging, self.link, self.builds, keep)
+
+    def test_first_publish_creates_link(self):
+        result = self.build({"index.html": "new"})
+        self.assertTrue(os.path.islink(self.link))
+        self.assertEqual(live_build(self.link), os.path.realpath(result.build))
+        self.assertEqual(self.read("index.html"), "new")
+        self.assertEqual(len(build_dirs(self.builds)), 1)
+
+    def test_existing_directory_is_refused(self):
+        self.write(os.path.join(self.link, "index.html"), "old")
+        with self.assertRaises(Exception):
+            check_link(self.link)
+        with self.assertRaises(Exception):
+            self.build({"index.html": "new"})
+        self.assertFalse(os.path.islink(self.link))
+        self.assertEqual(self.read("index.html"), "old")
+
+    def test_unchanged_files_keep_their_mtime_not_their_inode(self):
+        self.build({"index.html": "home", "blog/tom/index.html": "tom"})
+        before = os.stat(os.path.join(self.link, "index.html"))
+        result = self.build({"index.html": "home", "blog/tom/index.html": "tom, edited"})
+        self.assertEqual((result.unchanged, result.changed), (1, 1))
+        after = os.stat(os.path.join(self.link, "index.html"))
+        self.assertEqual(after.st_mtime_ns, before.st_mtime_ns)
+        self.assertNotEqual(after.st_ino, before.st_ino)
+        self.assertEqual(self.read("blog/tom/index.html"), "tom, edited")
+        # Editing the live build leaves the kept one alone
+        self.write(os.path.join(self.link, "index.html"), "edited in place")
+        rollback(self.link, self.builds)
+        self.assertEqual(self.read("index.html"), "home")
+
+    def test_old_builds_are_removed_and_rollback(self):
+        for text in ("one", "two", "three"):
+            result = self.build({"index.html": text}, keep=1)
+        self.assertEqual(result.removed_builds, 1)
+        self.assertEqual(len(build_dirs(self.builds)), 2)
+        rollback(self.link, self.builds)
+        self.assertEqual(self.read("index.html"), "two")
+        with self.assertRaises(Exception):
+            rollback(self.link, self.builds)
+
+    def test_crashed_builds_are_cleaned_up(self):
+        crashed = start_build(self.builds)
+        self.write(os.path.join(crashed, "index.html"), "half")
+        self.build({"index.html": "whole"})
+        self.assertFalse(os.path.exists(crashed))
+        self.assertEqual(self.read("index.html"), "whole")
+
+    def test_incremental_build_after_staged_build_leaves_site_alone(self):
+        self.chdir()
+        self.write(os.path.join("content", "index.md"), "# Home")
+        self.write(os.path.join("static", "index.css"), "body {}")
+        self.write("template.html", "{{ Title }}{{ Content }}")
+        main.main(["-q", "--staged", "site"])
+        with self.assertRaises(Exception):
+            main.main(["-q", "--incremental"])
+        with open(os.path.join("site", "index.html")) as f:
+            self.assertEqual(f.read(), "Home<div><h1>Home</h1></div>")
+        # A full build into docs/ starts a manifest of its own
+        main.main(["-q"])
+        main.main(["-q", "--incremental"])
+        self.assertTrue(os.path.exists(os.path.join("site", "index.css")))
+        self.assertTrue(os.path.exists(os.path.join("docs", "index.html")))
+
+    def test_manifest_rebase(self):
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"), {})
+        staging = os.path.join(".builds", "1.partial")
+        manifest.record("page", "content/index.md", os.path.join(staging, "index.html"), "h", True)
+        manifest.rebase(staging, "docs")
+        self.assertEqual(list(manifest.outputs), [os.path.join("docs", "index.html")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import pickle
+import unittest
+
+from blockcache import BlockCache
+from minify import MinifyStats
+from profiling import NoPhases
+from renderer import RenderOptions, SingleTemplate, SiteRenderer, compile_site_template, render_site
+from search import SearchIndex
+
+TEMPLATE = "<title>{{ Title }}</title>{{> nav }}<main>{{ Content }}</main>"
+PARTIALS = {"nav": '<a href="/">Home</a>'}
+
+
+def pages(count):
+    return {f"post-{i}.md": f"# Post {i}\n\nSee [the next one](/post-{i + 1})." for i in range(count)}
+
+
+class TestRenderSite(unittest.TestCase):
+    def test_renders_in_memory(self):
+        html = dict(render_site({"index.md": "# Home\n\n**hi**"}, TEMPLATE, partials=PARTIALS))
+        self.assertEqual(
+            html,
+            {"index.md": '<title>Home</title><a href="/">Home</a><main><div><h1>Home</h1><p><b>hi</b></p></div></main>'},
+        )
+
+    def test_basepath(self):
+        [(_, html)] = render_site([("a.md", "# A\n\n[b](/b)")], TEMPLATE, "/site/", PARTIALS)
+        self.assertIn('<a href="/site/">Home</a>', html)
+        self.assertIn('<a href="/site/b">b</a>', html)
+
+    def test_parallel_matches_serial_in_order(self):
+        serial = list(render_site(pages(50), TEMPLATE, partials=PARTIALS, cache_size=16))
+        parallel = list(render_site(pages(50), TEMPLATE, partials=PARTIALS, jobs=2, batch_size=4))
+        self.assertEqual(parallel, serial)
+        self.assertEqual([path for path, _ in serial], list(pages(50)))
+
+    def test_error_names_the_page(self):
+        markdown = pages(10)
+        markdown["post-3.md"] = "no title"
+        for jobs in (1, 2):
+            with self.assertRaisesRegex(Exception, "post-3.md"):
+                list(render_site(markdown, TEMPLATE, partials=PARTIALS, jobs=jobs, batch_size=2))
+
+    def test_missing_partial(self):
+        with self.assertRaisesRegex(ValueError, "nav"):
+            list(render_site(pages(1), TEMPLATE))
+
+
+class TestSiteRenderer(unittest.TestCase):
+    def test_phase_hook_sees_every_step(self):
+        templates = SingleTemplate(compile_site_template(TEMPLATE, partials=PARTIALS))
+        phases = []
+
+        class Phases(NoPhases):
+            def __call__(self, name):
+                phases.append(name)
+                return super().__call__(name)
+
+        phase = Phases()
+        markdown = pages(1)["post-0.md"]
+        expected = SiteRenderer(templates, minify=MinifyStats()).render("post-0.md", markdown)
+        html = SiteRenderer(templates, minify=MinifyStats()).render("post-0.md", markdown, phase)
+        self.assertEqual(html, expected)
+        self.assertEqual(phases, ["block_parse", "inline_parse", "serialize", "template", "minify"])
+
+
+
+class TestRenderOptions(unittest.TestCase):
+    def test_workers_get_empty_copies(self):
+        search = SearchIndex("content", "/site/", None)
+        search.add_document("content/index.md", {"title": "Home", "terms": {}})
+        minify = MinifyStats()
+        minify.add_page("content/index.md", 10, 5)
+        options = RenderOptions(BlockCache(16), minify=minify, assets={"/a.css": "/a.1234.css"}, search=search)
+        copy = pickle.loads(pickle.dumps(options))
+        self.assertEqual(copy.cache.maxsize, 16)
+        self.assertEqual(copy.minify.counts(), (0, 0, 0))
+        self.assertEqual((copy.search.pages, copy.search.basepath), ({}, "/site/"))
+        self.assertEqual(copy.assets, options.assets)
+        self.assertIsNone(copy.fragments)
+        self.assertIsNone(copy.links)
+
+
+if __name__ == "__main__":
+    unittest.main()
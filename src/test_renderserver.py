@@ -0,0 +1,84 @@
+import os
+import unittest
+
+from renderserver import RenderService
+from testutil import TempDirTestCase
+
+
+class TestRenderService(TempDirTestCase):
+    workers = 0
+
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.template = os.path.join(root, "template.html")
+        self.write(self.template, '<link href="/index.css">{{ Content }}')
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Blog")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.service = RenderService(
+            self.content, self.static, self.template, "/base/", workers=self.workers, rescan_interval=0
+        )
+
+    def tearDown(self):
+        self.service.close()
+
+    def write(self, path, text):
+        mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+        super().write(path, text)
+        # A new mtime even on coarse clocks
+        os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+    def test_renders_page(self):
+        status, headers, body = self.service.respond("/base/")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'<link href="/base/index.css"><div><h1>Home</h1></div>')
+        self.assertEqual(headers["Content-Type"], "text/html; charset=utf-8")
+        self.assertEqual(self.service.respond("/base/blog")[2], self.service.respond("/base/blog/index.html")[2])
+
+    def test_not_modified(self):
+        _, headers, _ = self.service.respond("/base/blog/")
+        status, again, body = self.service.respond("/base/blog/", headers["ETag"])
+        self.assertEqual(status, 304)
+        self.assertEqual(again["ETag"], headers["ETag"])
+        self.assertEqual(body, b"")
+
+    def test_source_change_changes_etag(self):
+        _, headers, _ = self.service.respond("/base/blog/")
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Changed")
+        status, changed, body = self.service.respond("/base/blog/", headers["ETag"])
+        self.assertEqual(status, 200)
+        self.assertNotEqual(changed["ETag"], headers["ETag"])
+        self.assertIn(b"<h1>Changed</h1>", body)
+
+    def test_template_change_changes_etag(self):
+        _, headers, _ = self.service.respond("/base/")
+        self.write(self.template, "<main>{{ Content }}</main>")
+        status, changed, body = self.service.respond("/base/", headers["ETag"])
+        self.assertEqual(status, 200)
+        self.assertNotEqual(changed["ETag"], headers["ETag"])
+        self.assertEqual(body, b"<main><div><h1>Home</h1></div></main>")
+
+    def test_new_layout_is_picked_up(self):
+        _, headers, _ = self.service.respond("/base/blog/")
+        self.write(os.path.join(self.content, "blog", "_layout.html"), "<blog>{{ Content }}</blog>")
+        status, _, body = self.service.respond("/base/blog/", headers["ETag"])
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b"<blog><div><h1>Blog</h1></div></blog>")
+
+    def test_static_and_missing(self):
+        status, headers, body = self.service.respond("/base/index.css")
+        self.assertEqual((status, body, headers["Content-Type"]), (200, b"body {}", "text/css"))
+        self.assertEqual(self.service.respond("/base/index.css", headers["ETag"])[0], 304)
+        self.assertEqual(self.service.respond("/base/missing")[0], 404)
+        self.assertEqual(self.service.respond("/base/../template.html")[0], 404)
+
+
+class TestRenderServicePool(TestRenderService):
+    workers = 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import unittest
+
+from converter import markdown_to_html_node
+from htmlnode import FragmentNode
+from manifest import BuildManifest
+from renderer import SiteRenderer, SingleTemplate, page_content
+from search import SearchIndex, node_text, page_terms, page_url, shard_name
+from template import compile_template
+from testutil import TempDirTestCase
+
+
+class TestSearchTerms(unittest.TestCase):
+    def test_terms_have_word_positions(self):
+        self.assertEqual(page_terms("The ring, the RING! A"), {"the": [0, 2], "ring": [1, 3]})
+
+    def test_node_text_includes_fragments_and_alt_text(self):
+        node = markdown_to_html_node("# Title\n\nSome **bold** text ![a hobbit](/h.png)")
+        fragment = FragmentNode.from_node(node)
+        self.assertEqual(page_terms("".join(node_text(node))), page_terms("".join(node_text(fragment))))
+        self.assertIn("hobbit", page_terms("".join(node_text(node))))
+
+    def test_words_run_on_across_inline_spans(self):
+        node = markdown_to_html_node("# Title\n\nfoo**bar** baz\n\n- one\n- two")
+        for content in (node, FragmentNode.from_node(node)):
+            terms = page_terms("".join(node_text(content)))
+            self.assertEqual(sorted(terms), ["baz", "foobar", "one", "title", "two"])
+
+    def test_shard_names(self):
+        self.assertEqual(shard_name("tolkien"), "to")
+        self.assertEqual(shard_name("é"), "_c3a9")
+
+    def test_page_urls(self):
+        self.assertEqual(page_url("content/index.md", "content", "/site/"), "/site/")
+        self.assertEqual(page_url("content/blog/tom/index.md", "content"), "/blog/tom/")
+        self.assertEqual(page_url("content/about.md", "content"), "/about.html")
+
+
+class TestSearchIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.docs = os.path.join(self.tmp.name, "docs")
+        self.store = os.path.join(self.tmp.name, "search.json")
+        os.makedirs(self.content)
+        self.pages = {}
+        self.write_page("index.md", "# Home\n\nWelcome to the shire")
+        self.write_page("tom.md", "# Tom\n\nOld Tom Bombadil")
+
+    def write_page(self, name, markdown):
+        path = self.write(os.path.join(self.content, name), markdown)
+        self.pages[path] = markdown
+        return path
+
+    def build(self, rebuilt):
+        index = SearchIndex.load(self.content, "/", self.store)
+        renderer = SiteRenderer(SingleTemplate(compile_template("{{ Content }}")), search=index)
+        for path in rebuilt:
+            renderer.render(path, self.pages[path])
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"), {})
+        index.update(self.pages, lambda markdown: page_content(markdown))
+        index.write(self.docs, manifest)
+        index.save()
+        return index
+
+    def read(self, name):
+        with open(os.path.join(self.docs, "search", name)) as f:
+            return json.load(f)
+
+    def test_writes_sharded_index(self):
+        index = self.build(sorted(self.pages))
+        self.assertEqual(index.added, 2)
+        self.assertEqual(self.read("index.json")["pages"], [["/", "Home"], ["/tom.html", "Tom"]])
+        self.assertEqual(self.read("to.json")["tom"], [[1, [0, 2]]])
+        self.assertEqual(self.read("sh.json")["shire"], [[0, [4]]])
+
+    def test_only_rebuilt_pages_are_reindexed(self):
+        self.build(sorted(self.pages))
+        tom = self.write_page("tom.md", "# Tom\n\nTom sings in the shire")
+        index = self.build([tom])
+        self.assertEqual(index.added, 1)
+        self.assertEqual(self.read("sh.json")["shire"], [[0, [4]], [1, [5]]])
+        # Left for the manifest to prune once nothing writes it
+        self.assertNotIn("bo", self.read("index.json")["shards"])
+
+    def test_missing_and_deleted_pages(self):
+        self.build(sorted(self.pages))
+        os.remove(self.store)
+        del self.pages[os.path.join(self.content, "tom.md")]
+        # Nothing rebuilt: live pages missing from the index are converted
+        index = self.build([])
+        self.assertEqual(index.added, 1)
+        self.assertEqual(self.read("index.json")["pages"], [["/", "Home"]])
+        self.assertNotIn("tom", self.read("to.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import unittest
+
+from manifest import BuildManifest
+from sync import copy_file, scan_files, sync_static
+from testutil import TempDirTestCase
+
+
+class TestSyncStatic(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.tmp.name, "static")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.write(os.path.join(self.source, "index.css"), b"body {}")
+        self.write(os.path.join(self.source, "images", "a.png"), b"\x89PNG" + b"x" * 100000)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_first_sync_copies_everything(self):
+        result = sync_static(self.source, self.dest)
+        self.assertEqual(len(result.copied), 2)
+        self.assertEqual(self.read(os.path.join(self.dest, "images", "a.png")), self.read(os.path.join(self.source, "images", "a.png")))
+
+    def test_copy_keeps_mtime(self):
+        sync_static(self.source, self.dest)
+        source_stat = os.stat(os.path.join(self.source, "index.css"))
+        dest_stat = os.stat(os.path.join(self.dest, "index.css"))
+        self.assertEqual(source_stat.st_mtime_ns, dest_stat.st_mtime_ns)
+
+    def test_noop_sync_copies_nothing(self):
+        sync_static(self.source, self.dest)
+        result = sync_static(self.source, self.dest)
+        self.assertEqual(result.copied, [])
+        self.assertEqual(result.skipped, 2)
+
+    def test_changed_file_is_copied(self):
+        sync_static(self.source, self.dest)
+        path = os.path.join(self.source, "index.css")
+        self.write(path, b"body { margin: 0 }")
+        result = sync_static(self.source, self.dest)
+        self.assertEqual(result.copied, [os.path.join(self.dest, "index.css")])
+        self.assertEqual(self.read(os.path.join(self.dest, "index.css")), b"body { margin: 0 }")
+
+    def test_checksum_skips_touched_but_identical_files(self):
+        sync_static(self.source, self.dest)
+        os.utime(os.path.join(self.source, "index.css"), ns=(0, 0))
+        self.assertEqual(len(sync_static(self.source, self.dest, checksum=True).copied), 0)
+        self.assertEqual(len(sync_static(self.source, self.dest).copied), 1)
+
+    def test_prune(self):
+        sync_static(self.source, self.dest)
+        os.remove(os.path.join(self.source, "images", "a.png"))
+        result = sync_static(self.source, self.dest, prune=True)
+        self.assertEqual(result.removed, [os.path.join(self.dest, "images", "a.png")])
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images")))
+
+    def test_hardlink(self):
+        result = sync_static(self.source, self.dest, link="hardlink")
+        self.assertEqual(result.methods, {"hardlink": 2})
+        self.assertTrue(os.path.samefile(os.path.join(self.source, "index.css"), os.path.join(self.dest, "index.css")))
+
+    def test_copy_replaces_hardlink_instead_of_writing_through(self):
+        sync_static(self.source, self.dest, link="hardlink")
+        dest = os.path.join(self.dest, "index.css")
+        other = os.path.join(self.source, "other.css")
+        self.write(other, b"other")
+        copy_file(other, dest, os.stat(other))
+        self.assertEqual(self.read(os.path.join(self.source, "index.css")), b"body {}")
+        self.assertEqual(self.read(dest), b"other")
+
+    def test_manifest_records_and_plans(self):
+        manifest = BuildManifest(os.path.join(self.tmp.name, "m.json"), {}, dry_run=True)
+        sync_static(self.source, self.dest, manifest)
+        self.assertEqual(len(manifest.plan), 2)
+        self.assertEqual(scan_files(self.dest), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
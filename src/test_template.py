@@ -0,0 +1,95 @@
+import os
+import unittest
+
+from template import TemplateLoader, compile_template, template_files
+from renderer import render_page
+from testutil import TempDirTestCase
+
+
+class TestCompileTemplate(unittest.TestCase):
+    def test_render_slots(self):
+        template = compile_template("<title>{{ Title }}</title><main>{{Content}}</main>")
+        self.assertEqual(template.segments, ["<title>", "Title", "</title><main>", "Content", "</main>"])
+        self.assertEqual(
+            template.render(Title="Hi", Content="<p>x</p>"),
+            "<title>Hi</title><main><p>x</p></main>",
+        )
+
+    def test_missing_slot_value(self):
+        template = compile_template("{{ Title }}")
+        with self.assertRaises(ValueError):
+            template.render(Content="")
+
+    def test_basepath_rewrites_template_attributes(self):
+        template = compile_template(
+            '<link href="/index.css" /><a href="//cdn.example.com/x">/home</a>{{ Content }}',
+            "/static-web-page/",
+        )
+        self.assertEqual(
+            template.render(Content=""),
+            '<link href="/static-web-page/index.css" /><a href="//cdn.example.com/x">/home</a>',
+        )
+
+    def test_partials(self):
+        partials = {"nav": '<nav>{{> logo }}</nav>', "logo": '<img src="/logo.png">'}
+        template = compile_template("{{> nav }}{{ Content }}", "/base/", partials.__getitem__)
+        self.assertEqual(template.render(Content="x"), '<nav><img src="/base/logo.png"></nav>x')
+
+    def test_recursive_partial(self):
+        with self.assertRaises(ValueError):
+            compile_template("{{> loop }}", "/", lambda name: "{{> loop }}")
+
+
+class TestRenderPage(unittest.TestCase):
+    def test_basepath_only_rewrites_real_attributes(self):
+        markdown = '# Title\n\n[home](/index.html)\n\n```\n<a href="/x">\n```'
+        template = compile_template("{{ Content }}", "/base/")
+        html = render_page(markdown, template)
+        self.assertIn('<a href="/base/index.html">home</a>', html)
+        self.assertIn('<code><a href="/x">\n</code>', html)
+
+
+class TestTemplateLoader(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.template_path = os.path.join(self.root, "template.html")
+        self.write(self.template_path, "root:{{> footer }}{{ Content }}")
+        self.write(os.path.join(self.root, "_footer.html"), "f")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "_layout.html"), "blog:{{> footer }}{{ Content }}")
+        self.write(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom")
+        self.write(os.path.join(self.content, "contact", "_footer.html"), "contact-footer")
+
+    def test_root_template(self):
+        loader = TemplateLoader(self.template_path, self.content)
+        template = loader.for_page(os.path.join(self.content, "index.md"))
+        self.assertEqual(template.render(Content="x"), "root:fx")
+
+    def test_directory_layout_is_inherited(self):
+        loader = TemplateLoader(self.template_path, self.content)
+        tom = loader.for_page(os.path.join(self.content, "blog", "tom", "index.md"))
+        blog = loader.for_directory(os.path.join(self.content, "blog"))
+        self.assertEqual(tom.render(Content="x"), "blog:fx")
+        self.assertIs(tom, blog)
+
+    def test_directory_partial_override(self):
+        loader = TemplateLoader(self.template_path, self.content)
+        template = loader.for_directory(os.path.join(self.content, "contact"))
+        self.assertEqual(template.render(Content="x"), "root:contact-footerx")
+
+    def test_template_files(self):
+        files = template_files(self.template_path, self.content)
+        self.assertEqual(
+            files,
+            [
+                self.template_path,
+                os.path.join(self.content, "blog", "_layout.html"),
+                os.path.join(self.content, "contact", "_footer.html"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
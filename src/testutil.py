@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+
+
+class TempDirTestCase(unittest.TestCase):
+    # Each test gets a fresh temporary directory, self.tmp, removed when the
+    # test ends. Subclasses that set up more call super().setUp() first.
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, path, data):
+        # Writes text or bytes to path, creating its directories; returns path.
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
+
+    def chdir(self, path=None):
+        # Runs the rest of the test from path (self.tmp by default), for
+        # tests that call main.main() with its relative default paths.
+        cwd = os.getcwd()
+        os.chdir(path if path is not None else self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
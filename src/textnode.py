@@ -9,10 +9,14 @@ class TextType(Enum):
     IMAGE = "image"
 
 class TextNode:
-    def __init__(self, text, text_type, url=None):
+    __slots__ = ("text", "text_type", "url", "children")
+
+    def __init__(self, text, text_type, url=None, children=None):
         self.text = text
         self.text_type = text_type
         self.url = url
+        # Nested spans, e.g. bold inside italic; None for plain spans
+        self.children = children
 
     def __eq__(self, other):
         # First check if 'other' is also a TextNode
@@ -22,11 +26,14 @@ class TextNode:
         # Then compare all properties
         return (self.text == other.text and 
                 self.text_type == other.text_type and 
-                self.url == other.url)
+                self.url == other.url and
+                self.children == other.children)
 
     def __repr__(self):
         # Get the string value of the enum using .value
         text_type_str = self.text_type.value
         
         # Return the formatted string
+        if self.children:
+            return f"TextNode({self.text}, {text_type_str}, {self.url}, {self.children})"
         return f"TextNode({self.text}, {text_type_str}, {self.url})"
\ No newline at end of file